@@ -126,6 +126,7 @@ def positiveint(flag):
 
 config.read(soft_mem_limit=int, hard_mem_limit=int, port=int,
             multi_user=positiveint, serialize_jobs=positiveint,
+            keep_workers=positiveint, max_worker_mem=int, num_workers=int,
             strict=positiveint, code=exec)
 
 if config.directory.custom_tmp:
@@ -410,6 +410,29 @@ def removetmp():
                 pass
 
 
+# per-process caches, emptied by clear_caches
+_caches = []
+
+
+def register_cache(cache):
+    """
+    Register a per-process cache, i.e. an object with a .clear() method,
+    so that it is emptied by :func:`clear_caches`.
+
+    :returns: the cache itself
+    """
+    _caches.append(cache)
+    return cache
+
+
+def clear_caches():
+    """
+    Empty all the caches registered with :func:`register_cache`
+    """
+    for cache in _caches:
+        cache.clear()
+
+
 def git_suffix(fname):
     """
     :returns: `<short git hash>` if Git repository found
@@ -98,6 +98,18 @@ no pool, but it is still better to call it: in the future, you may change
 idea and use another parallelization strategy requiring cleanup. In this
 way your code is future-proof.
 
+NB: if the flag `keep_workers` is set in the section [distribution] of
+openquake.cfg, `Starmap.shutdown` does not kill the processpool, so that
+the workers, which already imported the modules listed in the parameter
+`preimport`, are reused by the next `Starmap`, even in a different
+calculation. The workers are restarted only if one of them uses more
+memory than the parameter `max_worker_mem` (in MB) in the section [memory].
+Otherwise each worker receives a SIGUSR1 signal and empties the caches
+registered with :func:`openquake.baselib.general.register_cache` before
+running its next task, so that the data of a calculation is not reused
+after its end. The workers are killed anyway if `shutdown` is called
+while a `Starmap` still has tasks running.
+
 Monitoring
 =============================
 
@@ -184,11 +196,14 @@ import os
 import re
 import ast
 import sys
+import copy
 import time
 import socket
 import signal
+import heapq
 import pickle
 import inspect
+import importlib
 import logging
 import operator
 import traceback
@@ -205,11 +220,12 @@ except ImportError:
 
 from openquake.baselib import config, hdf5, workerpool, version
 from openquake.baselib.zeromq import zmq, Socket
+from openquake.baselib.python3compat import decode
 from openquake.baselib.performance import (
     Monitor, memory_rss, init_performance)
 from openquake.baselib.general import (
     split_in_blocks, block_splitter, AccumDict, humansize, CallableDict,
-    gettemp)
+    gettemp, WeightedSequence, clear_caches)
 
 sys.setrecursionlimit(1200)  # raised a bit to make pickle happier
 # see https://github.com/gem/oq-engine/issues/5230
@@ -280,29 +296,77 @@ class Pickled(object):
     of the pickled bytestring.
 
     :param obj: the object to pickle
+    :param oob:
+        if True and pickle protocol 5 is available, the numpy arrays are not
+        copied in the bytestring but kept as out-of-band buffers; they are
+        copied only once, when the Pickled instance itself is pickled
     """
-    def __init__(self, obj):
+    def __init__(self, obj, oob=False):
         self.clsname = obj.__class__.__name__
         self.calc_id = str(getattr(obj, 'calc_id', ''))  # for monitors
+        self.buffers = []
         try:
-            self.pik = pickle.dumps(obj, pickle.HIGHEST_PROTOCOL)
+            if oob and pickle.HIGHEST_PROTOCOL >= 5:
+                self.pik = pickle.dumps(
+                    obj, 5, buffer_callback=self.buffers.append)
+            else:
+                self.pik = pickle.dumps(obj, pickle.HIGHEST_PROTOCOL)
         except TypeError as exc:  # can't pickle, show the obj in the message
             raise TypeError('%s: %s' % (exc, obj))
 
+    def __reduce_ex__(self, protocol):
+        state = vars(self).copy()
+        if protocol < 5 and self.buffers:  # PickleBuffers need protocol 5
+            state['buffers'] = [bytearray(buf) for buf in self.buffers]
+        return object.__new__, (self.__class__,), state
+
     def __repr__(self):
         """String representation of the pickled object"""
         return '<Pickled %s #%s %s>' % (
             self.clsname, self.calc_id, humansize(len(self)))
 
     def __len__(self):
-        """Length of the pickled bytestring"""
-        return len(self.pik)
+        """Length of the pickled bytestring, including the buffers"""
+        return len(self.pik) + sum(
+            memoryview(buf).nbytes for buf in self.buffers)
 
     def unpickle(self):
         """Unpickle the underlying object"""
+        if self.buffers:  # the arrays will be views over the buffers
+            return pickle.loads(self.pik, buffers=self.buffers)
         return pickle.loads(self.pik)
 
 
+class PickledDict(object):
+    """
+    A dictionary of Pickled objects, where each value is serialized only
+    once, with the numpy arrays kept as out-of-band buffers. The sizes of
+    the values are stored in the attribute .nbytes. Subclasses of dict,
+    like AccumDict, are restored with their class and attributes.
+
+    :param dic: a dictionary of picklable objects
+    """
+    def __init__(self, dic):
+        if type(dic) is dict:
+            self.empty = None
+        else:  # keep the class and the attributes, but not the items
+            empty = copy.copy(dic)
+            empty.clear()
+            self.empty = Pickled(empty)
+        self.pickled = {k: Pickled(v, oob=True) for k, v in dic.items()}
+        self.nbytes = {k: len(p) for k, p in self.pickled.items()}
+
+    def __len__(self):
+        return sum(self.nbytes.values())
+
+    def unpickle(self):
+        """Unpickle the underlying dictionary"""
+        dic = {} if self.empty is None else self.empty.unpickle()
+        for k, p in self.pickled.items():
+            dic[k] = p.unpickle()
+        return dic
+
+
 def get_pickled_sizes(obj):
     """
     Return the pickled sizes of an object and its direct attributes,
@@ -347,6 +411,17 @@ def pickle_sequence(objects):
     return out
 
 
+def get_task_weight(args):
+    """
+    :param args: the arguments of a task
+    :returns: the weight of the first argument, or 1 if it has no weight
+    """
+    try:
+        return float(getattr(args[0], 'weight', 1.))
+    except TypeError:  # the weight is not a number
+        return 1.
+
+
 class FakePickle:
     def __init__(self, sentbytes):
         self.sentbytes = sentbytes
@@ -366,20 +441,22 @@ class Result(object):
     :param msg: message string (default empty)
     """
     func = None
+    weight = 1.  # weight of the subtask, if any
 
     def __init__(self, val, mon, tb_str='', msg=''):
-        if isinstance(val, dict):
-            self.pik = Pickled(val)
-            self.nbytes = {k: len(Pickled(v)) for k, v in val.items()}
+        if isinstance(val, dict):  # serialize each value only once
+            self.pik = PickledDict(val)
+            self.nbytes = self.pik.nbytes
         elif isinstance(val, tuple) and callable(val[0]):
             self.func = val[0]
+            self.weight = get_task_weight(val[1:])
             self.pik = pickle_sequence(val[1:])
             self.nbytes = {'args': sum(len(p) for p in self.pik)}
         elif msg == 'TASK_ENDED':
             self.pik = Pickled(None)
             self.nbytes = {}
         else:
-            self.pik = Pickled(val)
+            self.pik = Pickled(val, oob=True)
             self.nbytes = {'tot': len(self.pik)}
         self.mon = mon
         self.tb_str = tb_str
@@ -462,6 +539,10 @@ def safely_call(func, args, task_no=0, mon=dummy_mon):
     :param task_no: the task number
     :param mon: a monitor
     """
+    global clear_requested
+    if clear_requested:  # set by SIGUSR1, see init_workers
+        clear_requested = False
+        clear_caches()
     isgenfunc = inspect.isgeneratorfunction(func)
     if hasattr(args[0], 'unpickle'):
         # args is a list of Pickled objects
@@ -472,6 +553,11 @@ def safely_call(func, args, task_no=0, mon=dummy_mon):
     mon = mon.new(operation='total ' + func.__name__, measuremem=True)
     mon.weight = getattr(args[0], 'weight', 1.)  # used in task_info
     mon.task_no = task_no
+    global startup_time
+    if startup_time:  # first task in a new worker, report the startup time
+        start_mon = mon('starting the worker')
+        start_mon.duration, start_mon.counts = startup_time, 1
+        startup_time = None
     if mon.inject:
         args += (mon,)
     sentbytes = 0
@@ -558,7 +644,8 @@ class IterResult(object):
                 # measure only the memory used by the main process
                 mem_gb = memory_rss(os.getpid()) / GB
             if result.msg == 'TASK_ENDED':
-                task_sent = ast.literal_eval(self.h5['task_sent'][()])
+                task_sent = ast.literal_eval(
+                    decode(self.h5['task_sent'][()]))
                 task_sent.update(self.sent)
                 del self.h5['task_sent']
                 self.h5['task_sent'] = str(task_sent)
@@ -606,8 +693,30 @@ class IterResult(object):
         return res
 
 
-def init_workers():
-    """Waiting function, used to wake up the process pool"""
+# time spent by the worker to start, set by init_workers
+startup_time = None
+# set by SIGUSR1 in the workers kept alive by Starmap.shutdown
+clear_requested = False
+
+
+def request_clear_caches(signum, frame):
+    """
+    SIGUSR1 handler: the caches are emptied by :func:`safely_call` at the
+    start of the next task, since a cache could be locked by the code
+    interrupted by the signal
+    """
+    global clear_requested
+    clear_requested = True
+
+
+def init_workers(modules=()):
+    """
+    Waiting function, used to wake up the process pool. It also imports
+    the given modules, so that the tasks do not have to import them.
+
+    :param modules: a list of module names
+    """
+    global startup_time
     setproctitle('oq-worker')
     # prctl is still useful (on Linux) to terminate all spawned processes
     # when master is killed via SIGKILL
@@ -618,6 +727,13 @@ def init_workers():
     else:
         # if the parent dies, the children die
         prctl.set_pdeathsig(signal.SIGKILL)
+    # the workers kept alive by Starmap.shutdown are asked to empty their
+    # caches via a SIGUSR1 signal (not available on Windows)
+    if hasattr(signal, 'SIGUSR1'):
+        signal.signal(signal.SIGUSR1, request_clear_caches)
+    for module in modules:
+        importlib.import_module(module)
+    startup_time = time.time() - psutil.Process().create_time()
 
 
 def getargnames(task_func):
@@ -633,9 +749,13 @@ def getargnames(task_func):
 class Starmap(object):
     pids = ()
     running_tasks = []  # currently running tasks
+    live = set()  # Starmaps with tasks still running
     # use only the "visible" cores, not the total system cores
     # if the underlying OS supports it (macOS does not)
     num_cores = int(config.distribution.get('num_cores', '0'))
+    keep_workers = config.distribution.get('keep_workers', 0)
+    preimport = config.distribution.get('preimport', '').split()
+    max_worker_mem = config.memory.get('max_worker_mem', 0)  # in MB
 
     @classmethod
     def init(cls, distribute=None):
@@ -644,31 +764,70 @@ class Starmap(object):
             # unregister custom handlers before starting the processpool
             term_handler = signal.signal(signal.SIGTERM, signal.SIG_DFL)
             int_handler = signal.signal(signal.SIGINT, signal.SIG_IGN)
+            # SIGUSR1 is ignored by the workers until init_workers is called
+            if hasattr(signal, 'SIGUSR1'):
+                usr1_handler = signal.signal(signal.SIGUSR1, signal.SIG_IGN)
             # we use spawn here to avoid deadlocks with logging, see
             # https://github.com/gem/oq-engine/pull/3923 and
             # https://codewithoutrules.com/2018/09/04/python-multiprocessing/
             cls.pool = multiprocessing.get_context('spawn').Pool(
-                cls.num_cores or None, init_workers)
+                cls.num_cores or None, init_workers, (cls.preimport,))
             # after spawning the processes restore the original handlers
             # i.e. the ones defined in openquake.engine.engine
             signal.signal(signal.SIGTERM, term_handler)
             signal.signal(signal.SIGINT, int_handler)
+            if hasattr(signal, 'SIGUSR1'):
+                signal.signal(signal.SIGUSR1, usr1_handler)
             cls.pids = [proc.pid for proc in cls.pool._pool]
         elif cls.distribute == 'threadpool' and not hasattr(cls, 'pool'):
             cls.pool = multiprocessing.dummy.Pool(cls.num_cores or None)
         elif cls.distribute == 'dask':
             cls.dask_client = Client(config.distribution.dask_scheduler)
 
+    @classmethod
+    def workers_mem(cls):
+        """
+        :returns: the maximum memory used by the processpool workers, in MB
+        """
+        try:
+            return max(memory_rss(pid) for pid in cls.pids) / 1024 ** 2
+        except psutil.NoSuchProcess:  # a worker died, restart the pool
+            return numpy.inf
+
+    @classmethod
+    def clear_worker_caches(cls):
+        """
+        Send a SIGUSR1 signal to the processpool workers, so that they empty
+        their caches before the next task, see :func:`request_clear_caches`
+        """
+        if not hasattr(signal, 'SIGUSR1'):
+            return
+        for pid in cls.pids:
+            try:
+                os.kill(pid, signal.SIGUSR1)
+            except ProcessLookupError:  # the worker died
+                pass
+
     @classmethod
     def shutdown(cls):
         # shutting down the pool during the runtime causes mysterious
         # race conditions with errors inside atexit._run_exitfuncs
+        # NB: if any Starmap has running tasks (i.e. the calculation was
+        # aborted) the pool is killed, otherwise it would keep running them
+        if cls.keep_workers and cls.pids and not cls.live:
+            mem = cls.workers_mem()
+            if not cls.max_worker_mem or mem < cls.max_worker_mem:
+                cls.clear_worker_caches()
+                return  # keep the workers warm
+            logging.info('Restarting the workers, one of them is using '
+                         '%d MB', mem)
         if hasattr(cls, 'pool'):
             cls.pool.close()
             cls.pool.terminate()
             cls.pool.join()
             del cls.pool
             cls.pids = []
+            cls.live.clear()
         if hasattr(cls, 'dask_client'):
             del cls.dask_client
 
@@ -703,7 +862,10 @@ class Starmap(object):
                 concurrent_tasks = CT
             taskargs = [[blk] + args for blk in split_in_blocks(
                 arg0, concurrent_tasks or 1, weight, key)]
-        return cls(task, taskargs, distribute, progress, h5)
+        smap = cls(task, taskargs, distribute, progress, h5)
+        if not maxweight:  # the queued blocks can be split
+            smap.split_by = weight, key
+        return smap
 
     def __init__(self, task_func, task_args=(), distribute=None,
                  progress=logging.info, h5=None):
@@ -723,7 +885,10 @@ class Starmap(object):
         self.task_args = task_args
         self.progress = progress
         self.h5 = h5
-        self.task_queue = []
+        self.task_queue = []  # heap of (-weight, counter, func, args)
+        self.queued = 0  # counter, to keep the FIFO order for equal weights
+        self.split_by = None  # (weight, key) functions used in .apply
+        self.done = AccumDict(accum=numpy.zeros(2))  # name -> weight, time
         try:
             self.num_tasks = len(self.task_args)
         except TypeError:  # generators have no len
@@ -769,6 +934,7 @@ class Starmap(object):
         if not hasattr(self, 'socket'):  # first time
             self.t0 = time.time()
             self.__class__.running_tasks = self.tasks
+            self.live.add(self)
             self.socket = Socket(self.receiver, zmq.PULL, 'bind').__enter__()
             monitor.backurl = 'tcp://%s:%s' % (
                 config.dbserver.host, self.socket.port)
@@ -802,8 +968,8 @@ class Starmap(object):
             for args in self.task_args:
                 self.submit(args)
         else:  # build a task queue in advance
-            self.task_queue = [(self.task_func, args)
-                               for args in self.task_args]
+            for args in self.task_args:
+                self._queue(self.task_func, args, get_task_weight(args))
         return self.get_results()
 
     def get_results(self):
@@ -822,22 +988,56 @@ class Starmap(object):
     def __iter__(self):
         return iter(self.submit_all())
 
+    def _queue(self, func, args, weight):
+        heapq.heappush(self.task_queue, (-weight, self.queued, func, args))
+        self.queued += 1
+
+    def _split_queue(self, howmany):
+        # when there are less queued tasks than idle cores, split the
+        # heaviest blocks generated by .apply, so that no core stays idle;
+        # since the results of .apply are aggregated per item, the
+        # partition of the items in blocks does not matter
+        if not self.split_by or not self.task_queue or (
+                self.distribute == 'no' or self.num_tasks == 1):
+            return
+        while len(self.task_queue) < howmany and self._split_heaviest():
+            pass
+
+    def _split_heaviest(self):
+        # split the heaviest queued task in two, if it is a block
+        # generated by .apply; returns True if the task was split
+        _weight, _i, func, args = self.task_queue[0]
+        if not isinstance(args[0], WeightedSequence) or len(args[0]) < 2:
+            return False
+        blocks = list(split_in_blocks(args[0], 2, *self.split_by))
+        if len(blocks) < 2:  # there is a dominating item
+            return False
+        heapq.heappop(self.task_queue)
+        for block in blocks:
+            self._queue(func, [block] + list(args[1:]), block.weight)
+        return True
+
     def _submit_many(self, howmany):
-        for _ in range(howmany):
-            if self.task_queue:
-                # remove in LIFO order
-                func, args = self.task_queue[0]
-                del self.task_queue[0]
-                self.submit(args, func=func)
-                self.todo += 1
+        # submit the heaviest tasks first (Longest Processing Time)
+        self._split_queue(howmany)
+        while howmany > 0 and self.task_queue:
+            _weight, _i, func, args = heapq.heappop(self.task_queue)
+            self.submit(args, func=func)
+            self.todo += 1
+            howmany -= 1
+
+    def _predict(self, mon):
+        # set the attribute mon.predicted by using the time per unit of
+        # weight of the tasks of the same kind completed so far
+        name = mon.operation[6:]  # strip 'total '
+        weight, duration = self.done[name]
+        mon.predicted = mon.weight * duration / weight if weight else numpy.nan
+        self.done[name] += numpy.array([mon.weight, mon.duration])
 
     def _loop(self):
         num_cores = self.num_cores or CT // 2
-        if self.task_queue:
-            first_args = self.task_queue[:num_cores]
-            self.task_queue[:] = self.task_queue[num_cores:]
-            for func, args in first_args:
-                self.submit(args, func=func)
+        self.todo = len(self.tasks)
+        self._submit_many(num_cores)
         if not hasattr(self, 'socket'):  # no submit was ever made
             return ()
 
@@ -847,7 +1047,6 @@ class Starmap(object):
                          humansize(nbytes), time.time() - self.t0)
 
         isocket = iter(self.socket)
-        self.todo = len(self.tasks)
         while self.todo:
             self.log_percent()
             res = next(isocket)
@@ -856,18 +1055,20 @@ class Starmap(object):
                                 'is job %d', res.mon.calc_id, self.calc_id)
             elif res.msg == 'TASK_ENDED':
                 self.todo -= 1
-                self._submit_many(1)
+                self._predict(res.mon)
+                self._submit_many(max(num_cores - self.todo, 1))
                 logging.debug('%d tasks todo, %d in queue',
                               self.todo, len(self.task_queue))
                 yield res
             elif res.func:  # add subtask
-                self.task_queue.append((res.func, res.pik))
+                self._queue(res.func, res.pik, res.weight)
                 self._submit_many(1)
             else:
                 yield res
         self.log_percent()
         self.socket.__exit__(None, None, None)
         self.tasks.clear()
+        self.live.discard(self)
 
 
 def sequential_apply(task, args, concurrent_tasks=CT,
@@ -19,14 +19,16 @@
 import os
 import time
 import pickle
+import threading
 import getpass
 import operator
 import itertools
+import collections
 from datetime import datetime
 import psutil
 import numpy
 
-from openquake.baselib.general import humansize
+from openquake.baselib.general import humansize, register_cache
 from openquake.baselib import hdf5
 
 # NB: one can use vstr fields in extensible datasets, but then reading
@@ -39,7 +41,8 @@ perf_dt = numpy.dtype([('operation', '<S50'), ('time_sec', float),
 task_info_dt = numpy.dtype(
     [('taskname', '<S50'), ('task_no', numpy.uint32),
      ('weight', numpy.float32), ('duration', numpy.float32),
-     ('received', numpy.int64), ('mem_gb', numpy.float32)])
+     ('predicted', numpy.float32), ('received', numpy.int64),
+     ('mem_gb', numpy.float32)])
 
 
 def init_performance(hdf5file, swmr=False):
@@ -110,6 +113,78 @@ def memory_rss(pid):
     return psutil.Process(pid).memory_info().rss
 
 
+class ReadCache(object):
+    """
+    A LRU cache of the objects read by :meth:`Monitor.read`, living in each
+    worker process, so that the tasks of the same calculation do not
+    unpickle the same objects again and again. The keys are triples
+    (tmp filename, key, modification time) and the size of an object is
+    the size of its pickle. When an object coming from a new file is added,
+    the objects coming from files that do not exist anymore are evicted.
+    It is also used to cache the results of the extractors, see
+    :class:`openquake.calculators.extract.Extract`. The cache is
+    thread-safe: a missing key always raises a KeyError, even if the
+    object has been evicted by another thread in the meantime. The cached
+    objects are shared by all the readers, which must not modify them.
+
+    :param maxbytes: maximum size of the cached objects
+    """
+    def __init__(self, maxbytes):
+        self.maxbytes = maxbytes
+        self.nbytes = 0
+        self.dic = collections.OrderedDict()  # key -> (obj, nbytes)
+        self.fnames = collections.Counter()  # fname -> number of keys
+        self.lock = threading.Lock()
+
+    def __getitem__(self, key):
+        with self.lock:
+            obj, _nbytes = self.dic[key]
+            self.dic.move_to_end(key)
+        return obj
+
+    def _pop(self, key):
+        self.nbytes -= self.dic.pop(key)[1]
+        self.fnames[key[0]] -= 1
+        if not self.fnames[key[0]]:
+            del self.fnames[key[0]]
+
+    def add(self, key, obj, nbytes):
+        """
+        Add an object to the cache, evicting the objects coming from
+        removed files and then the least recently used ones, if needed
+        """
+        if nbytes > self.maxbytes:  # too big to be cached
+            return
+        with self.lock:
+            if key in self.dic:  # added by another thread
+                return
+            if key[0] not in self.fnames:  # new file, check the old ones
+                removed = {fname for fname in self.fnames
+                           if not os.path.exists(fname)}
+                for k in [k for k in self.dic if k[0] in removed]:
+                    self._pop(k)
+            while self.nbytes + nbytes > self.maxbytes:
+                self._pop(next(iter(self.dic)))
+            self.dic[key] = obj, nbytes
+            self.nbytes += nbytes
+            self.fnames[key[0]] += 1
+
+    def __contains__(self, key):
+        return key in self.dic
+
+    def __len__(self):
+        return len(self.dic)
+
+    def clear(self):
+        with self.lock:
+            self.dic.clear()
+            self.fnames.clear()
+            self.nbytes = 0
+
+
+read_cache = register_cache(ReadCache(maxbytes=2 ** 28))  # 256 MB per process
+
+
 # this is not thread-safe
 class Monitor(object):
     """
@@ -218,8 +293,9 @@ class Monitor(object):
         :param name: name of the task function
         :param mem_gb: memory consumption at the saving time (optional)
         """
-        t = (name, self.task_no, self.weight, self.duration, len(res.pik),
-             mem_gb)
+        predicted = getattr(self, 'predicted', numpy.nan)  # set by Starmap
+        t = (name, self.task_no, self.weight, self.duration, predicted,
+             len(res.pik), mem_gb)
         data = numpy.array([t], task_info_dt)
         hdf5.extend(h5['task_info'], data)
         h5['task_info'].flush()  # notify the reader
@@ -286,13 +362,30 @@ class Monitor(object):
         """
         :param key: key in the _tmp.hdf5 file
         :return: unpickled object
+
+        NB: the object is cached in the current process and the same
+        instance is returned to all the tasks reading the same key, so it
+        must not be modified by the caller: the arrays saved as such are
+        returned read-only, while the unpickled objects are not protected,
+        so make a copy before changing them. The cache hits and misses are
+        stored in the performance_data as "reading <key> from cache"
+        and "reading <key>" respectively.
         """
         tmp = self.filename[:-5] + '_tmp.hdf5'
-        with hdf5.File(tmp, 'r') as f:
-            data = f[key][()]
-            if data.shape:
-                return data
-            return pickle.loads(data)
+        cachekey = tmp, key, os.path.getmtime(tmp)
+        try:
+            obj = read_cache[cachekey]
+        except KeyError:  # not cached, or evicted by another thread
+            with self('reading %s' % key), hdf5.File(tmp, 'r') as f:
+                data = f[key][()]
+                if data.shape:  # shared array, a mutation raises an error
+                    data.flags.writeable = False
+                obj = data if data.shape else pickle.loads(data)
+            read_cache.add(cachekey, obj, data.nbytes)
+        else:
+            with self('reading %s from cache' % key):
+                pass  # record the cache hit
+        return obj
 
     def __repr__(self):
         calc_id = ' #%s ' % self.calc_id if self.calc_id else ' '
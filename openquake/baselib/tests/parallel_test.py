@@ -17,14 +17,19 @@
 # along with OpenQuake. If not, see <http://www.gnu.org/licenses/>.
 
 import os
+import zlib
 import unittest.mock as mock
 import time
+import pickle
+import random
 import shutil
+import signal
 import unittest
 import itertools
 import tempfile
 import numpy
-from openquake.baselib import parallel, general, hdf5, workerpool, performance
+from openquake.baselib import (
+    parallel, general, hdf5, workerpool, performance, zeromq)
 
 try:
     import celery
@@ -36,6 +41,10 @@ def get_length(data, monitor):
     return {'n': len(data)}
 
 
+def get_items(data, monitor):
+    return list(data)
+
+
 def gfunc(text, monitor):
     for char in text:
         yield char * 3
@@ -58,6 +67,21 @@ def supertask(text, monitor):
             yield get_length, k * v
 
 
+# a per-process cache, emptied when the workers are kept alive
+_cache = general.register_cache({})
+
+
+def fill_cache(key, monitor):
+    _cache[key] = True
+    return {'n': len(_cache)}
+
+
+def sleep_items(data, seed, monitor):
+    # sleep a random time, so that the tasks end in a random order
+    time.sleep(random.Random(seed + ord(data[0])).random() / 10)
+    return list(data)
+
+
 def countletters(text1, text2, monitor):
     for block in general.block_splitter(text1 + text2, 5):
         yield get_length, ''.join(block)
@@ -141,8 +165,83 @@ class StarmapTestCase(unittest.TestCase):
             dic = dict(general.fast_agg3(info, 'taskname', ['received']))
             self.assertGreater(dic[b'get_length'], 0)
             self.assertGreater(dic[b'supertask'], 0)
+            # the first task of each kind has no predicted duration
+            self.assertEqual(numpy.isnan(info['predicted']).sum(), 2)
         shutil.rmtree(tmpdir)
 
+    def test_heaviest_first(self):
+        allargs = [(general.WeightedSequence([(ch, w)]),)
+                   for ch, w in zip('abc', [1, 3, 2])]
+        res = list(parallel.Starmap(get_items, allargs, distribute='no'))
+        self.assertEqual(res, [['b'], ['c'], ['a']])
+
+    def test_split_queue(self):
+        # the 2 queued blocks are split until there is a block per idle core
+        for idle, expected in [(4, ['ab', 'cd', 'ef', 'gh']),
+                               (3, ['ab', 'cd', 'efgh']),
+                               (1, ['abcd', 'efgh'])]:
+            smap = parallel.Starmap.apply(
+                get_items, ('abcdefgh',), concurrent_tasks=2)
+            for args in smap.task_args:
+                smap._queue(get_items, args, parallel.get_task_weight(args))
+            with mock.patch.object(smap, 'distribute', 'processpool'):
+                smap._split_queue(idle)
+            blocks = sorted(''.join(args[0])
+                            for _, _, _, args in smap.task_queue)
+            self.assertEqual(blocks, expected)
+
+    def test_completion_order(self):
+        # the blocks depend on the order in which the tasks end, but
+        # the aggregated result does not
+        for seed in (1, 2):
+            with mock.patch.object(parallel.Starmap, 'num_cores', 4):
+                smap = parallel.Starmap.apply(
+                    sleep_items, ('abcdefgh', seed), concurrent_tasks=2)
+                self.assertEqual(sorted(smap.reduce(acc=[])), list('abcdefgh'))
+
+    def test_keep_workers(self):
+        pids = parallel.Starmap.pids
+        if not pids:
+            raise unittest.SkipTest('Not using the processpool')
+        with mock.patch.object(parallel.Starmap, 'keep_workers', 1):
+            parallel.Starmap.shutdown()
+            self.assertEqual(parallel.Starmap.pids, pids)  # still alive
+            # the workers use more than 1 MB, so they are restarted
+            with mock.patch.object(parallel.Starmap, 'max_worker_mem', 1):
+                parallel.Starmap.shutdown()
+        self.assertEqual(parallel.Starmap.pids, [])
+        parallel.Starmap.init()
+
+        # the workers are killed if a Starmap has still tasks running
+        with mock.patch.object(parallel.Starmap, 'keep_workers', 1), \
+                mock.patch.object(parallel.Starmap, 'live', {None}):
+            parallel.Starmap.shutdown()
+            self.assertEqual(parallel.Starmap.pids, [])
+        parallel.Starmap.init()
+
+    def test_clear_worker_caches(self):
+        if not parallel.Starmap.pids:
+            raise unittest.SkipTest('Not using the processpool')
+        # fill the caches of (almost surely) all the workers
+        allargs = [(i,) for i in range(4 * len(parallel.Starmap.pids))]
+        res = list(parallel.Starmap(fill_cache, allargs))
+        self.assertEqual(len(res), len(allargs))
+        with mock.patch.object(parallel.Starmap, 'keep_workers', 1), \
+                mock.patch.object(parallel.Starmap, 'max_worker_mem', 0):
+            parallel.Starmap.shutdown()  # keep the workers, clear the caches
+        time.sleep(.5)  # wait for the signal to be handled
+        # NB: two tasks, since a single task would run in the master
+        res = parallel.Starmap(fill_cache, [(-1,), (-2,)])
+        self.assertLessEqual(max(r['n'] for r in res), 2)
+
+    def test_request_clear_caches(self):
+        # the signal handler must not touch the caches, which could be
+        # locked by the interrupted code
+        with performance.read_cache.lock:
+            parallel.request_clear_caches(signal.SIGUSR1, None)
+        self.assertTrue(parallel.clear_requested)
+        parallel.clear_requested = False
+
     def test_countletters(self):
         data = [('hello', 'world'), ('ciao', 'mondo')]
         smap = parallel.Starmap(countletters, data)
@@ -166,6 +265,63 @@ class ThreadPoolTestCase(unittest.TestCase):
                 parallel.Starmap.shutdown()
 
 
+class ResultTestCase(unittest.TestCase):
+    def test_dict(self):
+        arr = numpy.arange(1000.)
+        res = parallel.Result(dict(arr=arr, n=1), performance.Monitor())
+        self.assertGreater(res.nbytes['arr'], arr.nbytes)
+        self.assertLess(res.nbytes['n'], 100)
+        for protocol in (4, pickle.HIGHEST_PROTOCOL):
+            val = pickle.loads(pickle.dumps(res, protocol)).get()
+            numpy.testing.assert_equal(val['arr'], arr)
+            self.assertEqual(val['n'], 1)
+            val['arr'] += 1  # the array is writeable
+
+    def test_accumdict(self):
+        # the sizes are kept by key and the AccumDict is restored
+        res = parallel.Result(general.AccumDict({'a': numpy.ones(3)},
+                                                accum=[]),
+                              performance.Monitor())
+        self.assertEqual(list(res.nbytes), ['a'])
+        val = pickle.loads(pickle.dumps(res, pickle.HIGHEST_PROTOCOL)).get()
+        self.assertIsInstance(val, general.AccumDict)
+        self.assertEqual(val.accum, [])
+        numpy.testing.assert_equal(val['a'], numpy.ones(3))
+
+    def test_other(self):
+        res = parallel.Result([numpy.ones(3)], performance.Monitor())
+        self.assertEqual(list(res.nbytes), ['tot'])
+        val = pickle.loads(pickle.dumps(res, pickle.HIGHEST_PROTOCOL)).get()
+        numpy.testing.assert_equal(val[0], numpy.ones(3))
+
+
+class PackTestCase(unittest.TestCase):
+    zlib = (zlib.compress, lambda data: bytearray(zlib.decompress(data)))
+
+    def roundtrip(self, obj, compression=''):
+        frames = zeromq.pack(obj, compression)
+        # frames built from bytes are read-only, like the received ones
+        return zeromq.unpack([zeromq.zmq.Frame(bytes(f)) for f in frames])
+
+    def test_result(self):
+        arr = numpy.arange(100000.)
+        res = parallel.Result(dict(arr=arr), performance.Monitor())
+        val = self.roundtrip(res).get()
+        numpy.testing.assert_equal(val['arr'], arr)
+        val['arr'] += 1  # the array is writeable
+
+    def test_compression(self):
+        arr = numpy.zeros(100000)
+        with mock.patch.dict(zeromq.COMPRESSORS, zlib=self.zlib):
+            frames = zeromq.pack(dict(arr=arr, n=1), 'zlib')
+            val = self.roundtrip(dict(arr=arr, n=1), 'zlib')
+        if pickle.HIGHEST_PROTOCOL >= 5:  # the array is compressed
+            self.assertLess(len(frames[2]), 1000)
+        numpy.testing.assert_equal(val['arr'], arr)
+        self.assertEqual(val['n'], 1)
+        val['arr'] += 1
+
+
 def sum_chunk(slc, hdf5path):
     with hdf5.File(hdf5path, 'r') as f:
         return f['array'][slc].sum()
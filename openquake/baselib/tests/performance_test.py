@@ -15,11 +15,14 @@
 #
 # You should have received a copy of the GNU Affero General Public License
 # along with OpenQuake.  If not, see <http://www.gnu.org/licenses/>.
+import os
 import time
 import unittest
 import pickle
+import tempfile
 import numpy
-from openquake.baselib.performance import Monitor
+from concurrent.futures import ThreadPoolExecutor
+from openquake.baselib.performance import Monitor, ReadCache, read_cache
 
 
 class MonitorTestCase(unittest.TestCase):
@@ -60,3 +63,67 @@ class MonitorTestCase(unittest.TestCase):
 
     def test_pickleable(self):
         pickle.loads(pickle.dumps(self.mon))
+
+    def test_read(self):
+        mon = Monitor('test')
+        mon.filename = os.path.join(tempfile.mkdtemp(), 'calc_1.hdf5')
+        mon.save('obj', {'a': 1})
+        obj = mon.read('obj')
+        self.assertIs(mon.read('obj'), obj)  # from the cache
+        data = numpy.concatenate([m.get_data() for m in mon.children])
+        self.assertEqual(sorted(data['operation']),
+                         [b'reading obj', b'reading obj from cache'])
+        self.assertEqual(list(data['counts']), [1, 1])
+
+        # a new calculation evicts the objects of the removed file
+        os.remove(mon.filename[:-5] + '_tmp.hdf5')
+        mon.filename = mon.filename.replace('calc_1', 'calc_2')
+        mon.save('obj', {'a': 2})
+        self.assertEqual(mon.read('obj'), {'a': 2})
+        self.assertEqual(len(read_cache), 1)
+
+        # the cached arrays are shared, so they are read-only
+        mon.save('arr', numpy.arange(3))
+        arr = mon.read('arr')
+        with self.assertRaises(ValueError):
+            arr[0] = 1
+        self.assertEqual(list(mon.read('arr')), [0, 1, 2])
+        read_cache.clear()
+
+
+class ReadCacheTestCase(unittest.TestCase):
+    def test_threads(self):
+        # readers and writers in different threads never see a KeyError
+        # coming from an object evicted between a check and a read
+        fname = __file__
+        cache = ReadCache(maxbytes=100)
+
+        def read(i):
+            key = (fname, i % 30, 0)
+            try:
+                return cache[key]
+            except KeyError:
+                cache.add(key, i % 30, 10)
+                return i % 30
+
+        with ThreadPoolExecutor(8) as executor:
+            res = list(executor.map(read, range(3000)))
+        self.assertEqual(res, [i % 30 for i in range(3000)])
+        self.assertEqual(len(cache), 10)
+        self.assertEqual(cache.nbytes, 100)
+        self.assertEqual(cache.fnames[fname], 10)
+
+    def test_removed_files(self):
+        cache = ReadCache(maxbytes=100)
+        tmp = tempfile.mkstemp()[1]
+        cache.add((tmp, 'a', 0), 1, 10)
+        cache.add((tmp, 'b', 0), 2, 10)
+        cache.add((__file__, 'a', 0), 3, 10)
+        self.assertEqual(len(cache), 3)
+        os.remove(tmp)
+        cache.add((__file__, 'b', 0), 4, 10)  # no new file, no check
+        self.assertEqual(len(cache), 4)
+        cache.add(('new', 'a', 0), 5, 10)  # the removed file is evicted
+        self.assertEqual(sorted(cache.dic), [
+            (__file__, 'a', 0), (__file__, 'b', 0), ('new', 'a', 0)])
+        self.assertEqual(cache.nbytes, 30)
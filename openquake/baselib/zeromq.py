@@ -16,12 +16,37 @@
 # You should have received a copy of the GNU Affero General Public License
 # along with OpenQuake.  If not, see <http://www.gnu.org/licenses/>.
 import re
+import pickle
 import zmq
 import time
 import logging
+from openquake.baselib import config
 
 context = zmq.Context()
 
+# buffers smaller than this are never compressed
+COMPRESSION_THRESHOLD = 65536
+
+# from compression name to (compress, decompress) functions; the
+# decompressed data must be writeable, since it becomes a numpy array
+COMPRESSORS = {}
+try:
+    import lz4.frame
+except ImportError:
+    pass
+else:
+    COMPRESSORS['lz4'] = (
+        lz4.frame.compress,
+        lambda data: lz4.frame.decompress(data, return_bytearray=True))
+try:
+    import zstandard
+except ImportError:
+    pass
+else:
+    COMPRESSORS['zstd'] = (
+        lambda data: zstandard.ZstdCompressor().compress(data),
+        lambda data: bytearray(zstandard.ZstdDecompressor().decompress(data)))
+
 # from integer socket_type to string
 SOCKTYPE = {zmq.REQ: 'REQ', zmq.REP: 'REP',
             zmq.PUSH: 'PUSH', zmq.PULL: 'PULL',
@@ -56,6 +81,54 @@ def connect(end_point, socket_type):
     return sock
 
 
+def pack(obj, compression=''):
+    """
+    Serialize a Python object into a list of frames: a header, the
+    pickle bytestring and the out-of-band buffers of the numpy arrays,
+    if pickle protocol 5 is available. The buffers are not copied and
+    the big ones are compressed if `compression` is set.
+
+    :param obj: the object to serialize
+    :param compression: the empty string or a key in COMPRESSORS
+    :returns: a list of bytestrings and buffers
+    """
+    buffers = []
+    if pickle.HIGHEST_PROTOCOL >= 5:
+        pik = pickle.dumps(obj, 5, buffer_callback=buffers.append)
+        buffers = [buf.raw() for buf in buffers]
+    else:
+        pik = pickle.dumps(obj, pickle.HIGHEST_PROTOCOL)
+    zipped = []
+    if compression:
+        compress = COMPRESSORS[compression][0]
+        for i, buf in enumerate(buffers):
+            if buf.nbytes > COMPRESSION_THRESHOLD:
+                buffers[i] = compress(buf)
+                zipped.append(i)
+    header = pickle.dumps((compression, zipped), pickle.HIGHEST_PROTOCOL)
+    return [header, pik] + buffers
+
+
+def unpack(frames):
+    """
+    Build a Python object from the frames returned by :func:`pack`.
+    The numpy arrays are writeable views over the received frames.
+
+    :param frames: a list of zmq.Frame objects
+    :returns: the deserialized object
+    """
+    compression, zipped = pickle.loads(frames[0].bytes)
+    # NB: frame.buffer would be read-only, the frames themselves are not
+    buffers = frames[2:]
+    if zipped:
+        decompress = COMPRESSORS[compression][1]
+        for i in zipped:
+            buffers[i] = decompress(buffers[i])
+    if buffers:
+        return pickle.loads(frames[1].buffer, buffers=buffers)
+    return pickle.loads(frames[1].buffer)
+
+
 class Socket(object):
     """
     A Socket class to be used with code like the following::
@@ -75,8 +148,12 @@ class Socket(object):
     :param socket_type: zmq socket type (integer)
     :param mode: default 'bind', accepts also 'connect'
     :param timeout: default 5000 ms, used when polling the underlying socket
+    :param compression:
+        'lz4', 'zstd' or '' (no compression); by default it is read from the
+        `compression` parameter in the section [zworkers] of openquake.cfg
     """
-    def __init__(self, end_point, socket_type, mode, timeout=5000):
+    def __init__(self, end_point, socket_type, mode, timeout=5000,
+                 compression=None):
         assert socket_type in (zmq.REP, zmq.REQ, zmq.PULL, zmq.PUSH)
         assert mode in ('bind', 'connect'), mode
         if mode == 'bind':
@@ -85,6 +162,13 @@ class Socket(object):
         self.socket_type = socket_type
         self.mode = mode
         self.timeout = timeout
+        if compression is None:
+            compression = config.zworkers.get('compression', '')
+        if compression and compression not in COMPRESSORS:
+            raise ValueError('Compression %r is not available; you should '
+                             'install the corresponding library or change '
+                             'openquake.cfg' % compression)
+        self.compression = compression
         self.running = False
 
     def __enter__(self):
@@ -133,29 +217,38 @@ class Socket(object):
         while self.running:
             try:
                 if self.zsocket.poll(self.timeout):
-                    yield self.zsocket.recv_pyobj()
+                    yield self.recv()
                 elif self.socket_type == zmq.PULL:
                     logging.debug('Waiting on %s:%d', self, self.port)
             except zmq.ZMQError:
                 # sending SIGTERM raises ZMQError
                 break
 
+    def recv(self):
+        """
+        Receive a multipart message and return the corresponding object;
+        the numpy arrays are not copied.
+        """
+        return unpack(self.zsocket.recv_multipart(copy=False))
+
     def send(self, obj):
         """
         Send an object to the remote server; block and return the reply
-        if the socket type is REQ.
+        if the socket type is REQ. The numpy arrays are sent as separate
+        frames without copying them.
 
         :param obj:
             the Python object to send
         """
         try:
-            self.zsocket.send_pyobj(obj)
+            self.zsocket.send_multipart(
+                pack(obj, self.compression), copy=False)
         except Exception as exc:
             # usual for objects bigger than 4 GB
             raise exc.__class__('%s: %r' % (exc, obj))
         self.num_sent += 1
         if self.socket_type == zmq.REQ:
-            return self.zsocket.recv_pyobj()
+            return self.recv()
 
     def __repr__(self):
         return '<%s %s %s>' % (self.__class__.__name__,
@@ -270,6 +270,7 @@ class BaseCalculator(metaclass=abc.ABCMeta):
                 readinput.eids = None
                 readinput.smlt_cache.clear()
                 readinput.gsim_lt_cache.clear()
+                general.clear_caches()
 
                 # remove temporary hdf5 file, if any
                 if os.path.exists(self.datastore.tempname) and remove:
@@ -439,6 +439,7 @@ class ClassicalCalculator(base.HazardCalculator):
             self.N / oq.max_sites_per_tile)
         self.params = dict(
             truncation_level=oq.truncation_level,
+            sf_tolerance=oq.sf_tolerance,
             imtls=oq.imtls, reqv=oq.get_reqv(),
             pointsource_distance=oq.pointsource_distance,
             point_rupture_bins=oq.point_rupture_bins,
@@ -478,12 +479,14 @@ class ClassicalCalculator(base.HazardCalculator):
         self.params['max_weight'] = max_weight
         logging.info('tot_weight={:_d}, max_weight={:_d}'.format(
             int(tot_weight), int(max_weight)))
+        allargs = []  # (weight, args, func)
         for rlzs_by_gsim, sg in zip(rlzs_by_gsim_list, src_groups):
             nb = 0
             if sg.atomic:
                 # do not split atomic groups
                 nb += 1
-                smap.submit((sg, rlzs_by_gsim, self.params), f1)
+                allargs.append((sum(src.weight for src in sg),
+                                (sg, rlzs_by_gsim, self.params), f1))
             else:  # regroup the sources in blocks
                 blks = (groupby(sg, get_source_id).values()
                         if oq.disagg_by_src
@@ -492,15 +495,21 @@ class ClassicalCalculator(base.HazardCalculator):
                 blocks = list(blks)
                 nb += len(blocks)
                 for block in blocks:
+                    w = sum(src.weight for src in block)
                     logging.debug('Sending %d source(s) with weight %d',
-                                  len(block), sum(src.weight for src in block))
-                    smap.submit((block, rlzs_by_gsim, self.params), f2)
+                                  len(block), w)
+                    allargs.append((w, (block, rlzs_by_gsim, self.params), f2))
 
             w = sum(src.weight for src in sg)
             it = sorted(oq.maximum_distance.ddic[sg.trt].items())
             md = '%s->%d ... %s->%d' % (it[0] + it[-1])
             logging.info('max_dist={}, gsims={}, weight={:_d}, blocks={}'.
                          format(md, len(rlzs_by_gsim), int(w), nb))
+        # send the heaviest tasks first, otherwise a slow task sent at the
+        # end would keep running while the other cores are idle
+        allargs.sort(key=operator.itemgetter(0), reverse=True)
+        for w, args, func in allargs:
+            smap.submit(args, func)
         return rlzs_by_gsim_list
 
     def save_hazard(self, acc, pmap_by_kind):
@@ -561,8 +570,8 @@ class ClassicalCalculator(base.HazardCalculator):
                     trt = self.full_lt.trt_by_et[et_ids[key][0]]
                     # avoid saving PoEs == 1
                     base.fix_ones(pmap)
-                    sids = sorted(pmap)
-                    arr = numpy.array([pmap[sid].array for sid in sids])
+                    sids = pmap.sids
+                    arr = pmap.to_array(sids)
                     self.datastore['_poes'][sids, :, slice_by_g[key]] = arr
                     extreme = max(
                         get_extreme_poe(pmap[sid].array, oq.imtls)
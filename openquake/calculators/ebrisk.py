@@ -17,6 +17,7 @@
 # along with OpenQuake. If not, see <http://www.gnu.org/licenses/>.
 import logging
 import operator
+import collections
 import itertools
 from datetime import datetime
 import numpy
@@ -38,35 +39,87 @@ F32 = numpy.float32
 F64 = numpy.float64
 TWO32 = 2 ** 32
 get_n_occ = operator.itemgetter(1)
+GMF_CHUNKSIZE = 100_000  # max number of GMF records per array
 
 gmf_info_dt = numpy.dtype([('rup_id', U32), ('task_no', U16),
                            ('nsites', U16), ('gmfbytes', F32), ('dt', F32)])
 
 
+RiskData = collections.namedtuple(
+    'RiskData', 'key assets_by_site weights aggnames')
+
+
+class RiskCache(object):
+    """
+    Worker-side cache of the data needed by calc_risk. It contains the
+    data of a single calculation and it is replaced as a whole when a new
+    calculation starts, so that the threads of a threadpool never see a
+    partially updated cache.
+    """
+    def __init__(self):
+        self.data = None
+
+    def clear(self):
+        self.data = None
+
+
+risk_cache = general.register_cache(RiskCache())
+
+
+def get_risk_data(param, monitor):
+    """
+    Read the assets and the weights only once per calculation in each
+    worker process.
+
+    :param param: a dictionary of parameters coming from the job.ini
+    :param monitor: a Monitor instance
+    :returns: a RiskData instance
+    """
+    key = (monitor.calc_id, param['hdf5path'], param['checksum32'])
+    data = risk_cache.data
+    if data is None or data.key != key:
+        data = risk_cache.data = read_risk_data(key, param, monitor)
+    return data
+
+
+def read_risk_data(key, param, monitor):
+    """
+    :returns: a RiskData instance read from the datastore
+    """
+    with datastore.read(param['hdf5path']) as dstore:
+        with monitor('getting assets'):
+            assets_df = dstore.read_df('assetcol/array', 'ordinal')
+        weights = dstore['weights'][()]
+    aggby = param['aggregate_by']
+    aggnames = []
+    if aggby:  # integer aggregation keys
+        tags = assets_df[aggby].to_numpy()
+        aggtags, aggkeys = numpy.unique(tags, axis=0, return_inverse=True)
+        assets_df['aggkey'] = aggkeys
+        aggnames = [','.join(map(str, idxs)) + ',' for idxs in aggtags]
+    assets_by_site = {sid: df.to_records()
+                      for sid, df in assets_df.groupby('site_id')}
+    return RiskData(key, assets_by_site, weights, aggnames)
+
+
 def calc_risk(gmfs, param, monitor):
     """
-    :param gmfs: an array of GMFs with fields sid, eid, gmv
+    :param gmfs: an iterable over arrays of GMFs with fields sid, eid, gmv
     :param param: a dictionary of parameters coming from the job.ini
     :param monitor: a Monitor instance
     :returns: a dictionary of arrays with keys elt, alt, losses_by_A, ...
     """
     mon_risk = monitor('computing risk', measuremem=False)
     mon_agg = monitor('aggregating losses', measuremem=False)
-    dstore = datastore.read(param['hdf5path'])
-    with monitor('getting assets'):
-        assets_df = dstore.read_df('assetcol/array', 'ordinal')
+    data = get_risk_data(param, monitor)
+    assets_by_site = data.assets_by_site
+    weights = data.weights
     with monitor('getting crmodel'):
-        crmodel = monitor.read('crmodel')
-        weights = dstore['weights'][()]
-    L = len(param['lba'].loss_names)
-    elt_dt = [('event_id', U32), ('loss', (F32, (L,)))]
-    # aggkey -> eid -> loss
+        crmodel = monitor.read('crmodel')  # cached in the read_cache
     acc = dict(events_per_sid=0, numlosses=numpy.zeros(2, int))  # (kept, tot)
     lba = param['lba']
-    lba.alt = general.AccumDict(  # idx -> eid -> loss
-        accum=general.AccumDict(accum=numpy.zeros(L, F32)))
-    lba.losses_by_E = general.AccumDict(  # eid -> loss
-        accum=numpy.zeros(L, F32))
+    lba.alt = []  # partial aggregate losses
+    lba.losses_by_E = []  # partial losses by event
     tempname = param['tempname']
     aggby = param['aggregate_by']
 
@@ -77,34 +130,39 @@ def calc_risk(gmfs, param, monitor):
         if lt in lba.policy_dict:  # same order as in lba.compute
             minimum_loss.append(val)
 
-    haz_by_sid = general.group_array(gmfs, 'sid')
-    for sid, asset_df in assets_df.groupby('site_id'):
-        try:
+    # the partial losses of each block are accumulated in lba and summed
+    # by key after each block, so that the memory occupation is bounded by
+    # the number of events times the number of aggregation keys
+    nrecords = 0
+    for block in gmfs:
+        nrecords += len(block)
+        haz_by_sid = general.group_array(block, 'sid')
+        for sid in sorted(haz_by_sid):  # only the sites in the GMF block
+            try:
+                assets = assets_by_site[sid]
+            except KeyError:  # no assets here
+                continue
             haz = haz_by_sid[sid]
-        except KeyError:  # no hazard here
-            continue
-        with mon_risk:
-            assets = asset_df.to_records()  # fast
-            acc['events_per_sid'] += len(haz)
-            if param['avg_losses']:
-                ws = weights[haz['rlz']]
-            else:
-                ws = None
-            assets_by_taxo = get_assets_by_taxo(assets, tempname)  # fast
-            out = get_output(crmodel, assets_by_taxo, haz)  # slow
+            with mon_risk:
+                acc['events_per_sid'] += len(haz)
+                if param['avg_losses']:
+                    ws = weights[haz['rlz']]
+                else:
+                    ws = None
+                assets_by_taxo = get_assets_by_taxo(assets, tempname)  # fast
+                out = get_output(crmodel, assets_by_taxo, haz)  # slow
+            with mon_agg:
+                aggkeys = assets['aggkey'] if aggby else None
+                acc['numlosses'] += lba.aggregate(
+                    out, haz['eid'], minimum_loss, aggkeys, ws)
         with mon_agg:
-            tagidxs = assets[aggby] if aggby else None
-            acc['numlosses'] += lba.aggregate(
-                out, haz['eid'], minimum_loss, tagidxs, ws)
-    if len(gmfs):
-        acc['events_per_sid'] /= len(gmfs)
-    acc['elt'] = numpy.fromiter(  # this is ultra-fast
-        ((eid, losses)
-         for eid, losses in lba.losses_by_E.items() if losses.sum()),
-        elt_dt)
-    acc['alt'] = {idx: numpy.fromiter(  # already sorted by aid, ultra-fast
-        ((eid, loss) for eid, loss in lba.alt[idx].items()), elt_dt)
-                  for idx in lba.alt}
+            lba.reduce()
+    if nrecords == 0:
+        return {}
+    acc['events_per_sid'] /= nrecords
+    with mon_agg:
+        acc['elt'] = lba.get_elt()
+        acc['alt'] = lba.get_alt(data.aggnames) if aggby else {}
     if param['avg_losses']:
         acc['losses_by_A'] = param['lba'].losses_by_A * param['ses_ratio']
         # without resetting the cache the sequential avg_losses would be wrong!
@@ -139,23 +197,34 @@ def ebrisk(rupgetter, param, monitor):
     """
     mon_rup = monitor('getting ruptures', measuremem=False)
     mon_haz = monitor('getting hazard', measuremem=True)
-    gmfs = []
     gmf_info = []
     srcfilter = monitor.read('srcfilter')
     gg = getters.GmfGetter(rupgetter, srcfilter, param['oqparam'],
                            param['amplifier'])
-    nbytes = 0
-    with mon_haz:
+    if gg.correl_model:
+        gg.correl_model.set_monitor(monitor)
+
+    def gen_gmfs():
+        # yield the GMFs in chunks, so that the losses are computed
+        # without keeping in memory all the GMF records of the task
         for c in gg.gen_computers(mon_rup):
-            data, time_by_rup = c.compute_all(gg.min_iml, gg.rlzs_by_gsim)
-            if len(data):
-                gmfs.append(data)
-                nbytes += data.nbytes
+            chunks = c.gen_gmfs(gg.min_iml, gg.rlzs_by_gsim,
+                                chunksize=GMF_CHUNKSIZE)
+            rupbytes = 0
+            dt = 0
+            while True:
+                with mon_haz:
+                    data = next(chunks, None)
+                dt += mon_haz.dt
+                if data is None:
+                    break
+                rupbytes += data.nbytes
+                yield data
+            if rupbytes:
                 gmf_info.append((c.ebrupture.id, mon_haz.task_no, len(c.sids),
-                                 data.nbytes, mon_haz.dt))
-    if not gmfs:
-        return {}
-    res = calc_risk(numpy.concatenate(gmfs), param, monitor)
+                                 rupbytes, dt))
+
+    res = calc_risk(gen_gmfs(), param, monitor)
     if gmf_info:
         res['gmf_info'] = numpy.array(gmf_info, gmf_info_dt)
     return res
@@ -237,6 +306,7 @@ class EbriskCalculator(event_based.EventBasedCalculator):
         oq = self.oqparam
         self.set_param(
             hdf5path=self.datastore.filename,
+            checksum32=self.datastore['/'].attrs.get('checksum32', 0),
             tempname=cache_epsilons(
                 self.datastore, oq, self.assetcol, self.crmodel, self.E))
         srcfilter = self.src_filter()
@@ -289,6 +359,7 @@ class EbriskCalculator(event_based.EventBasedCalculator):
         oq = self.oqparam
         if oq.avg_losses:
             self.datastore['avg_losses-stats'].attrs['stat'] = [b'mean']
+        risk_cache.clear()  # in case the tasks run in this process
         prc = PostRiskCalculator(oq, self.datastore.calc_id)
         prc.datastore.parent = self.datastore.parent
         prc.run()
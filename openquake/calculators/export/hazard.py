@@ -19,12 +19,15 @@
 import re
 import os
 import sys
+import tempfile
 import itertools
 import collections
 import numpy
+import pandas
 
+from openquake.baselib import hdf5, config
 from openquake.baselib.general import (
-    group_array, deprecated, AccumDict, DictArray)
+    group_array, deprecated, AccumDict, DictArray, gen_slices)
 from openquake.baselib.python3compat import decode
 from openquake.hazardlib.imt import from_string
 from openquake.calculators.views import view
@@ -39,6 +42,9 @@ U8 = numpy.uint8
 U16 = numpy.uint16
 U32 = numpy.uint32
 
+# max number of rows of the gmf_data table read at once in the exporters
+GMF_CHUNKSIZE = 10_000_000
+
 # with compression you can save 60% of space by losing only 10% of saving time
 savez = numpy.savez_compressed
 
@@ -391,15 +397,84 @@ def export_hazard_npz(ekey, dstore):
     return [fname]
 
 
+def gen_event_blocks(n, num_events, read_eids, read, chunksize):
+    """
+    Yield the rows of a table as record arrays of contiguous events,
+    reading at most `chunksize` rows at the time. If the table is larger
+    than that, the rows are first distributed in blocks with at most
+    `chunksize` rows (unless a single event has more rows than that),
+    stored in a temporary file; the rows in a block are not sorted.
+
+    :param n: the number of rows in the table
+    :param num_events: the total number of events
+    :param read_eids: a function slice -> event IDs of the rows
+    :param read: a function slice -> record array
+    :param chunksize: the maximum number of rows to read at once
+    """
+    if n <= chunksize:  # small table
+        yield read(slice(0, n))
+        return
+    counts = numpy.zeros(num_events, int)
+    for slc in gen_slices(0, n, chunksize):
+        counts += numpy.bincount(read_eids(slc), minlength=num_events)
+    cumcounts = numpy.cumsum(counts)
+    edges = [0]
+    while edges[-1] < num_events:
+        start = cumcounts[edges[-1] - 1] if edges[-1] else 0
+        stop = numpy.searchsorted(cumcounts, start + chunksize, 'right')
+        edges.append(max(stop, edges[-1] + 1))
+    # use the temporary directory of the engine, if it exists
+    tmpdir = config.directory.custom_tmp
+    if not (tmpdir and os.path.isdir(tmpdir)):
+        tmpdir = None  # the default one
+    fd, tmp = tempfile.mkstemp(suffix='.hdf5', dir=tmpdir)
+    os.close(fd)
+    try:
+        with hdf5.File(tmp, 'w') as f:
+            for slc in gen_slices(0, n, chunksize):
+                recs = read(slc)
+                blocks = numpy.searchsorted(edges, read_eids(slc), 'right') - 1
+                # sort the rows by block and split them at the boundaries
+                order = numpy.argsort(blocks, kind='stable')
+                recs, blocks = recs[order], blocks[order]
+                bs = numpy.unique(blocks)
+                idxs = numpy.searchsorted(blocks, bs)
+                for b, rows in zip(bs, numpy.split(recs, idxs[1:])):
+                    if str(b) not in f:
+                        f.create_dataset(str(b), (0,), recs.dtype,
+                                         maxshape=(None,), chunks=True)
+                    hdf5.extend(f[str(b)], rows)
+            for b in range(len(edges) - 1):
+                if str(b) in f:
+                    yield f[str(b)][()]
+    finally:
+        os.remove(tmp)
+
+
+def gen_gmf_blocks(dstore, chunksize=GMF_CHUNKSIZE):
+    """
+    Yield the gmf_data table as DataFrames sorted by (eid, sid), reading
+    at most `chunksize` rows at the time, see :func:`gen_event_blocks`.
+
+    :param dstore: a DataStore with a gmf_data table
+    :param chunksize: the maximum number of rows to read at once
+    """
+    eid = dstore['gmf_data/eid']
+    blocks = gen_event_blocks(
+        len(eid), len(dstore['events']), eid.__getitem__,
+        lambda slc: dstore.read_df('gmf_data', slc=slc).to_records(
+            index=False), chunksize)
+    for recs in blocks:
+        yield pandas.DataFrame(recs).sort_values(['eid', 'sid'])
+
+
 @export.add(('gmf_data', 'csv'))
 def export_gmf_data_csv(ekey, dstore):
     oq = dstore['oqparam']
     imts = list(oq.imtls)
-    df = dstore.read_df('gmf_data').sort_values(['eid', 'sid'])
     ren = {'sid': 'site_id', 'eid': 'event_id'}
     for m, imt in enumerate(imts):
         ren[f'gmv_{m}'] = 'gmv_' + imt
-    df.rename(columns=ren, inplace=True)
     event_id = dstore['events']['id']
     f = dstore.build_fname('sitemesh', '', 'csv')
     arr = dstore['sitecol'][['lon', 'lat']]
@@ -407,7 +482,11 @@ def export_gmf_data_csv(ekey, dstore):
     sites = util.compose_arrays(sids, arr, 'site_id')
     writers.write_csv(f, sites)
     fname = dstore.build_fname('gmf', 'data', 'csv')
-    df.to_csv(fname, index=False, float_format=writers.FIVEDIGITS)
+    with open(fname, 'w', newline='') as dest:
+        for i, df in enumerate(gen_gmf_blocks(dstore)):
+            df.rename(columns=ren, inplace=True)
+            df.to_csv(dest, index=False, header=i == 0,
+                      float_format=writers.FIVEDIGITS)
     if 'sigma_epsilon' in dstore['gmf_data']:
         sig_eps_csv = dstore.build_fname('sigma_epsilon', '', 'csv')
         sig_eps = dstore['gmf_data/sigma_epsilon'][()]
@@ -27,7 +27,7 @@ from openquake.risklib import scientific
 from openquake.calculators.extract import (
     extract, build_damage_dt, build_damage_array, sanitize)
 from openquake.calculators.export import export, loss_curves
-from openquake.calculators.export.hazard import savez
+from openquake.calculators.export.hazard import savez, gen_event_blocks
 from openquake.commonlib import writers
 from openquake.commonlib.util import get_assets, compose_arrays
 
@@ -37,6 +37,7 @@ F64 = numpy.float64
 U16 = numpy.uint16
 U32 = numpy.uint32
 stat_dt = numpy.dtype([('mean', F32), ('stddev', F32)])
+EVENT_CHUNKSIZE = 100_000  # number of events converted at once in CSV
 
 
 def add_columns(table, **columns):
@@ -232,17 +233,26 @@ def export_losses_by_event(ekey, dstore):
     if oq.investigation_time:  # not scenario
         columns['rup_id'] = lambda rec: events[rec.event_id]['rup_id']
         columns['year'] = lambda rec: events[rec.event_id]['year']
-    lbe = dstore['losses_by_event'][()]
-    lbe.sort(order='event_id')
-    dic = dict(shape_descr=['event_id'])
-    dic['event_id'] = list(lbe['event_id'])
+    dset = dstore['losses_by_event']
     # example (0, 1, 2, 3) -> (0, 2, 3, 1)
-    axis = [0] + list(range(2, len(lbe['loss'].shape))) + [1]
-    data = lbe['loss'].transpose(axis)  # shape (E, T..., L)
-    aw = hdf5.ArrayWrapper(data, dic, oq.loss_names)
-    table = add_columns(aw.to_table(), **columns)
-    writer.save(table, dest, comment=md)
-    return writer.getsaved()
+    axis = [0] + list(range(2, len(dset.dtype['loss'].shape) + 1)) + [1]
+    # read and convert the events in blocks, to avoid building a huge table
+    blocks = gen_event_blocks(
+        len(dset), len(events), lambda slc: dset['event_id', slc],
+        dset.__getitem__, EVENT_CHUNKSIZE)
+    with open(dest, 'w', newline='') as f:
+        for i, lbe in enumerate(blocks):
+            lbe.sort(order='event_id')
+            dic = dict(shape_descr=['event_id'])
+            dic['event_id'] = list(lbe['event_id'])
+            data = lbe['loss'].transpose(axis)  # shape (E, T..., L)
+            aw = hdf5.ArrayWrapper(data, dic, oq.loss_names)
+            table = add_columns(aw.to_table(), **columns)
+            if i == 0:
+                writer.save(table, f, comment=md)
+            elif len(table) > 1:  # skip the header
+                writer.save_block(table[1:], f)
+    return [dest]
 
 
 def _compact(array):
@@ -16,8 +16,11 @@
 # You should have received a copy of the GNU Affero General Public License
 # along with OpenQuake.  If not, see <http://www.gnu.org/licenses/>.
 from urllib.parse import parse_qs
-from functools import lru_cache, partial
+from functools import partial
 import collections
+import copy
+import os
+import sys
 import logging
 import json
 import gzip
@@ -31,6 +34,7 @@ import numpy
 import pandas
 
 from openquake.baselib import config, hdf5, general
+from openquake.baselib.performance import ReadCache
 from openquake.baselib.hdf5 import ArrayWrapper
 from openquake.baselib.general import group_array, println
 from openquake.baselib.python3compat import encode, decode
@@ -48,7 +52,8 @@ TWO32 = 2 ** 32
 ALL = slice(None)
 CHUNKSIZE = 4*1024**2  # 4 MB
 SOURCE_ID = stochastic.rupture_dt['source_id']
-memoized = lru_cache()
+# 256 MB per process
+extract_cache = general.register_cache(ReadCache(maxbytes=2 ** 28))
 FLOAT = (float, numpy.float32, numpy.float64)
 INT = (int, numpy.int32, numpy.uint32, numpy.int64, numpy.uint64)
 
@@ -197,30 +202,82 @@ class Extract(dict):
     string) by passing as argument the second part of `fullkey`.
 
     For instance extract(dstore, 'sitecol').
+
+    The functions added with `cache=True` store their results in
+    `extract_cache`, keyed by datastore file name, full key and file
+    modification time, but only for datastores open in read mode.
+    Since the cached results are shared, the callers receive deep copies,
+    so they can change them freely. The hits and misses of the cache in
+    the current process can be extracted with extract(dstore, 'cache_info').
     """
+    def __init__(self):
+        super().__init__()
+        self.cached = set()
+        self.hits = collections.Counter()
+        self.misses = collections.Counter()
+
     def add(self, key, cache=False):
         def decorator(func):
-            self[key] = memoized(func) if cache else func
+            self[key] = func
+            if cache:
+                self.cached.add(key)
             return func
         return decorator
 
     def __call__(self, dstore, key):
         if '/' in key:
             k, v = key.split('/', 1)
-            data = self[k](dstore, v)
         elif '?' in key:
             k, v = key.split('?', 1)
-            data = self[k](dstore, v)
         elif key in self:
-            data = self[key](dstore, '')
+            k, v = key, ''
+        else:
+            return ArrayWrapper.from_(extract_(dstore, key))
+        if k not in self.cached or getattr(dstore, 'mode', None) != 'r':
+            return ArrayWrapper.from_(self[k](dstore, v))
+        ckey = (dstore.filename, key, os.path.getmtime(dstore.filename))
+        try:
+            data = extract_cache[ckey]
+        except KeyError:  # not cached, or evicted by another thread
+            self.misses[k] += 1
+            data = ArrayWrapper.from_(self[k](dstore, v))
+            nbytes = sum(getattr(val, 'nbytes', None) or sys.getsizeof(val)
+                         for val in vars(data).values())
+            extract_cache.add(ckey, data, nbytes)
         else:
-            data = extract_(dstore, key)
-        return ArrayWrapper.from_(data)
+            self.hits[k] += 1
+        # the exporters sort and change the arrays in place, so the
+        # callers receive a copy and the cached object is never touched
+        return copy.deepcopy(data)
+
+    def cache_info(self):
+        """
+        :returns: a dictionary extractor -> (hits, misses, hit rate)
+        """
+        dic = {}
+        for k in sorted(self.hits + self.misses):
+            hits, misses = self.hits[k], self.misses[k]
+            dic[k] = hits, misses, hits / (hits + misses)
+        return dic
 
 
 extract = Extract()
 
 
+@extract.add('cache_info')
+def extract_cache_info(dstore, dummy):
+    """
+    Extract the hits and misses of the cached extractors in the current
+    process. Use it as /extract/cache_info
+    """
+    info = extract.cache_info()
+    dt = [('extractor', (numpy.string_, 50)), ('hits', U32), ('misses', U32),
+          ('hit_rate', F32)]
+    arr = numpy.array([(k,) + info[k] for k in info], dt)
+    return ArrayWrapper(arr, dict(nbytes=extract_cache.nbytes,
+                                  maxbytes=extract_cache.maxbytes))
+
+
 @extract.add('oqparam')
 def extract_oqparam(dstore, dummy):
     """
@@ -231,7 +288,7 @@ def extract_oqparam(dstore, dummy):
 
 
 # used by the QGIS plugin in scenario
-@extract.add('realizations')
+@extract.add('realizations', cache=True)
 def extract_realizations(dstore, dummy):
     """
     Extract an array of realizations. Use it as /extract/realizations
@@ -273,7 +330,7 @@ def extract_gsims_by_trt(dstore, what):
     return ArrayWrapper((), dstore['full_lt'].gsim_lt.values)
 
 
-@extract.add('exposure_metadata')
+@extract.add('exposure_metadata', cache=True)
 def extract_exposure_metadata(dstore, what):
     """
     Extract the loss categories and the tags of the exposure.
@@ -340,7 +397,7 @@ def extract_asset_risk(dstore, what):
     return ArrayWrapper(arr, dict(json=dumps(dic)))
 
 
-@extract.add('asset_tags')
+@extract.add('asset_tags', cache=True)
 def extract_asset_tags(dstore, tagname):
     """
     Extract an array of asset tags for the given tagname. Use it as
@@ -410,7 +467,7 @@ def _get_dict(dstore, name, imtls, stats):
     return dic
 
 
-@extract.add('sitecol')
+@extract.add('sitecol', cache=True)
 def extract_sitecol(dstore, what):
     """
     Extracts the site collection array (not the complete object, otherwise it
@@ -444,7 +501,7 @@ def _items(dstore, name, what, info):
     yield from params.items()
 
 
-@extract.add('hcurves')
+@extract.add('hcurves', cache=True)
 def extract_hcurves(dstore, what):
     """
     Extracts hazard curves. Use it as /extract/hcurves?kind=mean&imt=PGA or
@@ -461,7 +518,7 @@ def extract_hcurves(dstore, what):
     yield from _items(dstore, 'hcurves', what, info)
 
 
-@extract.add('hmaps')
+@extract.add('hmaps', cache=True)
 def extract_hmaps(dstore, what):
     """
     Extracts hazard maps. Use it as /extract/hmaps?imt=PGA
@@ -479,7 +536,7 @@ def extract_hmaps(dstore, what):
     yield from _items(dstore, 'hmaps', what, info)
 
 
-@extract.add('uhs')
+@extract.add('uhs', cache=True)
 def extract_uhs(dstore, what):
     """
     Extracts uniform hazard spectra. Use it as /extract/uhs?kind=mean or
@@ -527,7 +584,7 @@ def extract_rups_by_mag_dist(dstore, what):
     return extract_effect(dstore, 'rups_by_mag_dist')
 
 
-@extract.add('sources')
+@extract.add('sources', cache=True)
 def extract_sources(dstore, what):
     """
     Extract information about a source model.
@@ -686,7 +743,7 @@ extract.add('tot_curves')(partial(extract_curves, tot='tot_'))
 extract.add('app_curves')(partial(extract_curves, tot='app_'))
 
 
-@extract.add('agg_curves')
+@extract.add('agg_curves', cache=True)
 def extract_agg_curves(dstore, what):
     """
     Aggregate loss curves from the ebrisk calculator:
@@ -745,7 +802,7 @@ def extract_agg_curves(dstore, what):
     return ArrayWrapper(arr, dict(json=dumps(attrs)))
 
 
-@extract.add('agg_losses')
+@extract.add('agg_losses', cache=True)
 def extract_agg_losses(dstore, what):
     """
     Aggregate losses of the given loss type and tags. Use it as
@@ -1279,7 +1336,7 @@ class RuptureData(object):
         return numpy.array(data, self.dt)
 
 
-@extract.add('rupture_info')
+@extract.add('rupture_info', cache=True)
 def extract_rupture_info(dstore, what):
     """
     Extract some information about the ruptures, including the boundary.
@@ -133,10 +133,8 @@ class PmapGetter(object):
 
         # populate _pmap
         dset = dstore['_poes']  # NLG_
-        L, G = dset.shape[1:]
-        self._pmap = probability_map.ProbabilityMap.build(L, G, self.sids)
-        for sid, array in zip(self.sids, dset[list(self.sids)]):
-            self._pmap[sid].array = array
+        self._pmap = probability_map.ProbabilityMap.from_array(
+            dset[list(self.sids)], self.sids)
         self.nbytes = self._pmap.nbytes
         dstore.close()
         return self._pmap
@@ -193,9 +191,7 @@ class PmapGetter(object):
             # the standard deviation is zero
             pmap = self.get(0)
             for sid, pcurve in pmap.items():
-                array = numpy.zeros(pcurve.array.shape)
-                array[:, 0] = pcurve.array[:, 0]
-                pcurve.array = array
+                pcurve.array[:, 1:] = 0  # the curves are views on the map
             return pmap
         L = len(self.imtls.array)
         pmap = probability_map.ProbabilityMap.build(L, 1, self.sids)
@@ -351,6 +347,8 @@ class GmfGetter(object):
         """
         oq = self.oqparam
         mon = monitor('getting ruptures', measuremem=True)
+        if self.correl_model:
+            self.correl_model.set_monitor(monitor)
         hcurves = {}  # key -> poes
         if oq.hazard_curves_from_gmfs:
             hc_mon = monitor('building hazard curves', measuremem=False)
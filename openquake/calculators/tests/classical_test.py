@@ -20,7 +20,7 @@ import os
 import gzip
 import unittest
 import numpy
-from openquake.baselib import parallel, general
+from openquake.baselib import parallel, general, datastore
 from openquake.hazardlib import lt
 from openquake.calculators.views import view
 from openquake.calculators.export import export
@@ -103,6 +103,24 @@ class ClassicalTestCase(CalculatorTestCase):
         sitecol = extract(self.calc.datastore, 'sitecol')
         self.assertEqual(len(sitecol.array), 1)
 
+        # check the extraction cache, used with the datastores in read mode
+        self.calc.datastore.close()
+        hits = extract.hits['hcurves']
+        with datastore.read(self.calc.datastore.filename) as ds:
+            hcurves = extract(ds, 'hcurves?kind=mean&imt=PGA')
+            self.assertIsNot(extract(ds, 'hcurves?kind=mean&imt=PGA'),
+                             hcurves)
+            rlzs = extract(ds, 'realizations')
+            expected = rlzs.array.copy()
+            rlzs.array.sort(order='weight')  # as done by the exporters
+            rlzs.array['weight'] = 0  # the cached object is not affected
+            numpy.testing.assert_equal(
+                extract(ds, 'realizations').array, expected)
+            info = extract(ds, 'cache_info')
+        self.assertEqual(extract.hits['hcurves'] - hits, 1)
+        [row] = info[info['extractor'] == b'hcurves']
+        self.assertEqual(row['hits'], extract.hits['hcurves'])
+
         # check minimum_magnitude discards the source
         with self.assertRaises(RuntimeError) as ctx:
             self.run_calc(case_1.__file__, 'job.ini', minimum_magnitude='4.5')
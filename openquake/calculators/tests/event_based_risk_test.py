@@ -17,6 +17,7 @@
 # along with OpenQuake. If not, see <http://www.gnu.org/licenses/>.
 import os
 import logging
+import unittest
 from unittest import mock
 import numpy
 
@@ -26,8 +27,10 @@ from openquake.commonlib import logs
 from openquake.calculators.views import view, rst_table
 from openquake.calculators.tests import CalculatorTestCase, strip_calc_id
 from openquake.calculators.export import export
+from openquake.calculators.export import risk as export_risk
 from openquake.calculators.extract import extract
 from openquake.calculators.post_risk import PostRiskCalculator
+from openquake.calculators import ebrisk
 from openquake.qa_tests_data.event_based_risk import (
     case_1, case_2, case_3, case_4, case_4a, case_6c, case_master, case_miriam,
     occupants, case_1f, case_1g, case_7a, recompute)
@@ -149,6 +152,25 @@ class EventBasedRiskTestCase(CalculatorTestCase):
         tmp = gettemp(rst_table(aw.to_table()))
         self.assertEqualFiles('expected/agg_curves4.csv', tmp)
 
+    def test_case_1_eb_chunks(self):
+        # the losses do not depend on the size of the GMF chunks
+        with mock.patch.object(ebrisk, 'GMF_CHUNKSIZE', 3):
+            self.run_calc(case_1.__file__, 'job_eb.ini', concurrent_tasks='4')
+        [fname] = export(('avg_losses-stats', 'csv'), self.calc.datastore)
+        self.assertEqualFiles('expected/%s' % strip_calc_id(fname), fname)
+        [fname] = export(('losses_by_event', 'csv'), self.calc.datastore)
+        self.assertEqualFiles('expected/%s' % strip_calc_id(fname), fname,
+                              delta=1E-5)
+
+        # exporting the events in several blocks gives the same file
+        self.assertGreater(len(self.calc.datastore['losses_by_event']), 3)
+        with open(fname) as f:
+            expected = f.read()
+        with mock.patch.object(export_risk, 'EVENT_CHUNKSIZE', 3):
+            [fname] = export(('losses_by_event', 'csv'), self.calc.datastore)
+        with open(fname) as f:
+            self.assertEqual(f.read(), expected)
+
     def test_insured_losses(self):
         # TODO: fix extract agg_curves for insured types
 
@@ -457,3 +479,35 @@ class EventBasedRiskTestCase(CalculatorTestCase):
         oq.hazard_calculation_id = parent.calc_id
         with mock.patch.dict(os.environ, {'OQ_DISTRIBUTE': 'no'}):
             prc.run()
+
+
+class RiskCacheTestCase(unittest.TestCase):
+    def setUp(self):
+        ebrisk.risk_cache.clear()
+        self.param = dict(hdf5path='calc_1.hdf5', checksum32=123)
+
+    def get_risk_data(self, calc_id, **kw):
+        param = dict(self.param, **kw)
+        return ebrisk.get_risk_data(param, mock.Mock(calc_id=calc_id))
+
+    def test_hits_and_invalidation(self):
+        read = mock.Mock(side_effect=lambda key, param, monitor:
+                         ebrisk.RiskData(key, {}, None, []))
+        with mock.patch.object(ebrisk, 'read_risk_data', read):
+            data = self.get_risk_data(1)
+            self.assertIs(self.get_risk_data(1), data)  # hit
+            self.assertEqual(read.call_count, 1)
+
+            # a new calculation invalidates the cache
+            data2 = self.get_risk_data(2)
+            self.assertEqual(data2.key, (2, 'calc_1.hdf5', 123))
+            self.assertEqual(read.call_count, 2)
+
+            # a change in the checksum invalidates the cache
+            data3 = self.get_risk_data(2, checksum32=456)
+            self.assertEqual(data3.key, (2, 'calc_1.hdf5', 456))
+            self.assertEqual(read.call_count, 3)
+            self.assertIs(ebrisk.risk_cache.data, data3)
+
+        ebrisk.risk_cache.clear()  # as done at the end of the calculation
+        self.assertIsNone(ebrisk.risk_cache.data)
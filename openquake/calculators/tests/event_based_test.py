@@ -20,9 +20,12 @@ import io
 import os
 import re
 import math
+import tempfile
+from unittest import mock
 
 import numpy.testing
 
+from openquake.baselib import config
 from openquake.baselib.hdf5 import read_csv
 from openquake.baselib.general import countby, gettemp
 from openquake.baselib.datastore import read
@@ -33,6 +36,7 @@ from openquake.commonlib.util import max_rel_diff_index
 from openquake.commonlib.calc import gmvs_to_poes
 from openquake.calculators.views import view
 from openquake.calculators.export import export
+from openquake.calculators.export.hazard import gen_gmf_blocks
 from openquake.calculators.extract import extract
 from openquake.calculators.getters import get_gmfgetter
 from openquake.calculators.event_based import get_mean_curves
@@ -308,6 +312,23 @@ class EventBasedTestCase(CalculatorTestCase):
         # this is a case where there are 2 ruptures and 1 gmv per site
         self.assertEqual(len(self.calc.datastore['gmf_data/eid']), 39)
 
+        # reading the gmf_data in blocks gives the same ordering
+        [df] = gen_gmf_blocks(self.calc.datastore)
+        tmpdir = tempfile.mkdtemp()
+        with mock.patch.dict(config.directory, custom_tmp=tmpdir):
+            blocks = gen_gmf_blocks(self.calc.datastore, chunksize=10)
+            dfs = [next(blocks)]
+            # the blocks are stored in the temporary directory of the engine
+            [tmp] = os.listdir(tmpdir)
+            self.assertTrue(tmp.endswith('.hdf5'))
+            dfs.extend(blocks)
+        self.assertEqual(os.listdir(tmpdir), [])  # removed at the end
+        os.rmdir(tmpdir)
+        self.assertGreater(len(dfs), 1)
+        numpy.testing.assert_equal(
+            numpy.concatenate([d.to_records(index=False) for d in dfs]),
+            df.to_records(index=False))
+
     def test_case_10(self):
         # this is a case with multiple files in the smlt uncertaintyModel
         # and with sampling
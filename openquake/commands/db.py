@@ -48,8 +48,15 @@ def convert(strings):
 @sap.script
 def db(cmd, args=()):
     """
-    Run a database command
+    Run a database command; `oq db stats` shows the latency histograms
+    of the commands served by the DbServer
     """
+    if cmd == 'stats':
+        dbserver.ensure_on()
+        bins = ['<%ss' % b for b in dbserver.LATENCY_BINS]
+        header = ['command', 'calls'] + bins + ['>=%ss' % bins[-1][1:-1]]
+        print(rst_table(logs.dbcmd('stats'), header))
+        return
     if cmd in commands and len(args) != len(commands[cmd]):
         sys.exit('Wrong number of arguments, expected %s, got %s' % (
             commands[cmd], args))
@@ -472,6 +472,22 @@ class DbTestCase(unittest.TestCase):
             except dbapi.NotFound:  # happens on an empty db
                 pass
 
+    def test_stats(self):
+        stats = [('get_job', 3, 2, 1, 0, 0, 0, 0),
+                 ('sql', 1, 0, 0, 0, 1, 0, 0)]
+        with Print.patch() as p, mock.patch(
+                'openquake.server.dbserver.ensure_on'), mock.patch(
+                'openquake.commonlib.logs.dbcmd', return_value=stats) as cmd:
+            db('stats')
+        cmd.assert_called_once_with('stats')
+        lines = str(p).splitlines()
+        self.assertEqual(lines[1].split(), [
+            'command', 'calls', '<0.001s', '<0.01s', '<0.1s', '<1s', '<10s',
+            '>=10s'])
+        self.assertEqual(lines[3].split(), ['get_job', '3', '2', '1', '0',
+                                            '0', '0', '0'])
+        self.assertEqual(lines[4].split()[:2], ['sql', '1'])
+
 
 class EngineRunJobTestCase(unittest.TestCase):
     def test_multi_run(self):
@@ -222,17 +222,15 @@ def make_hmap(pmap, imtls, poes, sid=None):
         pmap = {sid: pmap}
         sids = [sid]
     M, P = len(imtls), len(poes)
-    hmap = probability_map.ProbabilityMap.build(M, P, sids, dtype=F32)
-    if len(pmap) == 0:
-        return hmap  # empty hazard map
+    if len(pmap) == 0:  # empty hazard map
+        return probability_map.ProbabilityMap.build(M, P, sids, dtype=F32)
+    curves = numpy.array([pmap[sid].array[:, 0] for sid in sids])  # (N, L)
+    array = numpy.zeros((len(sids), M, P), F32)
     for i, imt in enumerate(imtls):
-        curves = numpy.array([pmap[sid].array[imtls(imt), 0] for sid in sids])
-        data = compute_hazard_maps(curves, imtls[imt], poes)  # array (N, P)
-        for sid, value in zip(sids, data):
-            array = hmap[sid].array
-            for j, val in enumerate(value):
-                array[i, j] = val
-    return hmap
+        # array of shape (N, P)
+        array[:, i] = compute_hazard_maps(curves[:, imtls(imt)], imtls[imt],
+                                          poes)
+    return probability_map.ProbabilityMap.from_array(array, sids)
 
 
 def make_uhs(hmap, info):
@@ -19,8 +19,13 @@
 Set up some system-wide loggers
 """
 import os.path
+import sys
+import time
+import queue
 import socket
 import logging
+import threading
+import traceback
 from datetime import datetime
 from contextlib import contextmanager
 from openquake.baselib import zeromq, config, parallel, datastore
@@ -32,22 +37,45 @@ LEVELS = {'debug': logging.DEBUG,
           'critical': logging.CRITICAL}
 
 DBSERVER_PORT = int(os.environ.get('OQ_DBSERVER_PORT') or config.dbserver.port)
+# log records sent to the database at most every .5 seconds
+LOG_INTERVAL = .5
+LOG_BATCH = 1000  # maximum number of log records sent in a single command
+
+_local = threading.local()  # the REQ sockets are not thread-safe
+
+
+def _get_socket():
+    # returns a REQ socket connected to the DbServer, reusing the socket
+    # of the current thread and process if already open
+    url = 'tcp://%s:%s' % (config.dbserver.host, DBSERVER_PORT)
+    sock = getattr(_local, 'sock', None)
+    if sock is None or _local.key != (url, os.getpid()):
+        host = socket.gethostbyname(config.dbserver.host)
+        sock = zeromq.Socket('tcp://%s:%s' % (host, DBSERVER_PORT),
+                             zeromq.zmq.REQ, 'connect').__enter__()
+        _local.sock = sock
+        _local.key = url, os.getpid()
+    return sock
 
 
 def dbcmd(action, *args):
     """
-    A dispatcher to the database server.
+    A dispatcher to the database server. The connection is kept open
+    and reused by the following calls in the same thread.
 
     :param string action: database action to perform
     :param tuple args: arguments
     """
-    host = socket.gethostbyname(config.dbserver.host)
-    sock = zeromq.Socket(
-        'tcp://%s:%s' % (host, DBSERVER_PORT), zeromq.zmq.REQ, 'connect')
-    with sock:
+    sock = _get_socket()
+    try:
         res = sock.send((action,) + args)
-        if isinstance(res, parallel.Result):
-            return res.get()
+    except BaseException:
+        # a REQ socket without a reply cannot be used anymore
+        del _local.sock
+        sock.__exit__(None, None, None)
+        raise
+    if isinstance(res, parallel.Result):
+        return res.get()
     return res
 
 
@@ -100,17 +128,53 @@ class LogFileHandler(logging.FileHandler):
 
 class LogDatabaseHandler(logging.Handler):
     """
-    Log stream handler
+    Log database handler. The records are sent to the database in
+    batches by a background thread, so that logging does not slow down
+    the calculation; the pending records are sent when the handler is
+    closed.
     """
     def __init__(self, job_id):
         super().__init__()
         self.job_id = job_id
+        self.queue = queue.Queue()
+        self.thread = threading.Thread(target=self._send, daemon=True)
+        self.thread.start()
 
     def emit(self, record):  # pylint: disable=E0202
         if record.levelno >= logging.INFO:
-            dbcmd('log', self.job_id, datetime.utcnow(), record.levelname,
-                  '%s/%s' % (record.processName, record.process),
-                  record.getMessage())
+            self.queue.put((self.job_id, datetime.utcnow(), record.levelname,
+                            '%s/%s' % (record.processName, record.process),
+                            record.getMessage()))
+
+    def _send(self):
+        # send the records in the queue until the None sentinel is found
+        done = False
+        while not done:
+            records = [self.queue.get()]
+            deadline = time.time() + LOG_INTERVAL
+            while len(records) < LOG_BATCH and records[-1] is not None:
+                timeout = deadline - time.time()
+                try:
+                    records.append(self.queue.get(timeout=max(timeout, 0)))
+                except queue.Empty:
+                    break
+            if None in records:
+                done = True
+                records = records[:records.index(None)]
+            if records:
+                try:
+                    dbcmd('log_records', records)
+                except Exception:  # for instance the DbServer is down
+                    sys.stderr.write(traceback.format_exc())
+
+    def close(self):
+        """
+        Send the pending records and stop the background thread
+        """
+        if self.thread.is_alive():
+            self.queue.put(None)
+            self.thread.join()
+        super().close()
 
 
 @contextmanager
@@ -145,6 +209,7 @@ def handle(job_id, log_level='info', log_file=None):
             logging.root.warn('The log file %s is empty!?' % log_file)
         for handler in handlers:
             logging.root.removeHandler(handler)
+            handler.close()
 
 
 def init(calc_id='nojob', level=logging.INFO):
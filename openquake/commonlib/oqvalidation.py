@@ -206,6 +206,7 @@ class OqParam(valid.ParamSet):
     secondary_perils = valid.Param(valid.namelist, [])
     sec_peril_params = valid.Param(valid.dictionary, {})
     sensitivity_analysis = valid.Param(valid.dictionary, {})
+    sf_tolerance = valid.Param(valid.positivefloat, 0)  # used in classical
     ses_per_logic_tree_path = valid.Param(
         valid.compose(valid.nonzero, valid.positiveint), 1)
     ses_seed = valid.Param(valid.positiveint, 42)
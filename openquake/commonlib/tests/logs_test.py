@@ -0,0 +1,105 @@
+# -*- coding: utf-8 -*-
+# vim: tabstop=4 shiftwidth=4 softtabstop=4
+#
+# Copyright (C) 2020 GEM Foundation
+#
+# OpenQuake is free software: you can redistribute it and/or modify it
+# under the terms of the GNU Affero General Public License as published
+# by the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# OpenQuake is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with OpenQuake. If not, see <http://www.gnu.org/licenses/>.
+
+import time
+import logging
+import unittest
+from unittest import mock
+from openquake.commonlib import logs
+
+
+def make_record(msg, level=logging.INFO):
+    return logging.LogRecord('test', level, __file__, 1, msg, (), None)
+
+
+class LogDatabaseHandlerTestCase(unittest.TestCase):
+    def setUp(self):
+        self.batches = []
+        patcher = mock.patch.object(
+            logs, 'dbcmd', lambda action, recs: self.batches.append(recs))
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def messages(self):
+        return [rec[-1] for batch in self.batches for rec in batch]
+
+    def test_batches(self):
+        handler = logs.LogDatabaseHandler(42)
+        n = logs.LOG_BATCH * 2 + 1
+        for i in range(n):
+            handler.emit(make_record('msg %d' % i))
+        handler.emit(make_record('discarded', logging.DEBUG))
+        handler.close()
+        self.assertEqual(self.messages(), ['msg %d' % i for i in range(n)])
+        self.assertGreaterEqual(len(self.batches), 3)
+        self.assertLessEqual(max(map(len, self.batches)), logs.LOG_BATCH)
+        self.assertEqual({rec[0] for rec in self.batches[0]}, {42})
+        self.assertFalse(handler.thread.is_alive())
+
+    def test_interval(self):
+        # the records are sent at the end of the interval
+        with mock.patch.object(logs, 'LOG_INTERVAL', .05):
+            handler = logs.LogDatabaseHandler(42)
+            handler.emit(make_record('first'))
+            time.sleep(.5)
+            self.assertEqual(self.messages(), ['first'])
+            handler.emit(make_record('second'))
+            handler.close()
+        self.assertEqual(self.messages(), ['first', 'second'])
+
+    def test_flush_on_close(self):
+        # close does not wait for the end of the interval
+        with mock.patch.object(logs, 'LOG_INTERVAL', 60):
+            handler = logs.LogDatabaseHandler(42)
+            handler.emit(make_record('pending'))
+            t0 = time.time()
+            handler.close()
+        self.assertLess(time.time() - t0, 10)
+        self.assertEqual(self.messages(), ['pending'])
+
+
+class DbcmdTestCase(unittest.TestCase):
+    def setUp(self):
+        vars(logs._local).clear()  # no open sockets
+        self.addCleanup(vars(logs._local).clear)
+        self.sock = mock.MagicMock()
+        socket_cls = mock.Mock()
+        socket_cls.return_value.__enter__ = mock.Mock(return_value=self.sock)
+        for patcher in [mock.patch.object(logs.zeromq, 'Socket', socket_cls),
+                        mock.patch.object(logs.socket, 'gethostbyname',
+                                          return_value='127.0.0.1')]:
+            patcher.start()
+            self.addCleanup(patcher.stop)
+        self.socket_cls = socket_cls
+
+    def test_reuse(self):
+        self.sock.send.return_value = 'ok'
+        self.assertEqual(logs.dbcmd('get_job', 1), 'ok')
+        self.assertEqual(logs.dbcmd('get_job', 2), 'ok')
+        self.assertEqual(self.socket_cls.call_count, 1)
+        self.sock.send.assert_called_with(('get_job', 2))
+
+    def test_drop_after_failure(self):
+        self.sock.send.side_effect = RuntimeError('no reply')
+        with self.assertRaises(RuntimeError):
+            logs.dbcmd('get_job', 1)
+        self.sock.__exit__.assert_called_once_with(None, None, None)
+        self.sock.send.side_effect = None
+        self.sock.send.return_value = 'ok'
+        self.assertEqual(logs.dbcmd('get_job', 1), 'ok')
+        self.assertEqual(self.socket_cls.call_count, 2)  # a new socket
@@ -141,57 +141,86 @@ class GmfComputer(object):
         :returns: [(sid, eid, gmv), ...], dt
         """
         t0 = time.time()
-        sids = self.sids
+        data = list(self.gen_gmfs(min_iml, rlzs_by_gsim, sig_eps))
+        if data:
+            d = numpy.concatenate(data)
+        else:
+            d = numpy.zeros(0, self._gmf_dt(len(min_iml)))
+        return d, time.time() - t0
+
+    def gen_gmfs(self, min_iml, rlzs_by_gsim, sig_eps=None, chunksize=None):
+        """
+        :param min_iml: an array of M minimum intensities
+        :param rlzs_by_gsim: a dictionary gsim -> realization indices
+        :param sig_eps: if not None, a list populated with the tuples
+                        (eid, rlz, sig..., eps...) of the nonzero events
+        :param chunksize: if given, the maximum number of records per array
+        :yields: arrays with fields (sid, eid, rlz, gmv, *sec_outputs)
+
+        NB: the array of shape (M, N, E) of each GSIM is computed in full,
+        since the random numbers must be drawn in the same order for the
+        results to be reproducible; only the records are built in chunks.
+        """
         eids_by_rlz = self.ebrupture.get_eids_by_rlz(rlzs_by_gsim)
-        mag = self.ebrupture.rupture.mag
-        data = []
-        No = sum(len(sp.outputs) for sp in self.sec_perils)
+        dt = self._gmf_dt(len(min_iml))
+        min_iml = numpy.array(min_iml, F32).reshape(-1, 1, 1)  # (M, 1, 1)
         for gs, rlzs in rlzs_by_gsim.items():
-            num_events = sum(len(eids_by_rlz[rlz]) for rlz in rlzs)
+            nums = [len(eids_by_rlz[rlz]) for rlz in rlzs]
+            num_events = sum(nums)
             if num_events == 0:  # it may happen
                 continue
+            eids = numpy.concatenate([eids_by_rlz[rlz] for rlz in rlzs])
+            rlzi = numpy.repeat(numpy.array(rlzs, U32), nums)
             # NB: the trick for performance is to keep the call to
             # compute.compute outside of the loop over the realizations
             # it is better to have few calls producing big arrays
             array, sig, eps = self.compute(gs, num_events)
-            array = array.transpose(1, 0, 2)  # from M, N, E to N, M, E
-            for i, miniml in enumerate(min_iml):  # gmv < minimum
-                arr = array[:, i, :]
-                arr[arr < miniml] = 0
-            n = 0
-            for rlz in rlzs:
-                eids = eids_by_rlz[rlz]
-                for ei, eid in enumerate(eids):
-                    gmfa = array[:, :, n + ei]  # shape (N, M)
-                    tot = gmfa.sum(axis=0)  # shape (M,)
-                    if not tot.sum():
-                        continue
-                    if sig_eps is not None:
-                        tup = tuple([eid, rlz] + list(sig[:, n + ei]) +
-                                    list(eps[:, n + ei]))
-                        sig_eps.append(tup)
-                    sp_out = numpy.zeros((No, len(gmfa)))  # No, N
-                    o = 0
-                    for sp in self.sec_perils:
-                        o1 = o + len(sp.outputs)
-                        sp_out[o:o1] = sp.compute(
-                            mag, zip(self.imts, gmfa.T), self.sctx)
-                        o = o1
-                    for i, gmv in enumerate(gmfa):
-                        if gmv.sum():
-                            if No:
-                                data.append((sids[i], eid, rlz, gmv) +
-                                            tuple(sp_out[:, i]))
-                            else:
-                                data.append((sids[i], eid, rlz, gmv))
-                        # gmv can be zero due to the minimum_intensity, coming
-                        # from the job.ini or from the vulnerability functions
-                n += len(eids)
-        dt = F32, (len(min_iml),)
-        dtlist = [('sid', U32), ('eid', U32), ('rlz', U32), ('gmv', dt)] + [
-            (out, F32) for sp in self.sec_perils for out in sp.outputs]
-        d = numpy.array(data, dtlist)
-        return d, time.time() - t0
+            array[array < min_iml] = 0  # gmv < minimum
+            gmfs = array.transpose(2, 1, 0)  # from M, N, E to E, N, M
+            # gmv can be zero due to the minimum_intensity, coming
+            # from the job.ini or from the vulnerability functions
+            ok = gmfs.sum(axis=2) != 0  # shape (E, N)
+            if sig_eps is not None:
+                for e in numpy.where(ok.any(axis=1))[0]:
+                    sig_eps.append(tuple([eids[e], rlzi[e]] + list(sig[:, e]) +
+                                         list(eps[:, e])))
+            # the records are ordered by event and then by site
+            e_idx, s_idx = ok.nonzero()
+            n = len(e_idx)
+            size = chunksize or n or 1
+            for start in range(0, n, size):
+                es = e_idx[start:start + size]
+                ss = s_idx[start:start + size]
+                data = numpy.zeros(len(es), dt)
+                data['sid'] = self.sids[ss]
+                data['eid'] = eids[es]
+                data['rlz'] = rlzi[es]
+                data['gmv'] = gmfs[es, ss]
+                if self.sec_perils:
+                    self._add_sec_outputs(data, gmfs, es, ss)
+                yield data
+
+    def _gmf_dt(self, M):
+        # dtype of the records returned by compute_all
+        return numpy.dtype(
+            [('sid', U32), ('eid', U32), ('rlz', U32), ('gmv', (F32, (M,)))] +
+            [(out, F32) for sp in self.sec_perils for out in sp.outputs])
+
+    def _add_sec_outputs(self, data, gmfs, es, ss):
+        # compute the secondary perils only for the events in the chunk
+        mag = self.ebrupture.rupture.mag
+        outputs = [out for sp in self.sec_perils for out in sp.outputs]
+        events, inv = numpy.unique(es, return_inverse=True)
+        sp_out = numpy.zeros((len(outputs), len(events), gmfs.shape[1]))
+        for i, e in enumerate(events):
+            o = 0
+            for sp in self.sec_perils:
+                o1 = o + len(sp.outputs)
+                sp_out[o:o1, i] = sp.compute(
+                    mag, zip(self.imts, gmfs[e].T), self.sctx)
+                o = o1
+        for o, out in enumerate(outputs):
+            data[out] = sp_out[o, inv, ss]
 
     def compute(self, gsim, num_events):
         """
@@ -36,14 +36,25 @@ from openquake.hazardlib import imt as imt_module
 from openquake.hazardlib.tom import PoissonTOM
 from openquake.hazardlib.calc.filters import MagDepDistance
 from openquake.hazardlib.probability_map import ProbabilityMap
+from openquake.hazardlib.site import site_param_dt
+from openquake.hazardlib.geo import geodetic
 from openquake.hazardlib.geo.surface import PlanarSurface
+from openquake.hazardlib.geo.surface.planar import (
+    PLANAR_DISTANCES, build_planar_array, get_distances_planar)
 
 bymag = operator.attrgetter('mag')
 bydist = operator.attrgetter('dist')
 I16 = numpy.int16
+U32 = numpy.uint32
+F64 = numpy.float64
 KNOWN_DISTANCES = frozenset(
     'rrup rx ry0 rjb rhypo repi rcdpp azimuth azimuth_cp rvolc closest_point'
     .split())
+# maximum number of distances (ruptures x sites) computed in batch
+# for the planar ruptures of a source
+MAX_PLANAR_BATCH = 1_000_000
+# distances computed together with the closest points
+CLOSEST_DISTANCES = frozenset(['closest_point', 'azimuth_cp'])
 
 
 def get_distances(rupture, sites, param):
@@ -85,6 +96,78 @@ def get_distances(rupture, sites, param):
     return dist
 
 
+class DistanceEngine(object):
+    """
+    Compute the distances between a rupture and a set of sites, sharing the
+    intermediate results between the different distance measures: the
+    closest points are computed together with rrup, the GC2 coordinates of
+    a MultiSurface are shared between rx and ry0 and the epicentral
+    distance is shared between repi and rhypo.
+
+    :param rupture: a rupture
+    :param sites: a mesh of points or a site collection
+    :param params: the distances which will be requested
+    """
+    def __init__(self, rupture, sites, params=()):
+        self.rupture = rupture
+        self.sites = sites
+        self.params = frozenset(params)
+        self.cache = {}
+
+    def filter(self, mask):
+        """
+        :param mask: a boolean mask over the sites
+        :returns: a DistanceEngine on the filtered sites, keeping the
+                  distances already computed
+        """
+        if mask.all():
+            return self
+        new = self.__class__(self.rupture, self.sites.filter(mask),
+                             self.params)
+        new.cache = {par: arr[mask] for par, arr in self.cache.items()}
+        return new
+
+    def get(self, param):
+        """
+        :param param: the kind of distance to compute
+        :returns: an array of distances from the sites
+        """
+        try:
+            return self.cache[param]
+        except KeyError:
+            pass
+        rup, sites = self.rupture, self.sites
+        if not rup.surface and param == 'closest_point':  # PointRupture
+            dist = numpy.vstack([sites.lons, sites.lats, sites.depths]).T
+        elif not rup.surface:  # PointRupture
+            dist = get_distances(rup, sites, param)
+        elif param == 'rrup' and not self.params & CLOSEST_DISTANCES:
+            dist = rup.surface.get_min_distance(sites)
+        elif param in ('rrup', 'closest_point', 'azimuth_cp'):
+            rrup, cps = rup.surface.get_closest(sites)
+            rrup.flags.writeable = False
+            self.cache['rrup'] = rrup
+            closest = numpy.vstack([cps.lons, cps.lats, cps.depths]).T
+            closest.flags.writeable = False
+            self.cache['closest_point'] = closest
+            if param != 'azimuth_cp':
+                return self.cache[param]
+            dist = geodetic.azimuth(sites.lons, sites.lats,
+                                    cps.lons, cps.lats)
+        elif param == 'repi':
+            dist = rup.hypocenter.distance_to_mesh(sites, with_depths=False)
+        elif param == 'rhypo':
+            # combine the epicentral distance with the vertical distance
+            repi = self.get('repi')
+            dist = numpy.sqrt(
+                repi ** 2 + (rup.hypocenter.depth - sites.depths) ** 2)
+        else:  # rx and ry0 on a MultiSurface share the GC2 coordinates
+            dist = get_distances(rup, sites, param)
+        dist.flags.writeable = False
+        self.cache[param] = dist
+        return dist
+
+
 class FarAwayRupture(Exception):
     """Raised if the rupture is outside the maximum distance for all sites"""
 
@@ -99,6 +182,11 @@ def get_num_distances(gsims):
     return len(dists)
 
 
+def _get_slices(tbl, C):
+    # the C+1 boundaries of the rows of each rupture in a context table
+    return numpy.searchsorted(tbl['rup_id'], numpy.arange(C + 1))
+
+
 # used only in contexts_test.py
 def _make_pmap(ctxs, cmaker):
     RuptureContext.temporal_occurrence_model = PoissonTOM(
@@ -120,6 +208,21 @@ def read_ctxs(dstore, slc=slice(None), req_site_params=None):
     site_params = {par: sitecol[par]
                    for par in req_site_params or sitecol.array.dtype.names}
     params = {n: dstore['rup/' + n][slc] for n in dstore['rup']}
+    # the site-dependent parameters are read as the columns of a context
+    # table, i.e. concatenated arrays with a row per rupture-site pair; the
+    # site parameters are extracted with a single fancy indexing operation
+    # and the contexts get views on the columns of the table
+    sids = params['sids_']
+    cuts = numpy.cumsum([len(s) for s in sids])[:-1]
+    columns = {}
+    if len(sids):
+        allsids = numpy.concatenate(sids)
+        for par, arr in site_params.items():
+            columns[par] = numpy.split(arr[allsids], cuts)
+        for par, arrays in params.items():
+            if par.endswith('_') and par != 'probs_occur_':
+                columns[par[:-1]] = numpy.split(
+                    numpy.concatenate(arrays), cuts)
     ctxs = []
     for u in range(len(params['mag'])):
         ctx = RuptureContext()
@@ -127,8 +230,8 @@ def read_ctxs(dstore, slc=slice(None), req_site_params=None):
             if par.endswith('_'):
                 par = par[:-1]
             setattr(ctx, par, arr[u])
-        for par, arr in site_params.items():
-            setattr(ctx, par, arr[ctx.sids])
+        for par, arrays in columns.items():
+            setattr(ctx, par, arrays[u])
         ctx.idx = {sid: idx for idx, sid in enumerate(ctx.sids)}
         ctxs.append(ctx)
     close_ctxs = [[] for sid in sitecol.sids]
@@ -153,12 +256,13 @@ class ContextMaker(object):
         self.point_rupture_bins = param.get('point_rupture_bins', 20)
         self.trt = trt
         self.gsims = gsims
-        self.single_site_opt = numpy.array(
-            [hasattr(gsim, 'get_mean_std1') for gsim in gsims])
+        self.vectorized = numpy.array(
+            [getattr(gsim, 'vectorized', False) for gsim in gsims])
         self.maximum_distance = (
             param.get('maximum_distance') or MagDepDistance({}))
         self.investigation_time = param.get('investigation_time')
         self.trunclevel = param.get('truncation_level')
+        self.sf_tolerance = param.get('sf_tolerance', 0.)
         self.num_epsilon_bins = param.get('num_epsilon_bins', 1)
         self.effect = param.get('effect')
         for req in self.REQUIRES:
@@ -182,6 +286,7 @@ class ContextMaker(object):
         self.reqv = param.get('reqv')
         if self.reqv is not None:
             self.REQUIRES_DISTANCES.add('repi')
+        self.ctx_dt = self._ctx_dt()
         self.mon = monitor
         self.ctx_mon = monitor('make_contexts', measuremem=False)
         self.loglevels = DictArray(self.imtls)
@@ -197,47 +302,113 @@ class ContextMaker(object):
         self.gmf_mon = monitor('computing mean_std', measuremem=False)
         self.poe_mon = monitor('get_poes', measuremem=False)
 
-    def multi(self, ctxs):
+    def _ctx_dt(self):
+        # the dtype of the context table, see .recarray
+        dtlist = [('rup_id', U32), ('sids', U32), ('occurrence_rate', F64)]
+        for par in sorted(self.REQUIRES_RUPTURE_PARAMETERS):
+            dtlist.append((par, F64))
+        for par in sorted(self.REQUIRES_SITES_PARAMETERS - {'sids'}):
+            dtlist.append((par, site_param_dt.get(par, F64)))
+        for dst in sorted(self.REQUIRES_DISTANCES):
+            dtlist.append((dst, (F64, 3) if dst == 'closest_point' else F64))
+        return numpy.dtype(dtlist)
+
+    def recarray(self, ctxs):
+        """
+        Build a context table, i.e. a record array with a row for each
+        rupture-site pair; the rupture parameters are repeated for each
+        site and the field `rup_id` is the index of the rupture in `ctxs`,
+        so the rows of each rupture are contiguous.
+
+        :params ctxs: a list of C contexts affecting N sites in total
+        :returns: a numpy.recarray of size N and dtype .ctx_dt
+        """
+        nsites = numpy.array([len(ctx.sids) for ctx in ctxs])
+        arr = numpy.zeros(nsites.sum(), self.ctx_dt).view(numpy.recarray)
+        arr['rup_id'] = numpy.repeat(numpy.arange(len(ctxs)), nsites)
+        for par in self.ctx_dt.names[1:]:
+            if par == 'occurrence_rate' or (
+                    par in self.REQUIRES_RUPTURE_PARAMETERS):
+                vals = [getattr(ctx, par, numpy.nan) for ctx in ctxs]
+                arr[par] = numpy.repeat(vals, nsites)
+            else:  # site parameter or distance
+                arr[par] = numpy.concatenate(
+                    [getattr(ctx, par) for ctx in ctxs])
+        return arr
+
+    def multi(self, ctxs, tbl=None):
         """
-        :params ctxs: a list of contexts, all referring to a single point
-        :returns: a multiple RuptureContext
+        :params ctxs: a list of C contexts affecting N sites in total
+        :params tbl: the context table of the contexts, if already built
+        :returns: a flat RuptureContext with contiguous arrays of size N
         """
+        if tbl is None:
+            tbl = self.recarray(ctxs)
         ctx = RuptureContext()
-        for par in self.REQUIRES_SITES_PARAMETERS:
-            setattr(ctx, par, getattr(ctxs[0], par))
-        for par in self.REQUIRES_RUPTURE_PARAMETERS:
-            vals = [getattr(ctx, par) for ctx in ctxs]
-            setattr(ctx, par, numpy.array(vals))
-        for par in self.REQUIRES_DISTANCES:
-            dists = [getattr(ctx, par)[0] for ctx in ctxs]
-            setattr(ctx, par, numpy.array(dists))
+        for par in self.ctx_dt.names:
+            # the GMPEs are faster on contiguous arrays than on the
+            # strided columns of the table
+            setattr(ctx, par, numpy.ascontiguousarray(tbl[par]))
         ctx.ctxs = ctxs
         return ctx
 
-    def gen_ctx_poes(self, ctxs):
+    def get_poes(self, ctxs, tbl, rtime=None):
         """
         :param ctxs: a list of C context objects
-        :yields: C pairs (ctx, poes of shape (N, L, G))
+        :param tbl: the context table of the contexts, of size N
+        :param rtime: if given, N occurrence rates times the investigation time
+        :returns: an array of PoEs (PNEs if rtime is given) of shape (N, L, G)
         """
-        nsites = numpy.array([len(ctx.sids) for ctx in ctxs])
         C = len(ctxs)
-        N = nsites.sum()
-        poes = numpy.zeros((N, len(self.loglevels.array), len(self.gsims)))
-        if self.single_site_opt.any():
-            ctx = self.multi(ctxs)
+        poes = numpy.zeros((len(tbl), len(self.loglevels.array),
+                            len(self.gsims)))
+        if self.vectorized.any() and C > 1:
+            ctx = self.multi(ctxs, tbl)
         for g, gsim in enumerate(self.gsims):
             with self.gmf_mon:
                 # builds mean_std of shape (2, N, M)
-                if self.single_site_opt[g] and C > 1 and (nsites == 1).all():
+                if self.vectorized[g] and C > 1:
                     mean_std = gsim.get_mean_std1(ctx, self.imts)
                 else:
                     mean_std = gsim.get_mean_std(ctxs, self.imts)
             with self.poe_mon:
                 # builds poes of shape (N, L, G)
                 poes[:, :, g] = gsim.get_poes(
-                    mean_std, self.loglevels, self.trunclevel, self.af, ctxs)
+                    mean_std, self.loglevels, self.trunclevel, self.af, ctxs,
+                    self.sf_tolerance, rtime)
+        return poes
+
+    def get_pnes(self, ctxs, tbl):
+        """
+        :param ctxs: a list of C context objects
+        :param tbl: the context table of the contexts, of size N
+        :returns: an array of probabilities of no exceedance (N, L, G)
+        """
+        rates = tbl['occurrence_rate']
+        toms = [ctx.temporal_occurrence_model for ctx in ctxs]
+        if (all(type(tom) is PoissonTOM for tom in toms) and
+                not numpy.isnan(rates).any()):
+            # parametric ruptures, the PNEs are computed by the GMPEs
+            # in the same pass computing the PoEs
+            tspan = numpy.array([tom.time_span for tom in toms])
+            return self.get_poes(ctxs, tbl, rates * tspan[tbl['rup_id']])
+        poes = self.get_poes(ctxs, tbl)
+        pnes = numpy.zeros_like(poes)
+        slices = _get_slices(tbl, len(ctxs))
+        for ctx, start, stop in zip(ctxs, slices, slices[1:]):
+            pnes[start:stop] = ctx.get_probability_no_exceedance(
+                poes[start:stop])
+        return pnes
+
+    def gen_ctx_poes(self, ctxs):
+        """
+        :param ctxs: a list of C context objects
+        :yields: C pairs (ctx, poes of shape (N, L, G))
+        """
+        poes = self.get_poes(ctxs, self.recarray(ctxs))
         s = 0
-        for ctx, n in zip(ctxs, nsites):
+        for ctx in ctxs:
+            n = len(ctx.sids)
             yield ctx, poes[s:s+n]
             s += n
 
@@ -277,14 +448,19 @@ class ContextMaker(object):
         :returns:
             (filtered sites, distance context)
         """
-        distances = get_distances(rup, sites, 'rrup')
-        mdist = self.maximum_distance(self.trt, rup.mag)
+        dist_eng = self._filter(DistanceEngine(rup, sites))
+        return dist_eng.sites, DistancesContext(
+            [('rrup', dist_eng.get('rrup'))])
+
+    def _filter(self, dist_eng):
+        # filter the sites of the DistanceEngine with respect to the rupture
+        distances = dist_eng.get('rrup')
+        mdist = self.maximum_distance(self.trt, dist_eng.rupture.mag)
         mask = distances <= mdist
-        if mask.any():
-            sites, distances = sites.filter(mask), distances[mask]
-        else:
-            raise FarAwayRupture('%d: %d km' % (rup.rup_id, distances.min()))
-        return sites, DistancesContext([('rrup', distances)])
+        if not mask.any():
+            raise FarAwayRupture('%d: %d km' % (
+                dist_eng.rupture.rup_id, distances.min()))
+        return dist_eng.filter(mask)
 
     def make_rctx(self, rupture):
         """
@@ -317,7 +493,7 @@ class ContextMaker(object):
             setattr(ctx, param, value)
         return ctx
 
-    def make_contexts(self, sites, rupture):
+    def make_contexts(self, sites, rupture, closest=False):
         """
         Filter the site collection with respect to the rupture and
         create context objects.
@@ -329,6 +505,9 @@ class ContextMaker(object):
             Instance of
             :class:`openquake.hazardlib.source.rupture.BaseRupture`
 
+        :param closest:
+            If True, add also the closest points to the distance context
+
         :returns:
             Tuple of three items: rupture, sites and distances context.
 
@@ -336,10 +515,19 @@ class ContextMaker(object):
             If any of declared required parameters (site, rupture and
             distance parameters) is unknown.
         """
-        sites, dctx = self.filter(sites, rupture)
-        for param in self.REQUIRES_DISTANCES - {'rrup'}:
-            distances = get_distances(rupture, sites, param)
-            setattr(dctx, param, distances)
+        params = self.REQUIRES_DISTANCES | {'rrup'}
+        if closest:
+            params |= {'closest_point'}
+        # all the distances are computed with a single DistanceEngine
+        dist_eng = self._filter(DistanceEngine(rupture, sites, params))
+        return self._make_contexts(dist_eng)
+
+    def _make_contexts(self, dist_eng):
+        # build the contexts from an already filtered DistanceEngine
+        rupture, sites = dist_eng.rupture, dist_eng.sites
+        dctx = DistancesContext()
+        for param in dist_eng.params:
+            setattr(dctx, param, dist_eng.get(param))
         reqv_obj = (self.reqv.get(self.trt) if self.reqv else None)
         if reqv_obj and isinstance(rupture.surface, PlanarSurface):
             reqv = reqv_obj.get(dctx.repi, rupture.mag)
@@ -362,24 +550,71 @@ class ContextMaker(object):
         """
         ctxs = []
         fewsites = len(sites.complete) <= self.max_sites_disagg
-        for rup in ruptures:
-            try:
-                ctx, r_sites, dctx = self.make_contexts(
-                    getattr(rup, 'sites', sites), rup)
-            except FarAwayRupture:
-                continue
+        params = self.REQUIRES_DISTANCES | {'rrup'}
+        if fewsites:
+            params |= {'closest_point'}
+        for dist_eng in self._gen_dist_engs(ruptures, sites, params):
+            ctx, r_sites, dctx = self._make_contexts(dist_eng)
             for par in self.REQUIRES_SITES_PARAMETERS:
                 setattr(ctx, par, r_sites[par])
             ctx.sids = r_sites.sids
             for par in self.REQUIRES_DISTANCES | {'rrup'}:
                 setattr(ctx, par, getattr(dctx, par))
             if fewsites:
-                closest = rup.surface.get_closest_points(sites.complete)
-                ctx.clon = closest.lons[ctx.sids]
-                ctx.clat = closest.lats[ctx.sids]
+                ctx.clon = dctx.closest_point[:, 0]
+                ctx.clat = dctx.closest_point[:, 1]
             ctxs.append(ctx)
         return ctxs
 
+    def _gen_dist_engs(self, ruptures, sites, params):
+        # yield a filtered DistanceEngine for each rupture close to its
+        # sites; consecutive planar ruptures with the same sites and
+        # magnitude are filtered together by computing their distances
+        # in batch
+        def key(rup):
+            return (isinstance(rup.surface, PlanarSurface),
+                    id(getattr(rup, 'sites', sites)), rup.mag)
+
+        def weight(rup):
+            return len(getattr(rup, 'sites', sites))
+
+        for rups in block_splitter(ruptures, MAX_PLANAR_BATCH, weight, key):
+            r_sites = getattr(rups[0], 'sites', sites)
+            if len(rups) > 1 and isinstance(rups[0].surface, PlanarSurface):
+                yield from self._gen_planar(rups, r_sites, params)
+                continue
+            for rup in rups:
+                try:
+                    yield self._filter(DistanceEngine(rup, r_sites, params))
+                except FarAwayRupture:
+                    continue
+
+    def _gen_planar(self, rups, sites, params):
+        # filter K planar ruptures with a single call to the planar kernels
+        planar = build_planar_array([rup.surface for rup in rups])
+        rrup = get_distances_planar(planar, sites, 'rrup')
+        mdist = numpy.array([self.maximum_distance(self.trt, rup.mag)
+                             for rup in rups])
+        close = rrup <= mdist[:, None]  # shape (K, N)
+        # the other distances are computed only on the sites close to
+        # at least one rupture
+        mask = close.any(axis=0)
+        if not mask.any():
+            return
+        elif not mask.all():
+            sites = sites.filter(mask)
+            rrup, close = rrup[:, mask], close[:, mask]
+        dists = {'rrup': rrup}
+        for param in params & PLANAR_DISTANCES - {'rrup'}:
+            dists[param] = get_distances_planar(planar, sites, param)
+        for arr in dists.values():
+            arr.flags.writeable = False
+        for k, rup in enumerate(rups):
+            if close[k].any():
+                dist_eng = DistanceEngine(rup, sites, params)
+                dist_eng.cache = {par: arr[k] for par, arr in dists.items()}
+                yield dist_eng.filter(close[k])
+
     def collapse_the_ctxs(self, ctxs):
         """
         Collapse contexts with similar parameters and distances.
@@ -394,19 +629,25 @@ class ContextMaker(object):
             rrp = ['mag']
             rnd = 0  # round distances to 1 km
         else:
-            rrp = self.REQUIRES_RUPTURE_PARAMETERS
+            rrp = sorted(self.REQUIRES_RUPTURE_PARAMETERS)
             rnd = 1  # round distances to 100 m
 
-        def params(ctx):
-            lst = []
-            for par in rrp:
-                lst.append(getattr(ctx, par))
-            for dst in self.REQUIRES_DISTANCES:
-                lst.extend(numpy.round(getattr(ctx, dst), rnd))
-            return tuple(lst)
-
+        # the grouping keys are built from the context table; adding 0.
+        # makes sure that -0. and 0. (i.e. small negative rx) are the same
+        tbl = self.recarray(ctxs)
+        dists = numpy.zeros((len(tbl), 0))
+        for dst in sorted(self.REQUIRES_DISTANCES):
+            dists = numpy.column_stack(
+                [dists, numpy.round(tbl[dst], rnd).reshape(len(tbl), -1)])
+        dists += 0.
+        slices = _get_slices(tbl, len(ctxs))
+        acc = collections.defaultdict(list)
+        for ctx, start, stop in zip(ctxs, slices, slices[1:]):
+            key = tuple(getattr(ctx, par) for par in rrp) + (
+                dists[start:stop].tobytes(),)
+            acc[key].append(ctx)
         out = []
-        for values in groupby(ctxs, params).values():
+        for values in acc.values():
             out.extend(_collapse(values))
         return out
 
@@ -527,24 +768,44 @@ class PmapMaker(object):
         if pmap is None:  # for src_indep
             pmap = self.pmap
         rup_indep = self.rup_indep
+        # the PNEs are composed on a dense array of shape (S, L, G) where
+        # S is the number of sites affected by the contexts; the pmap is
+        # updated at the end, with a single vectorized operation
+        sids = numpy.unique(numpy.concatenate([ctx.sids for ctx in ctxs]))
+        L, G = len(self.cmaker.imtls.array), len(self.gsims)
+        acc = numpy.full((len(sids), L, G), 1. if rup_indep else 0.)
         # splitting in blocks makes sure that the maximum poes array
         # generated has size N x L x G x 8 = 4 MB
         for block in block_splitter(
                 ctxs, self.maxsites, lambda ctx: len(ctx.sids)):
-            for ctx, poes in self.cmaker.gen_ctx_poes(block):
-                with self.pne_mon:
-                    # pnes and poes of shape (N, L, G)
-                    pnes = ctx.get_probability_no_exceedance(poes)
-                    for sid, pne in zip(ctx.sids, pnes):
-                        probs = pmap.setdefault(sid, rup_indep).array
-                        if rup_indep:
-                            probs *= pne
-                        else:  # rup_mutex
-                            probs += (1. - pne) * ctx.weight
-
-    def _ruptures(self, src, filtermag=None):
+            tbl = self.cmaker.recarray(block)
+            pnes = self.cmaker.get_pnes(block, tbl)  # shape (N, L, G)
+            with self.pne_mon:
+                if not rup_indep:  # rup_mutex
+                    weights = numpy.array([ctx.weight for ctx in block])
+                    pnes = (1. - pnes) * weights[tbl['rup_id'], None, None]
+                # the rows are sorted by site, so that the PNEs of each
+                # site are composed with a single reduceat
+                idx = numpy.searchsorted(sids, tbl['sids'])
+                order = numpy.argsort(idx, kind='stable')
+                uidx, starts = numpy.unique(idx[order], return_index=True)
+                if rup_indep:
+                    acc[uidx] *= numpy.multiply.reduceat(pnes[order], starts)
+                else:  # rup_mutex
+                    acc[uidx] += numpy.add.reduceat(pnes[order], starts)
+        with self.pne_mon:
+            if rup_indep:
+                pmap *= ProbabilityMap.from_array(acc, sids)
+            else:  # rup_mutex
+                pmap += ProbabilityMap.from_array(acc, sids)
+
+    def _ruptures(self, src, filtermag=None, sites=None):
+        # if the sites are given, the fault sources can discard the ruptures
+        # far away from them before building their surfaces
         return src.iter_ruptures(
-            shift_hypo=self.shift_hypo, mag=filtermag)
+            shift_hypo=self.shift_hypo, mag=filtermag, sites=sites,
+            maxdist=functools.partial(
+                self.cmaker.maximum_distance, self.cmaker.trt))
 
     def _make_ctxs(self, rups, sites, srcid):
         with self.ctx_mon:
@@ -591,7 +852,7 @@ class PmapMaker(object):
             self.totrups += src.num_ruptures
             self.numrups = 0
             self.numsites = 0
-            rups = self._ruptures(src)
+            rups = self._ruptures(src, sites=sites)
             L, G = len(self.cmaker.imtls.array), len(self.cmaker.gsims)
             pmap = ProbabilityMap(L, G)
             ctxs = self._make_ctxs(rups, sites, src.id)
@@ -688,7 +949,7 @@ class PmapMaker(object):
                             _add([pr], far)
                             _add(self._ruptures(src, pr.mag), close)
             else:  # just add the ruptures
-                _add(self._ruptures(src), sites)
+                _add(self._ruptures(src, sites=sites), sites)
         return rups
 
 
@@ -832,16 +1093,6 @@ class RuptureContext(BaseContext):
         for param, value in param_pairs:
             setattr(self, param, value)
 
-    def size(self):
-        """
-        If the context is a multi rupture context, i.e. it contains an array
-        of magnitudes and it refers to a single site, returns the size of
-        the array, otherwise returns 1.
-        """
-        if isinstance(self.mag, numpy.ndarray) and len(self.vs30) == 1:
-            return len(self.mag)
-        return 1
-
     def roundup(self, minimum_distance):
         """
         If the minimum_distance is nonzero, returns a copy of the
@@ -18,7 +18,133 @@ Module :mod:`openquake.hazardlib.correlation` defines correlation models for
 spatially-distributed ground-shaking intensities.
 """
 import abc
+import hashlib
+import collections
 import numpy
+from scipy import sparse
+from scipy.sparse.linalg import splu
+from scipy.spatial import cKDTree
+from openquake.baselib.general import register_cache
+from openquake.baselib.performance import Monitor
+from openquake.hazardlib.geo.geodetic import (
+    geodetic_distance, spherical_to_cartesian)
+
+
+class FactorCache(object):
+    """
+    A LRU cache of lower-triangular factors of correlation matrices, shared
+    by all the correlation models living in the same process. The factors
+    are evicted in least recently used order when the total memory exceeds
+    the given cap.
+
+    :param maxbytes: maximum memory occupation of the cached arrays
+    """
+    def __init__(self, maxbytes):
+        self.maxbytes = maxbytes
+        self.nbytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.dic = collections.OrderedDict()
+
+    def __getitem__(self, key):
+        try:
+            arr = self.dic[key]
+        except KeyError:
+            self.misses += 1
+            raise
+        self.hits += 1
+        self.dic.move_to_end(key)
+        return arr
+
+    def __setitem__(self, key, arr):
+        if arr.nbytes > self.maxbytes:  # too big to be cached
+            return
+        if key in self.dic:
+            self.nbytes -= self.dic.pop(key).nbytes
+        while self.nbytes + arr.nbytes > self.maxbytes:
+            self.nbytes -= self.dic.popitem(last=False)[1].nbytes
+        self.dic[key] = arr
+        self.nbytes += arr.nbytes
+
+    def __len__(self):
+        return len(self.dic)
+
+    def clear(self):
+        self.dic.clear()
+        self.nbytes = self.hits = self.misses = 0
+
+
+factor_cache = register_cache(FactorCache(maxbytes=2 ** 30))  # 1 GB
+
+
+def _sites_key(sites):
+    # a digest of the site coordinates, since the same site IDs can
+    # refer to different site collections in different calculations
+    coords = numpy.array([sites['lon'], sites['lat']])
+    return hashlib.sha1(coords.tobytes()).digest()
+
+
+class NearestNeighborFactor(object):
+    """
+    Sparse approximation of the lower-triangular factor of a correlation
+    matrix, obtained by conditioning each site only on its nearest neighbors
+    among the preceding sites (Vecchia approximation). The approximation
+    is exact if the number of neighbors is at least the number of sites
+    minus one. Building the factor requires O(N k^3) time and O(N k) memory,
+    where k is the number of neighbors, so it works for site collections
+    far too large for a dense Cholesky decomposition.
+
+    :param lons: longitudes of the sites
+    :param lats: latitudes of the sites
+    :param correlation: a function distances -> correlation coefficients
+    :param num_neighbors: the number of conditioning sites
+    :param blocksize: number of sites per block in the vectorized solve
+    """
+    def __init__(self, lons, lats, correlation, num_neighbors,
+                 blocksize=10000):
+        n = len(lons)
+        k = min(n, 2 * num_neighbors + 1)
+        xyz = spherical_to_cartesian(lons, lats)
+        idxs = cKDTree(xyz).query(xyz, k)[1].reshape(n, k)  # sorted by dist
+        # keep the nearest neighbors preceding each site
+        prev = idxs < numpy.arange(n)[:, None]
+        prev &= numpy.cumsum(prev, axis=1) <= num_neighbors
+        nums = prev.sum(axis=1)
+        rows = [numpy.arange(n)]
+        cols = [numpy.arange(n)]
+        vals = [numpy.ones(n)]
+        self.sqrt_d = numpy.ones(n)  # conditional standard deviations
+        for c in numpy.unique(nums[nums > 0]):
+            for ii in _blocks(numpy.where(nums == c)[0], blocksize):
+                nbs = idxs[ii][prev[ii]].reshape(len(ii), c)
+                lo, la = lons[nbs], lats[nbs]
+                cnn = correlation(geodetic_distance(
+                    lo[:, :, None], la[:, :, None],
+                    lo[:, None, :], la[:, None, :]))  # shape (n', c, c)
+                cni = correlation(geodetic_distance(
+                    lo, la, lons[ii, None], lats[ii, None]))  # (n', c)
+                b = numpy.linalg.solve(cnn, cni[:, :, None])[:, :, 0]
+                self.sqrt_d[ii] = numpy.sqrt(
+                    numpy.maximum(1. - (b * cni).sum(axis=1), 0))
+                rows.append(numpy.repeat(ii, c))
+                cols.append(nbs.flatten())
+                vals.append(-b.flatten())
+        # (I - B) x = sqrt(d) z, with B strictly lower triangular
+        mat = sparse.csc_matrix(
+            (numpy.concatenate(vals),
+             (numpy.concatenate(rows), numpy.concatenate(cols))), (n, n))
+        self.nbytes = 2 * (mat.data.nbytes + mat.indices.nbytes +
+                           mat.indptr.nbytes) + self.sqrt_d.nbytes
+        self.lu = splu(mat, permc_spec='NATURAL', diag_pivot_thresh=0)
+
+    def __matmul__(self, residuals):
+        # correlate the given uncorrelated residuals
+        return self.lu.solve((self.sqrt_d * residuals.T).T)
+
+
+def _blocks(array, size):
+    for start in range(0, len(array), size):
+        yield array[start:start + size]
 
 
 class BaseCorrelationModel(metaclass=abc.ABCMeta):
@@ -26,6 +152,46 @@ class BaseCorrelationModel(metaclass=abc.ABCMeta):
     Base class for correlation models for spatially-distributed ground-shaking
     intensities.
     """
+    #: if positive, the correlation is applied by using a
+    #: :class:`NearestNeighborFactor` with this number of neighbors
+    #: instead of a dense Cholesky factor
+    num_neighbors = 0
+
+    # monitors for the factorizations and the factors taken from the cache
+    mon = Monitor('computing correlation factors')
+    hits_mon = Monitor('correlation factors from cache')
+
+    def set_monitor(self, monitor):
+        """
+        Store the information about the correlation factors in children
+        of the given monitor
+        """
+        self.mon = monitor('computing correlation factors', measuremem=True)
+        self.hits_mon = monitor('correlation factors from cache')
+
+    def _params(self):
+        # the parameters of the model entering in the cache key
+        return ()
+
+    def _get_factor(self, key, func, *args):
+        # the lower-triangular factor from the cache, computed if missing
+        key = (self.__class__.__name__, self.num_neighbors) + key
+        try:
+            factor = factor_cache[key]
+        except KeyError:
+            with self.mon:
+                factor = func(*args)
+            factor_cache[key] = factor
+        else:
+            self.hits_mon.counts += 1
+        return factor
+
+    def _get_nn_factor(self, sites, imt):
+        return NearestNeighborFactor(
+            sites['lon'], sites['lat'],
+            lambda dist: self._get_correlation_matrix(dist, imt),
+            self.num_neighbors)
+
     def apply_correlation(self, sites, imt, residuals, stddev_intra=0):
         """
         Apply correlation to randomly sampled residuals.
@@ -49,18 +215,24 @@ class BaseCorrelationModel(metaclass=abc.ABCMeta):
         NB: the correlation matrix is cached. It is computed only once
         per IMT for the complete site collection and then the portion
         corresponding to the sites is multiplied by the residuals.
+        The cache is shared by the models with the same parameters.
+        If ``num_neighbors`` is positive, a sparse approximation of the
+        factor is computed for the (filtered) sites instead.
         """
+        if self.num_neighbors:
+            factor = self._get_factor(
+                (self._params(), str(imt), _sites_key(sites)),
+                self._get_nn_factor, sites, imt)
+            return factor @ residuals
         # intra-event residual for a single relization is a product
         # of lower-triangle decomposed correlation matrix and vector
         # of N random numbers (where N is equal to number of sites).
         # we need to do that multiplication once per realization
         # with the same matrix and different vectors.
-        try:
-            corma = self.cache[imt]
-        except KeyError:
-            corma = self.get_lower_triangle_correlation_matrix(
-                sites.complete, imt)
-            self.cache[imt] = corma
+        complete = sites.complete
+        corma = self._get_factor(
+            (self._params(), str(imt), _sites_key(complete)),
+            self.get_lower_triangle_correlation_matrix, complete, imt)
         # if N is the length of the complete site collection, then the
         # correlation matrix has shape (N, N) and the residuals (N, s),
         # where s is the number of samples
@@ -84,10 +256,16 @@ class JB2009CorrelationModel(BaseCorrelationModel):
         Boolean value to indicate whether "Case 1" or "Case 2" from page 1700
         should be applied. ``True`` value means that Vs 30 values show or are
         expected to show clustering ("Case 2"), ``False`` means otherwise.
+    :param num_neighbors:
+        If positive, use a :class:`NearestNeighborFactor` with the given
+        number of neighbors instead of the dense Cholesky decomposition
     """
-    def __init__(self, vs30_clustering):
+    def __init__(self, vs30_clustering, num_neighbors=0):
         self.vs30_clustering = vs30_clustering
-        self.cache = {}  # imt -> correlation model
+        self.num_neighbors = num_neighbors
+
+    def _params(self):
+        return (self.vs30_clustering,)
 
     def _get_correlation_matrix(self, sites, imt):
         return jbcorrelation(sites, imt, self.vs30_clustering)
@@ -159,15 +337,21 @@ class HM2018CorrelationModel(BaseCorrelationModel):
         Value to be multiplied by the uncertainty in the correlation parameter
         beta. If uncertainty_multiplier = 0 (default), the median value is
         used as a constant value.
+    :param num_neighbors:
+        If positive, use a :class:`NearestNeighborFactor` with the given
+        number of neighbors instead of the dense Cholesky decomposition;
+        it is ignored if uncertainty_multiplier is nonzero
     """
-    def __init__(self, uncertainty_multiplier=0):
+    def __init__(self, uncertainty_multiplier=0, num_neighbors=0):
         self.uncertainty_multiplier = uncertainty_multiplier
-        self.distance_matrix = {}
-        self.cache = {}
+        self.num_neighbors = num_neighbors
 
     def _get_correlation_matrix(self, sites, imt):
         return hmcorrelation(sites, imt, self.uncertainty_multiplier)
 
+    def _get_cholesky(self, sites, imt):
+        return numpy.linalg.cholesky(self._get_correlation_matrix(sites, imt))
+
     def apply_correlation(self, sites, imt, residuals, stddev_intra):
         """
         Apply correlation to randomly sampled residuals.
@@ -192,21 +376,21 @@ class HM2018CorrelationModel(BaseCorrelationModel):
             # corresponding standard deviation element.
             residuals_norm = residuals / stddev_intra[sites.sids, None]
 
-            # Lower diagonal of the Cholesky decomposition from/to cache
-            try:
-                cormaLow = self.cache[imt]
-            except KeyError:
-                # Note that instead of computing the whole correlation matrix
-                # corresponding to sites.complete, here we compute only the
-                # correlation matrix corresponding to sites.
-                cormaLow = numpy.linalg.cholesky(
-                       numpy.diag(stddev_intra[sites.sids]) @
-                       self._get_correlation_matrix(sites, imt) @
-                       numpy.diag(stddev_intra[sites.sids]))
-                self.cache[imt] = cormaLow
+            # Lower diagonal of the Cholesky decomposition of the correlation
+            # matrix from/to cache; since the covariance matrix is D @ C @ D
+            # with D = diag(stddev_intra), its factor is D @ chol(C).
+            # Note that instead of computing the whole correlation matrix
+            # corresponding to sites.complete, here we compute only the
+            # correlation matrix corresponding to sites.
+            if self.num_neighbors:  # sparse approximation of chol(C)
+                get_factor = self._get_nn_factor
+            else:
+                get_factor = self._get_cholesky
+            cormaLow = self._get_factor(
+                (str(imt), _sites_key(sites)), get_factor, sites, imt)
 
             # Apply correlation
-            return numpy.dot(cormaLow, residuals_norm)
+            return stddev_intra[sites.sids, None] * (cormaLow @ residuals_norm)
 
         else:   # Variability (uncertainty) is included
             nsim = len(residuals[1])
@@ -21,6 +21,7 @@ Module :mod:`openquake.hazardlib.geo.mesh` defines classes :class:`Mesh` and
 its subclass :class:`RectangularMesh`.
 """
 import numpy
+from scipy.spatial import cKDTree
 from scipy.spatial.distance import cdist
 import shapely.geometry
 import shapely.ops
@@ -31,6 +32,13 @@ from openquake.hazardlib.geo import geodetic
 from openquake.hazardlib.geo import utils as geo_utils
 
 F32 = numpy.float32
+# maximum size of the distance matrix between a mesh and the sites; for
+# larger sizes the minimum distances are computed with a KD-tree, which is
+# faster and requires much less memory
+MAX_DISTANCE_MATRIX = 20_000
+# minimum number of sites for the KD-tree: building the tree costs about
+# as much as computing the distances to a hundred sites
+MIN_SITES_KDTREE = 100
 
 
 def sqrt(array):
@@ -63,6 +71,26 @@ def surface_to_arrays(surface):
     return [mesh.array.reshape(shp)]
 
 
+def sliding_min(array, nrows, ncols):
+    """
+    :param array: a 2D array of shape (R, C)
+    :param nrows: number of rows of the window, not greater than R
+    :param ncols: number of columns of the window, not greater than C
+    :returns:
+        a 2D array of shape (R - nrows + 1, C - ncols + 1) with the minima
+        of ``array`` on the windows of shape (nrows, ncols) starting at each
+        position
+    """
+    R, C = array.shape
+    rows = array[:R - nrows + 1]
+    for i in range(1, nrows):
+        rows = numpy.minimum(rows, array[i:R - nrows + 1 + i])
+    out = rows[:, :C - ncols + 1]
+    for j in range(1, ncols):
+        out = numpy.minimum(out, rows[:, j:C - ncols + 1 + j])
+    return out
+
+
 class Mesh(object):
     """
     Mesh object represent a collection of points and provides the most
@@ -246,7 +274,29 @@ class Mesh(object):
         this mesh to each point of the target mesh and returns the lowest found
         for each.
         """
-        return cdist(self.xyz, mesh.xyz).min(axis=0)
+        return self._min_idx_dist(mesh)[1]
+
+    @cached_property
+    def kdtree(self):
+        """
+        :returns: a cKDTree on the cartesian coordinates of the mesh
+        """
+        return cKDTree(self.xyz)
+
+    def _min_idx_dist(self, mesh):
+        # returns the indices of the closest points of this mesh and the
+        # minimum distances for each point in the other mesh, flattened;
+        # the KD-tree gives the exact same result as the distance matrix
+        # with memory proportional to the number of points, not to the
+        # product of the number of points
+        if (len(mesh) >= MIN_SITES_KDTREE and
+                self.lons.size * len(mesh) > MAX_DISTANCE_MATRIX):
+            min_dist, min_idx = self.kdtree.query(mesh.xyz)
+        else:
+            dists = cdist(self.xyz, mesh.xyz)
+            min_idx = dists.argmin(axis=0)
+            min_dist = dists[min_idx, numpy.arange(len(min_idx))]
+        return min_idx, min_dist
 
     def get_closest_points(self, mesh):
         """
@@ -256,7 +306,7 @@ class Mesh(object):
             :class:`Mesh` object of the same shape as `mesh` with closest
             points from this one at respective indices.
         """
-        min_idx = cdist(self.xyz, mesh.xyz).argmin(axis=0)  # lose shape
+        min_idx = self._min_idx_dist(mesh)[0]  # lose shape
         if hasattr(mesh, 'shape'):
             min_idx = min_idx.reshape(mesh.shape)
         lons = self.lons.take(min_idx)
@@ -264,6 +314,24 @@ class Mesh(object):
         deps = self.depths.take(min_idx)
         return Mesh(lons, lats, deps)
 
+    def get_closest(self, mesh):
+        """
+        Compute the minimum distances and the closest points of this mesh
+        for each point in the other mesh, in a single pass.
+
+        :returns:
+            a pair (distances, closest points) where the distances are
+            a flat array and the closest points a :class:`Mesh`
+            object of the same shape as `mesh`
+        """
+        min_idx, min_dist = self._min_idx_dist(mesh)  # lose shape
+        if hasattr(mesh, 'shape'):
+            min_idx = min_idx.reshape(mesh.shape)
+        lons = self.lons.take(min_idx)
+        lats = self.lats.take(min_idx)
+        deps = self.depths.take(min_idx)
+        return min_dist, Mesh(lons, lats, deps)
+
     def get_distance_matrix(self):
         """
         Compute and return distances between each pairs of points in the mesh.
@@ -131,6 +131,21 @@ class BaseSurface:
         """
         return self.mesh.get_closest_points(mesh)
 
+    def get_closest(self, mesh):
+        """
+        Compute at the same time the minimum distance and the closest point
+        of the surface for each point of ``mesh``; it is faster than
+        calling :meth:`get_min_distance` and :meth:`get_closest_points`
+        separately, since the intermediate results are shared.
+
+        :param mesh:
+            :class:`~openquake.hazardlib.geo.mesh.Mesh` of points to find
+            closest points to.
+        :returns:
+            A pair (numpy array of distances in km, mesh of closest points).
+        """
+        return self.mesh.get_closest(mesh)
+
     def get_joyner_boore_distance(self, mesh):
         """
         Compute and return Joyner-Boore (also known as ``Rjb``) distance
@@ -238,6 +238,31 @@ class MultiSurface(BaseSurface):
 
         return Mesh(lons, lats, depths)
 
+    def get_closest(self, mesh):
+        """
+        For each point in ``mesh`` find the closest surface element, and return
+        the corresponding minimum distance and closest point.
+
+        See :meth:`superclass method
+        <.base.BaseSurface.get_closest>`
+        for spec of input and result values.
+        """
+        dists, lons, lats, depths = [], [], [], []
+        for surf in self.surfaces:
+            dist, cps = surf.get_closest(mesh)
+            dists.append(dist.flatten())
+            lons.append(cps.lons.flatten())
+            lats.append(cps.lats.flatten())
+            depths.append(cps.depths.flatten())
+        # index of the closest surface for each point in mesh
+        idx = numpy.argmin(dists, axis=0)
+        pts = numpy.arange(len(idx))
+        shape = mesh.lons.shape
+        return (numpy.array(dists)[idx, pts],
+                Mesh(numpy.array(lons)[idx, pts].reshape(shape),
+                     numpy.array(lats)[idx, pts].reshape(shape),
+                     numpy.array(depths)[idx, pts].reshape(shape)))
+
     def get_joyner_boore_distance(self, mesh):
         """
         For each point in mesh compute the Joyner-Boore distance to all the
@@ -613,7 +638,7 @@ class MultiSurface(BaseSurface):
         # If the GC2 calculations have already been computed (by invoking Ry0
         # first) and the mesh is identical then class has GC2 attributes
         # already pre-calculated
-        if not self.tmp_mesh or self.tmp_mesh == mesh:
+        if self.tmp_mesh is None or self.tmp_mesh != mesh:
             self.gc2t, self.gc2u = self.get_generalised_coordinates(mesh.lons,
                                                                     mesh.lats)
             # Update mesh
@@ -633,7 +658,7 @@ class MultiSurface(BaseSurface):
         # If the GC2 calculations have already been computed (by invoking Ry0
         # first) and the mesh is identical then class has GC2 attributes
         # already pre-calculated
-        if not self.tmp_mesh or self.tmp_mesh == mesh:
+        if self.tmp_mesh is None or self.tmp_mesh != mesh:
             # If that's not the case, or the mesh is different then
             # re-compute GC2 configuration
             self.gc2t, self.gc2u = self.get_generalised_coordinates(mesh.lons,
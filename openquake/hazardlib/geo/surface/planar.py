@@ -22,6 +22,7 @@ Module :mod:`openquake.hazardlib.geo.surface.planar` contains
 """
 import logging
 import numpy
+from scipy.spatial.distance import cdist
 from openquake.baselib.node import Node
 from openquake.hazardlib.geo import Point
 from openquake.hazardlib.geo.surface.base import BaseSurface
@@ -31,6 +32,14 @@ from openquake.hazardlib.geo.nodalplane import NodalPlane
 from openquake.hazardlib.geo import utils as geo_utils
 
 
+def _cross(a, b):
+    # cross product of two 3D vectors; numpy.cross is much slower
+    # for single vectors, since it is designed for arrays of vectors
+    return numpy.array([a[1] * b[2] - a[2] * b[1],
+                        a[2] * b[0] - a[0] * b[2],
+                        a[0] * b[1] - a[1] * b[0]])
+
+
 class PlanarSurface(BaseSurface):
     """
     Planar rectangular surface with two sides parallel to the Earth surface.
@@ -108,10 +117,12 @@ class PlanarSurface(BaseSurface):
             bottom_left.depth, bottom_right.depth
         ])
         # now set the attributes normal, d, uv1, uv2, zero_zero
-        self._init_plane()
+        xyz = geo_utils.spherical_to_cartesian(
+            self.corner_lons, self.corner_lats, self.corner_depths)
+        self._init_plane(xyz)
 
         # now we can check surface for validity
-        dists, xx, yy = self._project(self.mesh.xyz)
+        dists, xx, yy = self._project(xyz)
         # "length" of the rupture is measured along the top edge
         length1, length2 = xx[1] - xx[0], xx[3] - xx[2]
         # "width" of the rupture is measured along downdip direction
@@ -191,17 +202,20 @@ class PlanarSurface(BaseSurface):
         self = cls(strike, dip, tl, tr, br, bl, check=False)
         return self
 
-    def _init_plane(self):
+    def _init_plane(self, xyz=None):
         """
         Prepare everything needed for projecting arbitrary points on a plane
         containing the surface.
+
+        :param xyz: the cartesian coordinates of the corners, if available
         """
-        tl, tr, bl, br = geo_utils.spherical_to_cartesian(
-            self.corner_lons, self.corner_lats, self.corner_depths
-        )
+        if xyz is None:
+            xyz = geo_utils.spherical_to_cartesian(
+                self.corner_lons, self.corner_lats, self.corner_depths)
+        tl, tr, bl, br = xyz
         # these two parameters define the plane that contains the surface
         # (in 3d Cartesian space): a normal unit vector,
-        self.normal = geo_utils.normalized(numpy.cross(tl - tr, tl - bl))
+        self.normal = geo_utils.normalized(_cross(tl - tr, tl - bl))
         # ... and scalar "d" parameter from the plane equation (uses
         # an equation (3) from http://mathworld.wolfram.com/Plane.html)
         self.d = - (self.normal * tl).sum()
@@ -211,7 +225,7 @@ class PlanarSurface(BaseSurface):
         # left corner with basis vectors directed to top right and bottom left
         # corners. see :meth:`_project`.
         self.uv1 = geo_utils.normalized(tr - tl)
-        self.uv2 = numpy.cross(self.normal, self.uv1)
+        self.uv2 = _cross(self.normal, self.uv1)
         self.zero_zero = tl
 
     def translate(self, p1, p2):
@@ -418,6 +432,24 @@ class PlanarSurface(BaseSurface):
         lons, lats, depths = self._project_back(dists, mxx, myy)
         return Mesh(lons, lats, depths)
 
+    def get_closest(self, mesh):
+        """
+        See :meth:`superclass' method
+        <openquake.hazardlib.geo.surface.base.BaseSurface.get_closest>`.
+
+        This is an optimized version specific to planar surface projecting
+        the points of the mesh on the plane only once.
+        """
+        dists, xx, yy = self._project(mesh.xyz)
+        mxx = xx.clip(0, self.length)
+        myy = yy.clip(0, self.width)
+        # the distance from the rectangle combines the distance from the
+        # plane and the distance between the projection and the closest point
+        rrup = numpy.sqrt(dists ** 2 + (xx - mxx) ** 2 + (yy - myy) ** 2)
+        lons, lats, depths = self._project_back(
+            numpy.zeros_like(dists), mxx, myy)
+        return rrup, Mesh(lons, lats, depths)
+
     def _get_top_edge_centroid(self):
         """
         Overrides :meth:`superclass' method
@@ -634,3 +666,119 @@ class PlanarSurface(BaseSurface):
         return (self.corner_lons.take([0, 1, 3, 2, 0]),
                 self.corner_lats.take([0, 1, 3, 2, 0]),
                 self.corner_depths.take([0, 1, 3, 2, 0]))
+
+
+# ###################### batch of planar surfaces ####################### #
+
+F64 = numpy.float64
+# geometry of a planar surface, as stored in a planar array
+planar_array_dt = numpy.dtype([
+    ('lons', (F64, 4)),  # corners in the order tl, tr, bl, br
+    ('lats', (F64, 4)),
+    ('normal', (F64, 3)),
+    ('uv1', (F64, 3)),
+    ('uv2', (F64, 3)),
+    ('zero_zero', (F64, 3)),
+    ('d', F64),
+    ('length', F64),
+    ('width', F64),
+    ('strike', F64)])
+
+# distances which can be computed on a planar array
+PLANAR_DISTANCES = frozenset(['rrup', 'rjb', 'rx', 'ry0'])
+
+
+def build_planar_array(surfaces):
+    """
+    :param surfaces: a list of K PlanarSurface instances
+    :returns: a planar array of K elements
+    """
+    arr = numpy.zeros(len(surfaces), planar_array_dt)
+    for name in planar_array_dt.names:
+        attr = 'corner_' + name if name in ('lons', 'lats') else name
+        arr[name] = [getattr(surf, attr) for surf in surfaces]
+    return arr
+
+
+def project(planar, xyz):
+    """
+    Project N points on the planes of K planar surfaces.
+
+    :param planar: a planar array of K elements
+    :param xyz: an array of N cartesian coordinates of shape (N, 3)
+    :returns: distances from the planes and "x" and "y" coordinates of the
+              projections, as three arrays of shape (K, N)
+    """
+    # since uv1 and uv2 are orthogonal to the normal the coordinates
+    # can be computed without projecting the points first
+    dists = planar['normal'] @ xyz.T + planar['d'][:, None]
+    z1 = (planar['zero_zero'] * planar['uv1']).sum(axis=1)
+    z2 = (planar['zero_zero'] * planar['uv2']).sum(axis=1)
+    xx = planar['uv1'] @ xyz.T - z1[:, None]
+    yy = planar['uv2'] @ xyz.T - z2[:, None]
+    return dists, xx, yy
+
+
+def _get_rjb(planar, lons, lats, xyz):
+    # the same algorithm as in PlanarSurface.get_joyner_boore_distance,
+    # for K surfaces at the same time; the arcs 1 and 3 start both from
+    # the top left corner, so the azimuths and distances from the corners
+    # are computed only once, as in geodetic.distance_to_arc
+    strike = planar['strike'][:, None]
+    downdip = (strike + 90) % 360
+    azims, sines = [], []
+    for i in range(3):  # corners tl, tr, bl
+        clons = planar['lons'][:, i, None]
+        clats = planar['lats'][:, i, None]
+        azims.append(geodetic.azimuth(clons, clats, lons, lats))
+        sines.append(numpy.sin(geodetic.geodetic_distance(
+            clons, clats, lons, lats) / geodetic.EARTH_RADIUS))
+    ds = []
+    for i, azim in [(0, strike), (2, strike), (0, downdip), (1, downdip)]:
+        t_angle = (azims[i] - azim + 360) % 360
+        angle = numpy.arccos(numpy.sin(numpy.radians(t_angle)) * sines[i])
+        ds.append((numpy.pi / 2 - angle) * geodetic.EARTH_RADIUS)
+    ds1, ds2, ds3, ds4 = [numpy.sign(d) for d in ds]
+    corners = geo_utils.spherical_to_cartesian(
+        planar['lons'].flat, planar['lats'].flat)
+    dists_to_corners = numpy.reshape(
+        cdist(corners, xyz), (len(planar), 4, -1)).min(axis=1)
+    return numpy.select(
+        [(ds1 == ds2) & (ds3 == ds4), ds1 == ds2, ds3 == ds4],
+        [dists_to_corners,
+         numpy.fmin(numpy.abs(ds[0]), numpy.abs(ds[1])),
+         numpy.fmin(numpy.abs(ds[2]), numpy.abs(ds[3]))],
+        default=0)
+
+
+def get_distances_planar(planar, sites, param):
+    """
+    :param planar: a planar array of K elements
+    :param sites: a site collection (or mesh) with N points
+    :param param: a distance in PLANAR_DISTANCES
+    :returns: an array of distances of shape (K, N)
+    """
+    lons, lats = sites.lons, sites.lats
+    if param == 'rrup':
+        dists, xx, yy = project(planar, sites.xyz)
+        mxx = xx.clip(0, planar['length'][:, None])
+        myy = yy.clip(0, planar['width'][:, None])
+        return numpy.sqrt(dists ** 2 + (xx - mxx) ** 2 + (yy - myy) ** 2)
+    elif param == 'rjb':
+        return _get_rjb(planar, lons, lats, sites.xyz)
+    elif param == 'rx':
+        return geodetic.distance_to_arc(
+            planar['lons'][:, 0, None], planar['lats'][:, 0, None],
+            planar['strike'][:, None], lons, lats)
+    elif param == 'ry0':
+        azim = (planar['strike'][:, None] + 90.) % 360
+        dst1 = geodetic.distance_to_arc(
+            planar['lons'][:, 0, None], planar['lats'][:, 0, None],
+            azim, lons, lats)
+        dst2 = geodetic.distance_to_arc(
+            planar['lons'][:, 1, None], planar['lats'][:, 1, None],
+            azim, lons, lats)
+        # the distance is zero for the points between the two arcs
+        return numpy.where(numpy.sign(dst1) == numpy.sign(dst2),
+                           numpy.fmin(numpy.abs(dst1), numpy.abs(dst2)), 0)
+    raise ValueError('Unknown distance measure %r' % param)
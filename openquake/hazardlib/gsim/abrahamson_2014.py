@@ -82,6 +82,9 @@ class AbrahamsonEtAl2014(GMPE):
     #: Reference rock conditions as defined at page 
     DEFINED_FOR_REFERENCE_VELOCITY = 1180
 
+    #: The rupture parameters can be arrays, see :meth:`GMPE.get_mean_std1`
+    vectorized = True
+
     def get_mean_and_stddevs(self, sites, rup, dists, imt, stddev_types):
         """
         See :meth:`superclass method
@@ -135,33 +138,27 @@ class AbrahamsonEtAl2014(GMPE):
         Compute and return basic form, see page 1030.
         """
         # Fictitious depth calculation
-        if rup.mag > 5.:
-            c4m = C['c4']
-        elif rup.mag > 4.:
-            c4m = C['c4'] - (C['c4']-1.) * (5. - rup.mag)
-        else:
-            c4m = 1.
+        c4m = np.select(
+            [rup.mag > 5., rup.mag > 4.],
+            [C['c4'], C['c4'] - (C['c4']-1.) * (5. - rup.mag)], 1.)
         R = np.sqrt(dists.rrup**2. + c4m**2.)
         # basic form
         base_term = C['a1'] * np.ones_like(dists.rrup) + C['a17'] * dists.rrup
         # equation 2 at page 1030
-        if rup.mag >= C['m1']:
-            base_term += (C['a5'] * (rup.mag - C['m1']) +
-                          C['a8'] * (8.5 - rup.mag)**2. +
-                          (C['a2'] + C['a3'] * (rup.mag - C['m1'])) *
-                          np.log(R))
-        elif rup.mag >= self.CONSTS['m2']:
-            base_term += (C['a4'] * (rup.mag - C['m1']) +
-                          C['a8'] * (8.5 - rup.mag)**2. +
-                          (C['a2'] + C['a3'] * (rup.mag - C['m1'])) *
-                          np.log(R))
-        else:
-            base_term += (C['a4'] * (self.CONSTS['m2'] - C['m1']) +
-                          C['a8'] * (8.5 - self.CONSTS['m2'])**2. +
-                          C['a6'] * (rup.mag - self.CONSTS['m2']) +
-                          C['a7'] * (rup.mag - self.CONSTS['m2'])**2. +
-                          (C['a2'] + C['a3'] * (self.CONSTS['m2'] - C['m1'])) *
-                          np.log(R))
+        m2 = self.CONSTS['m2']
+        base_term += np.select(
+            [rup.mag >= C['m1'], rup.mag >= m2],
+            [C['a5'] * (rup.mag - C['m1']) +
+             C['a8'] * (8.5 - rup.mag)**2. +
+             (C['a2'] + C['a3'] * (rup.mag - C['m1'])) * np.log(R),
+             C['a4'] * (rup.mag - C['m1']) +
+             C['a8'] * (8.5 - rup.mag)**2. +
+             (C['a2'] + C['a3'] * (rup.mag - C['m1'])) * np.log(R)],
+            C['a4'] * (m2 - C['m1']) +
+            C['a8'] * (8.5 - m2)**2. +
+            C['a6'] * (rup.mag - m2) +
+            C['a7'] * (rup.mag - m2)**2. +
+            (C['a2'] + C['a3'] * (m2 - C['m1'])) * np.log(R))
         return base_term
 
     def _get_faulting_style_term(self, C, rup):
@@ -172,19 +169,13 @@ class AbrahamsonEtAl2014(GMPE):
         # this implements equations 5 and 6 at page 1032. f7 is the
         # coefficient for reverse mechanisms while f8 is the correction
         # factor for normal ruptures
-        if rup.mag > 5.0:
-            f7 = C['a11']
-            f8 = C['a12']
-        elif rup.mag >= 4:
-            f7 = C['a11'] * (rup.mag - 4.)
-            f8 = C['a12'] * (rup.mag - 4.)
-        else:
-            f7 = 0.0
-            f8 = 0.0
+        fac = np.select([rup.mag > 5.0, rup.mag >= 4], [1., rup.mag - 4.], 0.)
+        f7 = C['a11'] * fac
+        f8 = C['a12'] * fac
         # ranges of rake values for each faulting mechanism are specified in
         # table 2, page 1031
-        return (f7 * float(rup.rake > 30 and rup.rake < 150) +
-                f8 * float(rup.rake > -150 and rup.rake < -30))
+        return (f7 * ((rup.rake > 30) & (rup.rake < 150)) +
+                f8 * ((rup.rake > -150) & (rup.rake < -30)))
 
     def _get_vs30star(self, vs30, imt):
         """
@@ -235,65 +226,59 @@ class AbrahamsonEtAl2014(GMPE):
         """
         Compute and return hanging wall model term, see page 1038.
         """
-        if rup.dip == 90.0:
+        vertical = rup.dip == 90.0
+        if np.all(vertical):
             return np.zeros_like(dists.rx)
-        else:
-            Fhw = np.zeros_like(dists.rx)
-            Fhw[dists.rx > 0] = 1.
-            # Compute taper t1
-            T1 = np.ones_like(dists.rx)
-            T1 *= 60./45. if rup.dip <= 30. else (90.-rup.dip)/45.0
-            # Compute taper t2 (eq 12 at page 1039) - a2hw set to 0.2 as
-            # indicated at page 1041
-            T2 = np.zeros_like(dists.rx)
-            a2hw = 0.2
-            if rup.mag > 6.5:
-                T2 += (1. + a2hw * (rup.mag - 6.5))
-            elif rup.mag > 5.5:
-                T2 += (1. + a2hw * (rup.mag - 6.5) - (1. - a2hw) *
-                       (rup.mag - 6.5)**2)
-            else:
-                T2 *= 0.
-            # Compute taper t3 (eq. 13 at page 1039) - r1 and r2 specified at
-            # page 1040
-            T3 = np.zeros_like(dists.rx)
-            r1 = rup.width * np.cos(np.radians(rup.dip))
-            r2 = 3. * r1
-            #
-            idx = dists.rx < r1
-            T3[idx] = (np.ones_like(dists.rx)[idx] * self.CONSTS['h1'] +
-                       self.CONSTS['h2'] * (dists.rx[idx] / r1) +
-                       self.CONSTS['h3'] * (dists.rx[idx] / r1)**2)
-            #
-            idx = ((dists.rx >= r1) & (dists.rx <= r2))
-            T3[idx] = 1. - (dists.rx[idx] - r1) / (r2 - r1)
-            # Compute taper t4 (eq. 14 at page 1040)
-            T4 = np.zeros_like(dists.rx)
-            #
-            if rup.ztor <= 10.:
-                T4 += (1. - rup.ztor**2. / 100.)
-            # Compute T5 (eq 15a at page 1040) - ry1 computed according to
-            # suggestions provided at page 1040
-            T5 = np.zeros_like(dists.rx)
-            ry1 = dists.rx * np.tan(np.radians(20.))
-            #
-            idx = (dists.ry0 - ry1) <= 0.0
-            T5[idx] = 1.
-            #
-            idx = (((dists.ry0 - ry1) > 0.0) & ((dists.ry0 - ry1) < 5.0))
-            T5[idx] = 1. - (dists.ry0[idx] - ry1[idx]) / 5.0
-            # Finally, compute the hanging wall term
-            return Fhw*C['a13']*T1*T2*T3*T4*T5
+        Fhw = np.zeros_like(dists.rx)
+        Fhw[dists.rx > 0] = 1.
+        # Compute taper t1
+        T1 = np.ones_like(dists.rx)
+        T1 *= np.where(rup.dip <= 30., 60./45., (90.-rup.dip)/45.0)
+        # Compute taper t2 (eq 12 at page 1039) - a2hw set to 0.2 as
+        # indicated at page 1041
+        T2 = np.zeros_like(dists.rx)
+        a2hw = 0.2
+        T2 += np.select(
+            [rup.mag > 6.5, rup.mag > 5.5],
+            [1. + a2hw * (rup.mag - 6.5),
+             1. + a2hw * (rup.mag - 6.5) - (1. - a2hw) * (rup.mag - 6.5)**2],
+            0.)
+        # Compute taper t3 (eq. 13 at page 1039) - r1 and r2 specified at
+        # page 1040
+        T3 = np.zeros_like(dists.rx)
+        r1 = rup.width * np.cos(np.radians(rup.dip)) + np.zeros_like(dists.rx)
+        r2 = 3. * r1
+        #
+        idx = dists.rx < r1
+        T3[idx] = (np.ones_like(dists.rx)[idx] * self.CONSTS['h1'] +
+                   self.CONSTS['h2'] * (dists.rx[idx] / r1[idx]) +
+                   self.CONSTS['h3'] * (dists.rx[idx] / r1[idx])**2)
+        #
+        idx = ((dists.rx >= r1) & (dists.rx <= r2))
+        T3[idx] = 1. - (dists.rx[idx] - r1[idx]) / (r2[idx] - r1[idx])
+        # Compute taper t4 (eq. 14 at page 1040)
+        T4 = np.zeros_like(dists.rx)
+        #
+        T4 += np.where(rup.ztor <= 10., 1. - rup.ztor**2. / 100., 0.)
+        # Compute T5 (eq 15a at page 1040) - ry1 computed according to
+        # suggestions provided at page 1040
+        T5 = np.zeros_like(dists.rx)
+        ry1 = dists.rx * np.tan(np.radians(20.))
+        #
+        idx = (dists.ry0 - ry1) <= 0.0
+        T5[idx] = 1.
+        #
+        idx = (((dists.ry0 - ry1) > 0.0) & ((dists.ry0 - ry1) < 5.0))
+        T5[idx] = 1. - (dists.ry0[idx] - ry1[idx]) / 5.0
+        # Finally, compute the hanging wall term
+        return np.where(vertical, 0., Fhw*C['a13']*T1*T2*T3*T4*T5)
 
     def _get_top_of_rupture_depth_term(self, C, imt, rup):
         """
         Compute and return top of rupture depth term. See paragraph
         'Depth-to-Top of Rupture Model', page 1042.
         """
-        if rup.ztor >= 20.0:
-            return C['a15']
-        else:
-            return C['a15'] * rup.ztor / 20.0
+        return C['a15'] * np.minimum(rup.ztor / 20.0, 1.)
 
     def _get_z1pt0ref(self, vs30):
         """
@@ -397,24 +382,18 @@ class AbrahamsonEtAl2014(GMPE):
         s2 = np.ones_like(phi_al) * C['s2e']
         s1[vs30measured] = C['s1m']
         s2[vs30measured] = C['s2m']
-        if mag < 4:
-            phi_al *= s1
-        elif mag <= 6:
-            phi_al *= s1 + (s2 - s1) / 2. * (mag - 4.)
-        else:
-            phi_al *= s2
+        phi_al *= np.select([mag < 4, mag <= 6],
+                            [s1, s1 + (s2 - s1) / 2. * (mag - 4.)], s2)
         return phi_al
 
     def _get_inter_event_std(self, C, mag, sa1180, vs30):
         """
         Returns inter event (tau) standard deviation (equation 25, page 1046)
         """
-        if mag < 5:
-            tau_al = C['s3']
-        elif mag <= 7:
-            tau_al = C['s3'] + (C['s4'] - C['s3']) / 2. * (mag - 5.)
-        else:
-            tau_al = C['s4']
+        tau_al = np.select(
+            [mag < 5, mag <= 7],
+            [C['s3'], C['s3'] + (C['s4'] - C['s3']) / 2. * (mag - 5.)],
+            C['s4'])
         tau_b = tau_al
         tau = tau_b * (1 + self._get_derivative(C, sa1180, vs30))
         return tau
@@ -80,6 +80,8 @@ class AkkarCagnan2010(BooreAtkinson2008):
     #: See paragraph 'Functional Form', p. 2981.
     REQUIRES_DISTANCES = {'rjb'}
 
+    vectorized = False  # _compute_mean works on scalar ruptures
+
     def get_mean_and_stddevs(self, sites, rup, dists, imt, stddev_types):
         """
         See :meth:`superclass method
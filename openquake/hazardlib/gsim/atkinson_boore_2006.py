@@ -89,6 +89,8 @@ class AtkinsonBoore2006(BooreAtkinson2008):
     #: See paragraph 'Methodology and Model Parameters', p. 2182
     REQUIRES_DISTANCES = {'rrup'}
 
+    vectorized = False  # _compute_mean works on scalar ruptures
+
     def get_mean_and_stddevs(self, sites, rup, dists, imt, stddev_types):
         """
         See :meth:`superclass method
@@ -88,19 +88,30 @@ def gsim_imt_dt(sorted_gsims, sorted_imts):
 # it is dominated by memory allocations (i.e. _truncnorm_sf is ultra-fast)
 # the only way to speedup is to reduce the maximum_distance, then the array
 # will become shorter in the N dimension (number of affected sites), or to
-# collapse the ruptures, then _get_poes will be called less times
-def _get_poes(mean_std, loglevels, truncation_level):
+# collapse the ruptures, then _get_poes will be called less times;
+# if sf_tolerance is positive the survival function is interpolated
+# on a table, see _SFTable, and the output array is modified in place;
+# if rtime (occurrence rates times investigation time) is given, the
+# probabilities of no exceedance exp(-rtime * poes) are returned instead
+def _get_poes(mean_std, loglevels, truncation_level, sf_tolerance=0.,
+              rtime=None):
     mean, stddev = mean_std  # shape (N, M) each
     out = numpy.zeros((len(mean), len(loglevels.array)))  # shape (N, L)
-    lvl = 0
     for m, imt in enumerate(loglevels):
-        for iml in loglevels[imt]:
-            if truncation_level == 0:  # just compare imls to mean
-                out[:, lvl] = iml <= mean[:, m]
-            else:
-                out[:, lvl] = (iml - mean[:, m]) / stddev[:, m]
-            lvl += 1
-    return _truncnorm_sf(truncation_level, out)
+        arr = out[:, loglevels(imt)]  # a view of shape (N, L1)
+        if truncation_level == 0:  # just compare imls to mean
+            arr[:] = loglevels[imt] <= mean[:, m, None]
+        else:  # compute the residuals without temporary arrays
+            numpy.subtract(loglevels[imt], mean[:, m, None], out=arr)
+            arr /= stddev[:, m, None]
+    if sf_tolerance and truncation_level != 0:
+        # residuals, survival function and PNEs in a single pass
+        return _sf_table(truncation_level, sf_tolerance)(out, rtime)
+    out = _truncnorm_sf(truncation_level, out)
+    if rtime is not None:
+        out *= -rtime[:, None]
+        numpy.exp(out, out=out)
+    return out
 
 
 def _get_poes_site(mean_std, loglevels, truncation_level, ampfun, ctxs):
@@ -314,6 +325,7 @@ class GroundShakingIntensityModel(metaclass=MetaGSIM):
     non_verified = False
     experimental = False
     adapted = False
+    vectorized = False  # True if get_mean_and_stddevs accepts array params
 
     @classmethod
     def __init_subclass__(cls):
@@ -495,6 +507,79 @@ def _truncnorm_sf(truncation_level, values):
     return ((phi_b - ndtr(values)) / z).clip(0.0, 1.0)
 
 
+class _SFTable(object):
+    """
+    Survival function of the truncated normal distribution, linearly
+    interpolated on a uniform grid fine enough to guarantee the given
+    absolute tolerance; calling the table modifies the input in place,
+    which must be a C-contiguous array, and the temporary arrays have
+    at most CHUNK elements. If an array `rtime` of occurrence rates times
+    the investigation time is passed, the input must have shape (N, L) and
+    it is converted into probabilities of no exceedance exp(-rtime * sf)
+    in the same pass.
+
+    >>> values = numpy.array([-4., -.5, 0., 0.12345, 2.5])
+    >>> exact = _truncnorm_sf(3, values)
+    >>> table = _SFTable(3, 1E-6)
+    >>> bool(numpy.abs(table(values.copy()) - exact).max() < 1E-6)
+    True
+    >>> pnes = table(values.reshape(1, 5).copy(), numpy.array([.1]))
+    >>> bool(numpy.abs(pnes - numpy.exp(-.1 * exact)).max() < 1E-6)
+    True
+    """
+    # outside [-XMAX, XMAX] the non-truncated SF is 0 or 1 within 1E-18
+    XMAX = 9.
+    CHUNK = 65536  # number of values interpolated at once
+
+    def __init__(self, truncation_level, tolerance):
+        xmax = self.XMAX if truncation_level is None else min(
+            truncation_level, self.XMAX)
+        z = 1. if truncation_level is None else ndtr(truncation_level) * 2 - 1
+        # the error of the linear interpolation is bounded by h**2 / 8
+        # times the maximum of the second derivative, i.e. phi(1) / z
+        h = numpy.sqrt(8 * tolerance * z / norm.pdf(1))
+        n = int(numpy.ceil(2 * xmax / h))
+        self.xmin = -xmax
+        self.xmax = xmax
+        self.dx = 2 * xmax / n
+        self.sf = _truncnorm_sf(
+            truncation_level, numpy.linspace(-xmax, xmax, n + 1))
+        self.dsf = numpy.append(numpy.diff(self.sf), 0.)
+
+    def __call__(self, values, rtime=None):
+        assert values.flags.c_contiguous, values.flags
+        # the values are processed in blocks of contiguous rows
+        if rtime is None:
+            rows = values.reshape(-1, 1)
+        else:
+            rows = values.reshape(len(rtime), -1)
+        step = max(self.CHUNK // rows.shape[1], 1)
+        n = min(len(rows), step) * rows.shape[1]
+        indices = numpy.empty(n, numpy.int32)
+        buffer = numpy.empty(n)
+        for start in range(0, len(rows), step):
+            block = rows[start:start + step]
+            vals = block.reshape(-1)  # a view of the values
+            idx, buf = indices[:len(vals)], buffer[:len(vals)]
+            numpy.clip(vals, self.xmin, self.xmax, out=vals)
+            vals -= self.xmin
+            vals /= self.dx
+            idx[:] = vals  # integer part
+            vals -= idx  # fractional part
+            vals *= numpy.take(self.dsf, idx, out=buf)
+            vals += numpy.take(self.sf, idx, out=buf)
+            if rtime is not None:  # convert the PoEs into PNEs
+                block *= -rtime[start:start + step, None]
+                numpy.exp(block, out=block)
+        return values
+
+
+@functools.lru_cache()
+def _sf_table(truncation_level, tolerance):
+    # there is a table per truncation level and tolerance in each process
+    return _SFTable(truncation_level, tolerance)
+
+
 def to_distribution_values(vals, imt):
     """
     :returns: the logarithm of the values unless the IMT is MMI
@@ -563,7 +648,32 @@ class GMPE(GroundShakingIntensityModel):
             start = stop
         return arr
 
-    def get_poes(self, mean_std, loglevels, trunclevel, af=None, ctxs=()):
+    def get_mean_std1(self, ctx, imts):
+        """
+        Vectorized version of :meth:`get_mean_std`, working only for
+        GMPEs with the flag ``vectorized`` set, i.e. GMPEs accepting
+        arrays of rupture parameters in :meth:`get_mean_and_stddevs`.
+
+        :param ctx: a flat RuptureContext of size N, see ContextMaker.multi
+        :param imts: a list of M intensity measure types
+        :returns: an array of shape (2, N, M) with means and stddevs
+        """
+        arr = numpy.zeros((2, len(ctx.sids), len(imts)))
+        num_tables = CoeffsTable.num_instances
+        new = ctx.roundup(self.minimum_distance)
+        for m, imt in enumerate(imts):
+            mean, [std] = self.get_mean_and_stddevs(new, new, new, imt,
+                                                    [const.StdDev.TOTAL])
+            arr[0, :, m] = mean
+            arr[1, :, m] = std
+            if CoeffsTable.num_instances > num_tables:
+                raise RuntimeError('Instantiating CoeffsTable inside '
+                                   '%s.get_mean_and_stddevs' %
+                                   self.__class__.__name__)
+        return arr
+
+    def get_poes(self, mean_std, loglevels, trunclevel, af=None, ctxs=(),
+                 sf_tolerance=0., rtime=None):
         """
         Calculate and return probabilities of exceedance (PoEs) of one or more
         intensity measure levels (IMLs) of one intensity measure type (IMT)
@@ -597,8 +707,15 @@ class GMPE(GroundShakingIntensityModel):
             None or an instance of AmplFunction
         :param ctxs:
             Context object used to compute mean_std
+        :param sf_tolerance:
+            If positive, absolute tolerance of the interpolation table used
+            to compute the survival function; if zero use the exact formula
+        :param rtime:
+            If given, an array of N occurrence rates times the investigation
+            time, used to convert the PoEs into probabilities of no
+            exceedance exp(-rtime * poes)
         :returns:
-            array of PoEs of shape (N, L)
+            array of PoEs (or PNEs if rtime is given) of shape (N, L)
         :raises ValueError:
             If truncation level is not ``None`` and neither non-negative
             float number, and if ``imts`` dictionary contain wrong or
@@ -614,7 +731,8 @@ class GMPE(GroundShakingIntensityModel):
                 ms = numpy.array(mean_std)  # make a copy
                 for m in range(len(loglevels)):
                     ms[0, :, m] += s * self.adjustment
-                outs.append(_get_poes(ms, loglevels, trunclevel))
+                outs.append(_get_poes(ms, loglevels, trunclevel,
+                                      sf_tolerance))
             arr = numpy.average(outs, weights=weights, axis=0)
         elif hasattr(self, "mixture_model"):
             shp = list(mean_std[0].shape)  # (N, M)
@@ -624,17 +742,26 @@ class GMPE(GroundShakingIntensityModel):
                             self.mixture_model["weights"]):
                 mean_stdi = numpy.array(mean_std)  # a copy
                 mean_stdi[1] *= f  # multiply stddev by factor
-                arr += w * _get_poes(mean_stdi, loglevels, trunclevel)
+                arr += w * _get_poes(mean_stdi, loglevels, trunclevel,
+                                     sf_tolerance)
         elif af:  # kernel amplification function
             arr = _get_poes_site(mean_std, loglevels, trunclevel, af, ctxs)
-        else:  # regular case
-            arr = _get_poes(mean_std, loglevels, trunclevel)
+        else:  # regular case, the PNEs are computed in the same pass
+            return self._ignore_imts(loglevels, _get_poes(
+                mean_std, loglevels, trunclevel, sf_tolerance, rtime),
+                rtime is not None)
+        if rtime is not None:
+            arr = numpy.exp(-rtime[:, None] * arr)
+        return self._ignore_imts(loglevels, arr, rtime is not None)
+
+    def _ignore_imts(self, loglevels, arr, pnes):
+        # ignore the contribution of the IMTs with zero weight
         imtweight = getattr(self, 'weight', None)  # ImtWeight or None
         for imt in loglevels:
             if imtweight and imtweight.dic.get(imt) == 0:
                 # set by the engine when parsing the gsim logictree
                 # when 0 ignore the contribution: see _build_trts_branches
-                arr[:, loglevels(imt)] = 0
+                arr[:, loglevels(imt)] = 1 if pnes else 0
         return arr
 
 
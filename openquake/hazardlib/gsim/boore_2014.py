@@ -43,6 +43,12 @@ from openquake.hazardlib import const
 from openquake.hazardlib.imt import PGA, PGV, SA
 
 
+def _interp_mag(val1, val2, mag):
+    # linear interpolation between val1 (for mag <= 4.5) and
+    # val2 (for mag >= 5.5), used for the standard deviations
+    return val1 + (val2 - val1) * np.clip(mag - 4.5, 0., 1.)
+
+
 class BooreEtAl2014(GMPE):
     """
     Implements GMPE developed by David M. Boore, Jonathan P. Stewart,
@@ -82,6 +88,9 @@ class BooreEtAl2014(GMPE):
     #: Required distance measure is Rjb
     REQUIRES_DISTANCES = {'rjb'}
 
+    #: The rupture parameters can be arrays, see :meth:`GMPE.get_mean_std1`
+    vectorized = True
+
     def get_mean_and_stddevs(self, sites, rup, dists, imt, stddev_types):
         """
         See :meth:`superclass method
@@ -113,10 +122,9 @@ class BooreEtAl2014(GMPE):
         Returns the magnitude scling term defined in equation (2)
         """
         dmag = rup.mag - C["Mh"]
-        if rup.mag <= C["Mh"]:
-            mag_term = (C["e4"] * dmag) + (C["e5"] * (dmag ** 2.0))
-        else:
-            mag_term = C["e6"] * dmag
+        mag_term = np.where(rup.mag <= C["Mh"],
+                            (C["e4"] * dmag) + (C["e5"] * (dmag ** 2.0)),
+                            C["e6"] * dmag)
         return self._get_style_of_faulting_term(C, rup) + mag_term
 
     def _get_style_of_faulting_term(self, C, rup):
@@ -130,15 +138,11 @@ class BooreEtAl2014(GMPE):
         Note that the 'Unspecified' case is not considered here as
         rake is always given.
         """
-        if np.abs(rup.rake) <= 30.0 or (180.0 - np.abs(rup.rake)) <= 30.0:
-            # strike-slip
-            return C["e1"]
-        elif rup.rake > 30.0 and rup.rake < 150.0:
-            # reverse
-            return C["e3"]
-        else:
-            # normal
-            return C["e2"]
+        abs_rake = np.abs(rup.rake)
+        return np.select(
+            [(abs_rake <= 30.0) | (180.0 - abs_rake <= 30.0),  # strike-slip
+             (rup.rake > 30.0) & (rup.rake < 150.0)],  # reverse
+            [C["e1"], C["e3"]], C["e2"])  # normal
 
     def _get_path_scaling(self, C, dists, mag):
         """
@@ -216,12 +220,7 @@ class BooreEtAl2014(GMPE):
         on magnitude
         """
         base_vals = np.zeros(num_sites)
-        if mag <= 4.5:
-            return base_vals + C["t1"]
-        elif mag >= 5.5:
-            return base_vals + C["t2"]
-        else:
-            return base_vals + C["t1"] + (C["t2"] - C["t1"]) * (mag - 4.5)
+        return base_vals + _interp_mag(C["t1"], C["t2"], mag)
 
     def _get_intra_event_phi(self, C, mag, rjb, vs30, num_sites):
         """
@@ -230,12 +229,7 @@ class BooreEtAl2014(GMPE):
         """
         base_vals = np.zeros(num_sites)
         # Magnitude Dependent phi (Equation 17)
-        if mag <= 4.5:
-            base_vals += C["f1"]
-        elif mag >= 5.5:
-            base_vals += C["f2"]
-        else:
-            base_vals += (C["f1"] + (C["f2"] - C["f1"]) * (mag - 4.5))
+        base_vals += _interp_mag(C["f1"], C["f2"], mag)
         # Distance dependent phi (Equation 16)
         idx1 = rjb > C["R2"]
         base_vals[idx1] += C["DfR"]
@@ -69,33 +69,8 @@ class BooreAtkinson2008(GMPE):
     #: Shear-wave velocity for reference soil conditions in [m s-1]
     DEFINED_FOR_REFERENCE_VELOCITY = 760.
 
-    def get_mean_std1(self, ctx, imts):
-        """
-        :param ctx: a multi-RuptureContext of size U
-        :param imts: a list of M intensity measure types
-        :returns: means and total stddevs as an array of shape (2, U, M)
-        """
-        U = ctx.size()
-        res = np.zeros((2, U, len(imts)))
-        for m, imt in enumerate(imts):
-            C = self.COEFFS[imt]
-            C_SR = self.COEFFS_SOIL_RESPONSE[imt]
-            pga4nl = self._get_pga_on_rock(ctx, C)
-            if isinstance(imt, PGA):
-                mean = (np.log(pga4nl) +
-                        self._get_site_amplification_linear(ctx.vs30, C_SR) +
-                        self._get_site_amplification_non_linear(
-                            ctx.vs30, pga4nl, C_SR))
-            else:
-                mean = (self._compute_magnitude_scaling(ctx, C) +
-                        self._compute_distance_scaling(ctx, C) +
-                        self._get_site_amplification_linear(ctx.vs30, C_SR) +
-                        self._get_site_amplification_non_linear(
-                            ctx.vs30, pga4nl, C_SR))
-            [stddev] = self._get_stddevs(C, [const.StdDev.TOTAL], U)
-            res[0, :, m] = mean
-            res[1, :, m] = stddev
-        return res
+    #: The rupture parameters can be arrays, see :meth:`GMPE.get_mean_std1`
+    vectorized = True
 
     def get_mean_and_stddevs(self, sites, rup, dists, imt, stddev_types):
         """
@@ -150,33 +125,26 @@ class BooreAtkinson2008(GMPE):
                 stddevs.append(C['tau'] + np.zeros(num_sites))
         return stddevs
 
-    def _compute_distance_scaling(self, ctx, C):
+    def _compute_distance_scaling(self, rup, C):
         """
         Compute distance-scaling term, equations (3) and (4), pag 107.
         """
         Mref = 4.5
         Rref = 1.0
-        R = np.sqrt(ctx.rjb ** 2 + C['h'] ** 2)
-        return (C['c1'] + C['c2'] * (ctx.mag - Mref)) * np.log(R / Rref) + \
+        R = np.sqrt(rup.rjb ** 2 + C['h'] ** 2)
+        return (C['c1'] + C['c2'] * (rup.mag - Mref)) * np.log(R / Rref) + \
             C['c3'] * (R - Rref)
 
-    def _compute_magnitude_scaling(self, ctx, C):
+    def _compute_magnitude_scaling(self, rup, C):
         """
         Compute magnitude-scaling term, equations (5a) and (5b), pag 107.
         """
-        if ctx.size() == 1:  # single rupture
-            return self._compute_ms(ctx, C)
-        return np.array([self._compute_ms(c, C) for c in ctx.ctxs])
-
-    def _compute_ms(self, rup, C):
         U, SS, NS, RS = self._get_fault_type_dummy_variables(rup)
-        if rup.mag <= C['Mh']:
-            return C['e1'] * U + C['e2'] * SS + C['e3'] * NS + C['e4'] * RS + \
-                C['e5'] * (rup.mag - C['Mh']) + \
-                C['e6'] * (rup.mag - C['Mh']) ** 2
-        else:
-            return C['e1'] * U + C['e2'] * SS + C['e3'] * NS + C['e4'] * RS + \
-                C['e7'] * (rup.mag - C['Mh'])
+        dmag = rup.mag - C['Mh']
+        return C['e1'] * U + C['e2'] * SS + C['e3'] * NS + C['e4'] * RS + \
+            np.where(rup.mag <= C['Mh'],
+                     C['e5'] * dmag + C['e6'] * dmag ** 2,
+                     C['e7'] * dmag)
 
     def _get_fault_type_dummy_variables(self, rup):
         """
@@ -188,22 +156,16 @@ class BooreAtkinson2008(GMPE):
         -30 to -150 are normal. See paragraph 'Predictor Variables'
         pag 103.
         Note that the 'Unspecified' case is not considered,
-        because rake is always given.
+        because rake is always given; the dummy variables are
+        arrays if the rake is an array.
         """
-        U, SS, NS, RS = 0, 0, 0, 0
-        if rup.rake == 'undefined':
-            U = 1
-        elif np.abs(rup.rake) <= 30.0 or (180.0 - np.abs(rup.rake)) <= 30.0:
-            # strike-slip
-            SS = 1
-        elif rup.rake > 30.0 and rup.rake < 150.0:
-            # reverse
-            RS = 1
-        else:
-            # normal
-            NS = 1
-
-        return U, SS, NS, RS
+        if isinstance(rup.rake, str):  # 'undefined'
+            return 1, 0, 0, 0
+        abs_rake = np.abs(rup.rake)
+        SS = (abs_rake <= 30.0) | (180.0 - abs_rake <= 30.0)
+        RS = ~SS & (rup.rake > 30.0) & (rup.rake < 150.0)
+        NS = ~SS & ~RS
+        return 0, SS * 1, NS * 1, RS * 1
 
     def _get_site_amplification_linear(self, vs30, C):
         """
@@ -212,7 +174,7 @@ class BooreAtkinson2008(GMPE):
         """
         return C['blin'] * np.log(vs30 / 760.0)
 
-    def _get_pga_on_rock(self, ctx, _C):
+    def _get_pga_on_rock(self, rup, _C):
         """
         Compute and return PGA on rock conditions (that is vs30 = 760.0 m/s).
         This is needed to compute non-linear site amplification term
@@ -228,8 +190,8 @@ class BooreAtkinson2008(GMPE):
         # Table 6 should read "Distance-scaling coefficients (Mref=4.5 and
         # Rref=1.0 km for all periods)".
         C_pga = self.COEFFS[PGA()]
-        pga4nl = np.exp(self._compute_magnitude_scaling(ctx, C_pga) +
-                        self._compute_distance_scaling(ctx, C_pga))
+        pga4nl = np.exp(self._compute_magnitude_scaling(rup, C_pga) +
+                        self._compute_distance_scaling(rup, C_pga))
 
         return pga4nl
 
@@ -409,6 +371,8 @@ class Atkinson2010Hawaii(BooreAtkinson2008):
     # Adding hypocentral depth as required rupture parameter
     REQUIRES_RUPTURE_PARAMETERS = {'mag', 'rake', 'hypo_depth'}
 
+    vectorized = False  # the depth correction works on scalar ruptures
+
     def get_mean_and_stddevs(self, sites, rup, dists, imt, stddev_types):
         """
         Using a frequency dependent correction for the mean ground motion.
@@ -36,6 +36,8 @@ class BooreAtkinson2011(BooreAtkinson2008):
     pages 1121-1135).
     """
 
+    vectorized = False  # the correction factor works on scalar ruptures
+
     def get_mean_and_stddevs(self, sites, rup, dists, imt, stddev_types):
         """
         See :meth:`superclass method
@@ -37,6 +37,8 @@ class SInterCan15Mid(ZhaoEtAl2006SInter):
     #: Supported standard deviations
     DEFINED_FOR_STANDARD_DEVIATION_TYPES = set([const.StdDev.TOTAL])
 
+    vectorized = False  # _get_mean works on scalar ruptures
+
     def _get_delta(self, dists):
         """
         Computes the additional delta to be used for the computation of the
@@ -123,11 +123,14 @@ class AvgPoeGMPE(GMPE):
         return res
 
     def get_poes(self, mean_std, loglevels, trunclevel,
-                 af=None, ctxs=()):
+                 af=None, ctxs=(), sf_tolerance=0., rtime=None):
         """
-        :returns: an array of shape (N, L)
+        :returns: an array of shape (N, L), containing PNEs if rtime is given
         """
-        poes = [gsim.get_poes(
-            mean_std[:, :, :, g], loglevels, trunclevel, af, ctxs)
+        poes = [gsim.get_poes(mean_std[:, :, :, g], loglevels, trunclevel,
+                              af, ctxs, sf_tolerance)
                 for g, gsim in enumerate(self.gsims)]
-        return numpy.average(poes, 0, self.weights)
+        avg = numpy.average(poes, 0, self.weights)
+        if rtime is not None:
+            return numpy.exp(-rtime[:, None] * avg)
+        return avg
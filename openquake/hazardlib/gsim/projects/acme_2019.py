@@ -110,6 +110,7 @@ class ChiouYoungs2014ACME2019(ChiouYoungs2014):
     """
 
     adapted = True
+    vectorized = False  # _get_ln_y_ref works on scalar ruptures
 
     def _get_mean(self, sites, C, ln_y_ref, exp1, exp2):
         """
@@ -68,6 +68,8 @@ class ZalachorisRathje2019(BooreEtAl2014):
     #: not verified warning
     non_verified = False
 
+    vectorized = False  # _get_ZR19_magnitude_term works on scalar ruptures
+
     def get_mean_and_stddevs(self, sites, rup, dists, imt, stddev_types):
         """
         See :meth:`superclass method
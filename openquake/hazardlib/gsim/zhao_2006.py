@@ -80,6 +80,9 @@ class ZhaoEtAl2006Asc(GMPE):
     #  DEFINED_FOR_REFERENCE_VELOCITY = 1100
     DEFINED_FOR_REFERENCE_VELOCITY = 800
 
+    #: The rupture parameters can be arrays, see :meth:`GMPE.get_mean_std1`
+    vectorized = True
+
     def get_mean_and_stddevs(self, sites, rup, dists, imt, stddev_types):
         """
         See :meth:`superclass method
@@ -146,9 +149,7 @@ class ZhaoEtAl2006Asc(GMPE):
         Compute fourth term in equation 1, p. 901.
         """
         # p. 901. "(i.e, depth is capped at 125 km)".
-        focal_depth = hypo_depth
-        if focal_depth > 125.0:
-            focal_depth = 125.0
+        focal_depth = np.minimum(hypo_depth, 125.0)
 
         # p. 902. "We used the value of 15 km for the
         # depth coefficient hc ...".
@@ -156,7 +157,7 @@ class ZhaoEtAl2006Asc(GMPE):
 
         # p. 901. "When h is larger than hc, the depth terms takes
         # effect ...". The next sentence specifies h>=hc.
-        return float(focal_depth >= hc) * C['e'] * (focal_depth - hc)
+        return (focal_depth >= hc) * C['e'] * (focal_depth - hc)
 
     def _compute_faulting_style_term(self, C, rake):
         """
@@ -165,7 +166,7 @@ class ZhaoEtAl2006Asc(GMPE):
         # p. 900. "The differentiation in focal mechanism was
         # based on a rake angle criterion, with a rake of +/- 45
         # as demarcation between dip-slip and strike-slip."
-        return float(rake > 45.0 and rake < 135.0) * C['FR']
+        return ((rake > 45.0) & (rake < 135.0)) * C['FR']
 
     def _compute_site_class_term(self, C, vs30):
         """
@@ -484,10 +485,7 @@ class ZhaoEtAl2006SSlabNSHMP2014(ZhaoEtAl2006SSlab):
         d = np.array(dists.rrup)  # make a copy
         d[d == 0.0] = 0.1
 
-        if rup.mag > 7.8:
-            rup_mag = 7.8
-        else:
-            rup_mag = rup.mag
+        rup_mag = np.minimum(rup.mag, 7.8)
         # mean value as given by equation 1, p. 901, without considering the
         # faulting style and intraslab terms (that is FR, SS, SSL = 0) and the
         # inter and intra event terms, plus the magnitude-squared term
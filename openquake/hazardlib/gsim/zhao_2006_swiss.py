@@ -73,6 +73,8 @@ class ZhaoEtAl2006AscSWISS05(ZhaoEtAl2006Asc):
     #: confirmed by the Swiss GMPE group
     DEFINED_FOR_REFERENCE_VELOCITY = 1105.
 
+    vectorized = False  # _compute_phi_ss works on scalar ruptures
+
     def get_mean_and_stddevs(self, sites, rup, dists, imt, stddev_types):
         """
         See :meth:`superclass method
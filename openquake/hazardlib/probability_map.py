@@ -15,9 +15,11 @@
 #
 # You should have received a copy of the GNU Affero General Public License
 # along with OpenQuake.  If not, see <http://www.gnu.org/licenses/>.
-from openquake.baselib.python3compat import zip
+import copy
+import collections.abc
 import numpy
 
+U32 = numpy.uint32
 F32 = numpy.float32
 F64 = numpy.float64
 BYTES_PER_FLOAT = 8
@@ -106,9 +108,9 @@ class ProbabilityCurve(object):
         return curve[0]
 
 
-class ProbabilityMap(dict):
+class ProbabilityMap(collections.abc.MutableMapping):
     """
-    A dictionary site_id -> ProbabilityCurve. It defines the complement
+    A mapping site_id -> ProbabilityCurve. It defines the complement
     operator `~`, performing the complement on each curve
 
     ~p = 1 - p
@@ -123,6 +125,12 @@ class ProbabilityMap(dict):
     :class:`ProbabilityMap`. The map can be represented as 3D array of shape
     (shape_x, shape_y, shape_z) = (N, L, I), where N is the number of site IDs,
     L the total number of hazard levels and I the number of GSIMs.
+
+    The map is stored as an array of N site IDs plus a contiguous array
+    of shape (N, L, I); the ProbabilityCurves returned by `pmap[sid]` are
+    views over the second array, which are invalidated when the map grows.
+    The maps are pickled as the pair of arrays, which are serialized
+    without copies with the pickle protocol 5.
     """
     @classmethod
     def build(cls, shape_y, shape_z, sids, initvalue=0., dtype=F64):
@@ -133,10 +141,10 @@ class ProbabilityMap(dict):
         :param initvalue: the initial value of the probability (default 0)
         :returns: a ProbabilityMap dictionary
         """
-        dic = cls(shape_y, shape_z)
-        for sid in sids:
-            dic.setdefault(sid, initvalue, dtype)
-        return dic
+        sids = list(sids)
+        array = numpy.empty((len(sids), shape_y, shape_z), dtype)
+        array.fill(initvalue)
+        return cls.from_array(array, sids)
 
     @classmethod
     def from_array(cls, array, sids):
@@ -152,13 +160,105 @@ class ProbabilityMap(dict):
         if len(array.shape) == 2:  # shape (N, L) -> (N, L, 1)
             array = array.reshape(array.shape + (1,))
         self = cls(*array.shape[1:])
-        for sid, poes in zip(sids, array):
-            self[sid] = ProbabilityCurve(poes)
+        self._init(numpy.array(sids, U32), numpy.ascontiguousarray(array))
         return self
 
     def __init__(self, shape_y, shape_z=1):
         self.shape_y = shape_y
         self.shape_z = shape_z
+        self._init(numpy.zeros(0, U32), numpy.zeros((0, shape_y, shape_z)))
+
+    def _init(self, sids, array):
+        # set the storage; the arrays can have more rows than sites
+        self._sids = sids
+        self._array = array
+        self._idx = {sid: i for i, sid in enumerate(sids.tolist())}
+
+    def _extend(self, sids, array):
+        # append new sites, by doubling the capacity of the storage if needed
+        n = len(self._idx)
+        if n == 0 and array.dtype != self._array.dtype:
+            self._array = self._array.astype(array.dtype)
+        m = n + len(sids)
+        if m > len(self._sids):
+            cap = max(m, 2 * len(self._sids))
+            sids_ = numpy.zeros(cap, U32)
+            sids_[:n] = self._sids[:n]
+            array_ = numpy.zeros((cap,) + self._array.shape[1:],
+                                 self._array.dtype)
+            array_[:n] = self._array[:n]
+            self._sids, self._array = sids_, array_
+        self._sids[n:m] = sids
+        self._array[n:m] = array
+        for i, sid in enumerate(self._sids[n:m].tolist(), n):
+            self._idx[sid] = i
+
+    def _rows(self, sids):
+        # the rows of the given sites, -1 for the missing ones
+        sids = numpy.array(sids, U32)
+        n = len(self._idx)
+        rows = numpy.full(len(sids), -1)
+        if n and len(sids):
+            order = numpy.argsort(self._sids[:n])
+            sorted_sids = self._sids[order]
+            pos = numpy.searchsorted(sorted_sids, sids).clip(max=n - 1)
+            ok = sorted_sids[pos] == sids
+            rows[ok] = order[pos[ok]]
+        return rows
+
+    def _items(self):
+        # the site IDs and the array of the map, without copies
+        n = len(self._idx)
+        return self._sids[:n], self._array[:n]
+
+    def __getitem__(self, sid):
+        return ProbabilityCurve(self._array[self._idx[sid]])
+
+    def __setitem__(self, sid, pcurve):
+        array = numpy.reshape(pcurve.array, (1, self.shape_y, self.shape_z))
+        try:
+            self._array[self._idx[sid]] = array[0]
+        except KeyError:
+            self._extend([sid], array)
+
+    def __delitem__(self, sid):
+        # move the last site in the row of the deleted site
+        row = self._idx.pop(sid)
+        last = len(self._idx)
+        if row != last:
+            self._sids[row] = self._sids[last]
+            self._array[row] = self._array[last]
+            self._idx[self._sids[row].item()] = row
+
+    def __iter__(self):
+        return iter(self._idx)
+
+    def __len__(self):
+        return len(self._idx)
+
+    def __contains__(self, sid):
+        return sid in self._idx
+
+    def __repr__(self):
+        return '<%s %d sites, shape (%d, %d)>' % (
+            self.__class__.__name__, len(self), self.shape_y, self.shape_z)
+
+    def clear(self):
+        self._init(numpy.zeros(0, U32), self._array[:0])
+
+    def update(self, other):
+        """
+        Update the map with the curves of another map
+        """
+        if not isinstance(other, ProbabilityMap):
+            for sid in other:
+                self[sid] = other[sid]
+            return
+        sids, array = other._items()
+        rows = self._rows(sids)
+        ok = rows >= 0
+        self._array[rows[ok]] = array[ok]
+        self._extend(sids[~ok], array[~ok])
 
     def setdefault(self, sid, value, dtype=F64):
         """
@@ -167,39 +267,47 @@ class ProbabilityMap(dict):
 
         :param sid: site ID
         :param value: value used to fill the returned ProbabilityCurve
-        :param dtype: dtype used internally (F32 or F64)
+        :param dtype: dtype used internally (F32 or F64), used only if
+                      the map is empty
         """
         try:
             return self[sid]
         except KeyError:
-            array = numpy.empty((self.shape_y, self.shape_z), dtype)
+            array = numpy.empty((1, self.shape_y, self.shape_z), dtype)
             array.fill(value)
-            pc = ProbabilityCurve(array)
-            self[sid] = pc
-            return pc
+            self._extend([sid], array)
+            return self[sid]
 
     @property
     def sids(self):
         """The ordered keys of the map as a numpy.uint32 array"""
-        return numpy.array(sorted(self), numpy.uint32)
+        return numpy.sort(self._items()[0])
 
     def array(self, N):
         """
         An array of shape (N, L, I)
         """
         arr = numpy.zeros((N, self.shape_y, self.shape_z))
-        for sid in self:
-            arr[sid] = self[sid].array
+        sids, array = self._items()
+        arr[sids] = array
+        return arr
+
+    def to_array(self, sids):
+        """
+        :param sids: a sequence of S site IDs
+        :returns: an array of shape (S, L, I), with zeros for missing sites
+        """
+        rows = self._rows(sids)
+        ok = rows >= 0
+        arr = numpy.zeros((len(rows), self.shape_y, self.shape_z),
+                          self._array.dtype)
+        arr[ok] = self._array[rows[ok]]
         return arr
 
     @property
     def nbytes(self):
         """The size of the underlying array"""
-        try:
-            N, L, I = get_shape([self])
-        except AllEmptyProbabilityMaps:
-            return 0
-        return BYTES_PER_FLOAT * N * L * I
+        return BYTES_PER_FLOAT * len(self) * self.shape_y * self.shape_z
 
     # used when exporting to HDF5
     def convert(self, imtls, nsites, idx=0):
@@ -215,35 +323,27 @@ class ProbabilityMap(dict):
             index on the z-axis (default 0)
         """
         curves = numpy.zeros(nsites, imtls.dt)
+        sids, array = self._items()
         for imt in curves.dtype.names:
-            curves_by_imt = curves[imt]
-            for sid in self:
-                curves_by_imt[sid] = self[sid].array[imtls(imt), idx]
+            curves[imt][sids] = array[:, imtls(imt), idx]
         return curves
 
     def filter(self, sids):
         """
         Extracs a submap of self for the given sids.
         """
-        dic = self.__class__(self.shape_y, self.shape_z)
-        for sid in sids:
-            try:
-                dic[sid] = self[sid]
-            except KeyError:
-                pass
-        return dic
+        sids = numpy.array(list(sids), U32)
+        rows = self._rows(sids)
+        ok = rows >= 0
+        return self.__class__.from_array(self._array[rows[ok]], sids[ok])
 
     def extract(self, inner_idx):
         """
         Extracts a component of the underlying ProbabilityCurves,
         specified by the index `inner_idx`.
         """
-        out = self.__class__(self.shape_y, 1)
-        for sid in self:
-            curve = self[sid]
-            array = curve.array[:, inner_idx].reshape(-1, 1)
-            out[sid] = ProbabilityCurve(array)
-        return out
+        sids, array = self._items()
+        return self.__class__.from_array(array[:, :, [inner_idx]], sids)
 
     def __ior__(self, other):
         if not other:
@@ -251,17 +351,17 @@ class ProbabilityMap(dict):
         if (other.shape_y, other.shape_z) != (self.shape_y, self.shape_z):
             raise ValueError('%s has inconsistent shape with %s' %
                              (other, self))
-        self_sids = set(self)
-        other_sids = set(other)
-        for sid in self_sids & other_sids:
-            self[sid] = self[sid] | other[sid]
-        for sid in other_sids - self_sids:
-            self[sid] = other[sid]
+        sids, array = other._items()
+        rows = self._rows(sids)
+        ok = rows >= 0
+        common = rows[ok]
+        self._array[common] = 1. - (1. - self._array[common]) * (
+            1. - array[ok])
+        self._extend(sids[~ok], array[~ok])
         return self
 
     def __or__(self, other):
-        new = self.__class__(self.shape_y, self.shape_z)
-        new.update(self)
+        new = copy.copy(self)
         new |= other
         return new
 
@@ -284,46 +384,76 @@ class ProbabilityMap(dict):
 
     def __iadd__(self, other):
         # this is used when composing mutually exclusive probabilities
-        for sid in other:
-            pcurve = self.setdefault(sid, 0)
-            pcurve += other[sid]
+        sids, array = other._items()
+        rows = self._rows(sids)
+        ok = rows >= 0
+        self._array[rows[ok]] += array[ok]
+        self._extend(sids[~ok], array[~ok])
         return self
 
     def __mul__(self, other):
         try:
             other.get
-            is_pmap = True
             sids = set(self) | set(other)
         except AttributeError:  # no .get method, assume a float
-            is_pmap = False
             assert 0. <= other <= 1., other  # must be a probability
-            sids = set(self)
+            return self._new(lambda array: array * other)
         new = self.__class__(self.shape_y, self.shape_z)
         for sid in sids:
-            prob = other.get(sid, 1) if is_pmap else other
-            new[sid] = self.get(sid, 1) * prob
+            new[sid] = self.get(sid, 1) * other.get(sid, 1)
         return new
 
+    def __imul__(self, other):
+        # the missing sites count as probabilities 1, as in __mul__
+        try:
+            sids, array = other._items()
+        except AttributeError:  # assume a float
+            assert 0. <= other <= 1., other  # must be a probability
+            self._items()[1][:] *= other
+            return self
+        rows = self._rows(sids)
+        ok = rows >= 0
+        self._array[rows[ok]] *= array[ok]
+        self._extend(sids[~ok], array[~ok])
+        return self
+
     def __ipow__(self, n):
-        for sid, pcurve in self.items():
-            self[sid] = pcurve ** n
+        self._items()[1][:] **= n
         return self
 
     def __pow__(self, n):
-        new = self.__class__(self.shape_y, self.shape_z)
-        for sid, pcurve in self.items():
-            new[sid] = pcurve ** n
-        return new
+        return self._new(lambda array: array ** n)
 
     def __invert__(self):
-        new = self.__class__(self.shape_y, self.shape_z)
-        for sid in self:
-            if (self[sid].array != 1.).any():
-                new[sid] = ~self[sid]  # store only nonzero probabilities
+        sids, array = self._items()
+        array = 1. - array
+        # store only nonzero probabilities
+        ok = array.any(axis=(1, 2))
+        return self.__class__.from_array(array[ok], sids[ok])
+
+    def _new(self, func):
+        # build a new map by applying func to the underlying array
+        sids, array = self._items()
+        return self.__class__.from_array(func(array), sids)
+
+    def __copy__(self):
+        new = self.__class__.__new__(self.__class__)
+        vars(new).update(vars(self))
+        sids, array = self._items()
+        new._init(sids.copy(), array.copy())
         return new
 
     def __getstate__(self):
-        return dict(shape_y=self.shape_y, shape_z=self.shape_z)
+        # pickle the sites and the array, not the index nor the
+        # unused rows; with the protocol 5 the array is not copied
+        state = vars(self).copy()
+        del state['_idx']
+        state['_sids'], state['_array'] = self._items()
+        return state
+
+    def __setstate__(self, state):
+        vars(self).update(state)
+        self._init(self._sids, self._array)
 
 
 def get_shape(pmaps):
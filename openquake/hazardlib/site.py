@@ -286,6 +286,10 @@ class SiteCollection(object):
         indices = numpy.uint32(indices)
         new.array = self.array[indices]
         new.complete = self.complete
+        if 'xyz' in self.__dict__:
+            # the cartesian coordinates are computed once per task, by the
+            # SourceFilter, and then sliced for the sources and ruptures
+            new.__dict__['xyz'] = self.xyz[indices]
         return new
 
     def add_col(self, colname, dtype, values=None):
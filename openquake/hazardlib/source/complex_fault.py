@@ -181,12 +181,44 @@ class ComplexFaultSource(ParametricSeismicSource):
 
         Uses :func:`_float_ruptures` for finding possible rupture locations
         on the whole fault surface.
+
+        If the keyword arguments ``sites`` and ``maxdist`` (a function
+        magnitude -> maximum distance) are given, the ruptures further
+        than the maximum distance from all the sites are discarded before
+        building their surfaces.
         """
         whole_fault_surface = ComplexFaultSurface.from_fault_data(
             self.edges, self.rupture_mesh_spacing)
         whole_fault_mesh = whole_fault_surface.mesh
+        for (mag, mag_occ_rate, occurrence_rate,
+             rupture_slice) in self._gen_slices(whole_fault_mesh, **kwargs):
+            mesh = whole_fault_mesh[rupture_slice]
+            # XXX: use surface centroid as rupture's hypocenter
+            # XXX: instead of point with middle index
+            hypocenter = mesh.get_middle_point()
+            try:
+                surface = ComplexFaultSurface(mesh)
+            except ValueError as e:
+                raise ValueError("Invalid source with id=%s. %s" % (
+                    self.source_id, str(e)))
+            rup = ParametricProbabilisticRupture(
+                mag, self.rake, self.tectonic_region_type, hypocenter,
+                surface, occurrence_rate, self.temporal_occurrence_model)
+            rup.mag_occ_rate = mag_occ_rate
+            yield rup
+
+    def _gen_slices(self, whole_fault_mesh, sites=None, maxdist=None,
+                    **kwargs):
+        # yield the floating ruptures in compact form, i.e. as tuples
+        # (mag, mag_occ_rate, occurrence_rate, rupture_slice) indexing the
+        # whole fault mesh; the distance of a rupture from the sites is the
+        # minimum of the distances of its nodes, so the far away ruptures
+        # are discarded without building their meshes
         cell_center, cell_length, cell_width, cell_area = (
             whole_fault_mesh.get_cell_dimensions())
+        if sites is not None:
+            node_dist = sites.mesh.get_min_distance(
+                whole_fault_mesh).reshape(whole_fault_mesh.shape)
         for mag, mag_occ_rate in self.get_annual_occurrence_rates():
             # min_mag is inside get_annual_occurrence_rates
             if mag_occ_rate == 0:
@@ -198,21 +230,12 @@ class ComplexFaultSource(ParametricSeismicSource):
             rupture_slices = _float_ruptures(
                 rupture_area, rupture_length, cell_area, cell_length)
             occurrence_rate = mag_occ_rate / float(len(rupture_slices))
+            if sites is not None:
+                mdist = maxdist(mag)
+                rupture_slices = [rs for rs in rupture_slices
+                                  if node_dist[rs].min() <= mdist]
             for rupture_slice in rupture_slices:
-                mesh = whole_fault_mesh[rupture_slice]
-                # XXX: use surface centroid as rupture's hypocenter
-                # XXX: instead of point with middle index
-                hypocenter = mesh.get_middle_point()
-                try:
-                    surface = ComplexFaultSurface(mesh)
-                except ValueError as e:
-                    raise ValueError("Invalid source with id=%s. %s" % (
-                        self.source_id, str(e)))
-                rup = ParametricProbabilisticRupture(
-                    mag, self.rake, self.tectonic_region_type, hypocenter,
-                    surface, occurrence_rate, self.temporal_occurrence_model)
-                rup.mag_occ_rate = mag_occ_rate
-                yield rup
+                yield mag, mag_occ_rate, occurrence_rate, rupture_slice
 
     def count_ruptures(self):
         """
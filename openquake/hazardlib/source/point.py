@@ -19,8 +19,10 @@ Module :mod:`openquake.hazardlib.source.point` defines :class:`PointSource`.
 import math
 import logging
 import itertools
+import collections
 import numpy
-from openquake.baselib.general import AccumDict, groupby_grid
+from openquake.baselib.general import (
+    AccumDict, groupby_grid, register_cache)
 from openquake.hazardlib.scalerel import PointMSR
 from openquake.hazardlib.geo import Point, geodetic
 from openquake.hazardlib.geo.surface.planar import PlanarSurface
@@ -72,6 +74,156 @@ def _get_rupture_dimensions(src, mag, rake, dip):
     return rup_length, rup_width
 
 
+# rupture templates by (MSR class, aspect ratio, seismogenic depths,
+# magnitude, nodal plane, hypocenter depth); they are shared by all the
+# point sources with the same parameters, like the point sources of an area
+# source or of a multipoint source
+_templates = register_cache(collections.OrderedDict())
+# maximum projection radii by (MSR class, aspect ratio, seismogenic depths,
+# magnitude, nodal planes), used when computing the bounding boxes and then
+# the weights of the sources
+_radii = register_cache(collections.OrderedDict())
+MAX_TEMPLATES = 100_000
+
+
+def _lru_get(cache, key, func, *args):
+    # get the value from a cache with least recently used eviction,
+    # computing it with func(*args) if missing
+    try:
+        val = cache[key]
+    except KeyError:
+        if len(cache) >= MAX_TEMPLATES:
+            cache.popitem(last=False)  # evict the least recently used
+        val = cache[key] = func(*args)
+    else:
+        cache.move_to_end(key)
+    return val
+
+
+def _get_max_radius(src, mag):
+    # half of the maximum diagonal of the rupture surface projections
+    radius = []
+    for _, np in src.nodal_plane_distribution.data:
+        rup_length, rup_width = _get_rupture_dimensions(
+            src, mag, np.rake, np.dip)
+        rup_width = rup_width * math.cos(math.radians(np.dip))
+        # the projection radius is half of the rupture diagonal
+        radius.append(math.sqrt(rup_length ** 2 + rup_width ** 2) / 2.0)
+    return max(radius)
+
+
+class RuptureTemplate(object):
+    """
+    The geometry of a planar rupture relative to its hypocenter, i.e. the
+    shift of the rupture center and the position of the four corners with
+    respect to the center. It depends only on the source parameters, the
+    magnitude, the nodal plane and the hypocenter depth, so it is computed
+    once and then translated to each location.
+
+    :param src:
+        a PointSource, AreaSource or MultiPointSource
+    :param mag:
+        a magnitude
+    :param nodal_plane:
+        a :class:`openquake.hazardlib.geo.nodalplane.NodalPlane` instance
+    :param hc_depth:
+        the depth of the hypocenter
+    """
+    def __init__(self, src, mag, nodal_plane, hc_depth):
+        self.strike = nodal_plane.strike
+        self.dip = nodal_plane.dip
+        rdip = math.radians(nodal_plane.dip)
+
+        # precalculated azimuth values for horizontal-only and vertical-only
+        # moves from one point to another on the plane defined by strike
+        # and dip:
+        azimuth_right = nodal_plane.strike
+        azimuth_down = (azimuth_right + 90) % 360
+        azimuth_left = (azimuth_down + 90) % 360
+        azimuth_up = (azimuth_left + 90) % 360
+
+        rup_length, rup_width = _get_rupture_dimensions(
+            src, mag, nodal_plane.rake, nodal_plane.dip)
+        # calculate the height of the rupture being projected
+        # on the vertical plane:
+        rup_proj_height = rup_width * math.sin(rdip)
+        # and it's width being projected on the horizontal one:
+        rup_proj_width = rup_width * math.cos(rdip)
+
+        # half height of the vertical component of rupture width
+        # is the vertical distance between the rupture geometrical
+        # center and it's upper and lower borders:
+        hheight = rup_proj_height / 2.
+        # calculate how much shallower the upper border of the rupture
+        # is than the upper seismogenic depth:
+        vshift = src.upper_seismogenic_depth - hc_depth + hheight
+        # if it is shallower (vshift > 0) than we need to move the rupture
+        # by that value vertically.
+        if vshift < 0:
+            # the top edge is below upper seismogenic depth. now we need
+            # to check that we do not cross the lower border.
+            vshift = src.lower_seismogenic_depth - hc_depth - hheight
+            if vshift > 0:
+                # the bottom edge of the rupture is above the lower sesmogenic
+                # depth. that means that we don't need to move the rupture
+                # as it fits inside seismogenic layer.
+                vshift = 0
+            # if vshift < 0 than we need to move the rupture up by that value.
+
+        # now we need to find the position of rupture's geometrical center.
+        # in any case the hypocenter point must lie on the surface, however
+        # the rupture center might be off (below or above) along the dip.
+        self.vshift = vshift
+        if vshift != 0:
+            # we need to move the rupture center to make the rupture fit
+            # inside the seismogenic layer.
+            self.hshift = abs(vshift / math.tan(rdip))
+            self.azimuth = azimuth_up if vshift < 0 else azimuth_down
+
+        # from the rupture center we can now compute the coordinates of the
+        # four coorners by moving along the diagonals of the plane. This seems
+        # to be better then moving along the perimeter, because in this case
+        # errors are accumulated that induce distorsions in the shape with
+        # consequent raise of exceptions when creating PlanarSurface objects
+        # theta is the angle between the diagonal of the surface projection
+        # and the line passing through the rupture center and parallel to the
+        # top and bottom edges. Theta is zero for vertical ruptures (because
+        # rup_proj_width is zero)
+        theta = math.degrees(
+            math.atan((rup_proj_width / 2.) / (rup_length / 2.)))
+        self.hor_dist = math.sqrt(
+            (rup_length / 2.) ** 2 + (rup_proj_width / 2.) ** 2)
+        # azimuths and vertical increments of the corners left_top,
+        # right_top, right_bottom, left_bottom
+        strike = nodal_plane.strike
+        self.azimuths = numpy.array([
+            (strike + 180 + theta) % 360, (strike - theta) % 360,
+            (strike + theta) % 360, (strike + 180 - theta) % 360])
+        hheight = rup_proj_height / 2.
+        self.vincrs = numpy.array([-hheight, -hheight, hheight, hheight])
+
+    def get_surface(self, hypocenter):
+        """
+        :param hypocenter: a Point instance
+        :returns: (PlanarSurface, rupture center) translated to hypocenter
+        """
+        rupture_center = hypocenter
+        if self.vshift != 0:
+            rupture_center = rupture_center.point_at(
+                horizontal_distance=self.hshift,
+                vertical_increment=self.vshift, azimuth=self.azimuth)
+        lons, lats = geodetic.point_at(
+            rupture_center.longitude, rupture_center.latitude,
+            self.azimuths, self.hor_dist)
+        depths = rupture_center.depth + self.vincrs
+        lt, rt, rb, lb = [Point(lon, lat, dep) for lon, lat, dep in zip(
+            lons, lats, depths)]
+        # the validity checks are cheap, since the projections of the
+        # corners are needed anyway, so they are performed at every location
+        surface = PlanarSurface(self.strike, self.dip, lt, rt, rb, lb)
+        return surface, rupture_center
+
+
 class PointSource(ParametricSeismicSource):
     """
     Point source typology represents seismicity on a single geographical
@@ -148,14 +300,12 @@ class PointSource(ParametricSeismicSource):
         """
         if mag is None:
             mag, _rate = self.get_annual_occurrence_rates()[-1]
-        radius = []
-        for _, np in self.nodal_plane_distribution.data:
-            rup_length, rup_width = _get_rupture_dimensions(
-                self, mag, np.rake, np.dip)
-            rup_width = rup_width * math.cos(math.radians(np.dip))
-            # the projection radius is half of the rupture diagonal
-            radius.append(math.sqrt(rup_length ** 2 + rup_width ** 2) / 2.0)
-        self.radius = max(radius)
+        key = (self.magnitude_scaling_relationship.__class__,
+               self.rupture_aspect_ratio, self.upper_seismogenic_depth,
+               self.lower_seismogenic_depth, mag,
+               tuple((np.dip, np.rake)
+                     for _, np in self.nodal_plane_distribution.data))
+        self.radius = _lru_get(_radii, key, _get_max_radius, self, mag)
         return self.radius
 
     def iter_ruptures(self, **kwargs):
@@ -228,91 +378,13 @@ class PointSource(ParametricSeismicSource):
         """
         assert self.upper_seismogenic_depth <= hypocenter.depth \
             and self.lower_seismogenic_depth >= hypocenter.depth
-        rdip = math.radians(nodal_plane.dip)
-
-        # precalculated azimuth values for horizontal-only and vertical-only
-        # moves from one point to another on the plane defined by strike
-        # and dip:
-        azimuth_right = nodal_plane.strike
-        azimuth_down = (azimuth_right + 90) % 360
-        azimuth_left = (azimuth_down + 90) % 360
-        azimuth_up = (azimuth_left + 90) % 360
-
-        rup_length, rup_width = _get_rupture_dimensions(
-            self, mag, nodal_plane.rake, nodal_plane.dip)
-        # calculate the height of the rupture being projected
-        # on the vertical plane:
-        rup_proj_height = rup_width * math.sin(rdip)
-        # and it's width being projected on the horizontal one:
-        rup_proj_width = rup_width * math.cos(rdip)
-
-        # half height of the vertical component of rupture width
-        # is the vertical distance between the rupture geometrical
-        # center and it's upper and lower borders:
-        hheight = rup_proj_height / 2.
-        # calculate how much shallower the upper border of the rupture
-        # is than the upper seismogenic depth:
-        vshift = self.upper_seismogenic_depth - hypocenter.depth + hheight
-        # if it is shallower (vshift > 0) than we need to move the rupture
-        # by that value vertically.
-        if vshift < 0:
-            # the top edge is below upper seismogenic depth. now we need
-            # to check that we do not cross the lower border.
-            vshift = self.lower_seismogenic_depth - hypocenter.depth - hheight
-            if vshift > 0:
-                # the bottom edge of the rupture is above the lower sesmogenic
-                # depth. that means that we don't need to move the rupture
-                # as it fits inside seismogenic layer.
-                vshift = 0
-            # if vshift < 0 than we need to move the rupture up by that value.
-
-        # now we need to find the position of rupture's geometrical center.
-        # in any case the hypocenter point must lie on the surface, however
-        # the rupture center might be off (below or above) along the dip.
-        rupture_center = hypocenter
-        if vshift != 0:
-            # we need to move the rupture center to make the rupture fit
-            # inside the seismogenic layer.
-            hshift = abs(vshift / math.tan(rdip))
-            rupture_center = rupture_center.point_at(
-                horizontal_distance=hshift, vertical_increment=vshift,
-                azimuth=(azimuth_up if vshift < 0 else azimuth_down))
-
-        # from the rupture center we can now compute the coordinates of the
-        # four coorners by moving along the diagonals of the plane. This seems
-        # to be better then moving along the perimeter, because in this case
-        # errors are accumulated that induce distorsions in the shape with
-        # consequent raise of exceptions when creating PlanarSurface objects
-        # theta is the angle between the diagonal of the surface projection
-        # and the line passing through the rupture center and parallel to the
-        # top and bottom edges. Theta is zero for vertical ruptures (because
-        # rup_proj_width is zero)
-        theta = math.degrees(
-            math.atan((rup_proj_width / 2.) / (rup_length / 2.)))
-        hor_dist = math.sqrt(
-            (rup_length / 2.) ** 2 + (rup_proj_width / 2.) ** 2)
-
-        left_top = rupture_center.point_at(
-            horizontal_distance=hor_dist,
-            vertical_increment=-rup_proj_height / 2.,
-            azimuth=(nodal_plane.strike + 180 + theta) % 360)
-        right_top = rupture_center.point_at(
-            horizontal_distance=hor_dist,
-            vertical_increment=-rup_proj_height / 2.,
-            azimuth=(nodal_plane.strike - theta) % 360)
-        left_bottom = rupture_center.point_at(
-            horizontal_distance=hor_dist,
-            vertical_increment=rup_proj_height / 2.,
-            azimuth=(nodal_plane.strike + 180 - theta) % 360)
-        right_bottom = rupture_center.point_at(
-            horizontal_distance=hor_dist,
-            vertical_increment=rup_proj_height / 2.,
-            azimuth=(nodal_plane.strike + theta) % 360)
-
-        surface = PlanarSurface(
-            nodal_plane.strike, nodal_plane.dip, left_top, right_top,
-            right_bottom, left_bottom)
-        return surface, rupture_center
+        key = (self.magnitude_scaling_relationship.__class__,
+               self.rupture_aspect_ratio, self.upper_seismogenic_depth,
+               self.lower_seismogenic_depth, mag, nodal_plane.strike,
+               nodal_plane.dip, nodal_plane.rake, hypocenter.depth)
+        template = _lru_get(_templates, key, RuptureTemplate,
+                            self, mag, nodal_plane, hypocenter.depth)
+        return template.get_surface(hypocenter)
 
     @property
     def polygon(self):
@@ -19,11 +19,13 @@ Module :mod:`openquake.hazardlib.source.simple_fault` defines
 """
 import copy
 import math
+import numpy
 from openquake.baselib.python3compat import round
 from openquake.hazardlib import mfd
 from openquake.hazardlib.source.base import ParametricSeismicSource
 from openquake.hazardlib.geo.surface.simple_fault import SimpleFaultSurface
 from openquake.hazardlib.geo.nodalplane import NodalPlane
+from openquake.hazardlib.geo.mesh import sliding_min
 from openquake.hazardlib.source.rupture import ParametricProbabilisticRupture
 
 
@@ -133,15 +135,61 @@ class SimpleFaultSource(ParametricSeismicSource):
         size on the surface of the whole fault source. The occurrence
         rate of each of those ruptures is the magnitude occurrence rate
         divided by the number of ruptures that can be placed in a fault.
+
+        If the keyword arguments ``sites`` and ``maxdist`` (a function
+        magnitude -> maximum distance) are given, the ruptures further
+        than the maximum distance from all the sites are discarded before
+        building their surfaces.
         """
         whole_fault_surface = SimpleFaultSurface.from_fault_data(
             self.fault_trace, self.upper_seismogenic_depth,
             self.lower_seismogenic_depth, self.dip, self.rupture_mesh_spacing)
         whole_fault_mesh = whole_fault_surface.mesh
+        for (mag, occurrence_rate, first_row, first_col, rup_rows,
+             rup_cols) in self._gen_windows(whole_fault_mesh, **kwargs):
+            mesh = whole_fault_mesh[first_row: first_row + rup_rows,
+                                    first_col: first_col + rup_cols]
+
+            if not len(self.hypo_list) and not len(self.slip_list):
+
+                hypocenter = mesh.get_middle_point()
+                occurrence_rate_hypo = occurrence_rate
+                surface = SimpleFaultSurface(mesh)
+
+                yield ParametricProbabilisticRupture(
+                    mag, self.rake, self.tectonic_region_type,
+                    hypocenter, surface, occurrence_rate_hypo,
+                    self.temporal_occurrence_model)
+            else:
+                for hypo in self.hypo_list:
+                    for slip in self.slip_list:
+                        surface = SimpleFaultSurface(mesh)
+                        hypocenter = surface.get_hypo_location(
+                            self.rupture_mesh_spacing, hypo[:2])
+                        occurrence_rate_hypo = occurrence_rate * \
+                            hypo[2] * slip[1]
+                        rupture_slip_direction = slip[0]
+
+                        yield ParametricProbabilisticRupture(
+                            mag, self.rake, self.tectonic_region_type,
+                            hypocenter, surface, occurrence_rate_hypo,
+                            self.temporal_occurrence_model,
+                            rupture_slip_direction)
+
+    def _gen_windows(self, whole_fault_mesh, sites=None, maxdist=None,
+                     **kwargs):
+        # yield the floating ruptures in compact form, i.e. as tuples
+        # (mag, occurrence_rate, first_row, first_col, rup_rows, rup_cols)
+        # indexing the whole fault mesh; the distance of a rupture from the
+        # sites is the minimum of the distances of its nodes, so it can be
+        # computed for all the ruptures of a given size with a sliding
+        # minimum on the distances of the nodes of the whole fault
         mesh_rows, mesh_cols = whole_fault_mesh.shape
         fault_length = float((mesh_cols - 1) * self.rupture_mesh_spacing)
         fault_width = float((mesh_rows - 1) * self.rupture_mesh_spacing)
-
+        if sites is not None:
+            node_dist = sites.mesh.get_min_distance(
+                whole_fault_mesh).reshape(whole_fault_mesh.shape)
         for mag, mag_occ_rate in self.get_annual_occurrence_rates():
             rup_cols, rup_rows = self._get_rupture_dimensions(
                 fault_length, fault_width, mag)
@@ -149,37 +197,15 @@ class SimpleFaultSource(ParametricSeismicSource):
             num_rup_along_width = mesh_rows - rup_rows + 1
             num_rup = num_rup_along_length * num_rup_along_width
             occurrence_rate = mag_occ_rate / float(num_rup)
-            for first_row in range(num_rup_along_width):
-                for first_col in range(num_rup_along_length):
-                    mesh = whole_fault_mesh[first_row: first_row + rup_rows,
-                                            first_col: first_col + rup_cols]
-
-                    if not len(self.hypo_list) and not len(self.slip_list):
-
-                        hypocenter = mesh.get_middle_point()
-                        occurrence_rate_hypo = occurrence_rate
-                        surface = SimpleFaultSurface(mesh)
-
-                        yield ParametricProbabilisticRupture(
-                            mag, self.rake, self.tectonic_region_type,
-                            hypocenter, surface, occurrence_rate_hypo,
-                            self.temporal_occurrence_model)
-                    else:
-                        for hypo in self.hypo_list:
-                            for slip in self.slip_list:
-                                surface = SimpleFaultSurface(mesh)
-                                hypocenter = surface.get_hypo_location(
-                                    self.rupture_mesh_spacing, hypo[:2])
-                                occurrence_rate_hypo = occurrence_rate * \
-                                    hypo[2] * slip[1]
-                                rupture_slip_direction = slip[0]
-
-                                yield ParametricProbabilisticRupture(
-                                    mag, self.rake, self.tectonic_region_type,
-                                    hypocenter, surface, occurrence_rate_hypo,
-                                    self.temporal_occurrence_model,
-                                    rupture_slip_direction)
-
+            if sites is None:
+                close = numpy.ones(
+                    (num_rup_along_width, num_rup_along_length), bool)
+            else:
+                close = sliding_min(
+                    node_dist, rup_rows, rup_cols) <= maxdist(mag)
+            for first_row, first_col in zip(*numpy.where(close)):
+                yield (mag, occurrence_rate, first_row, first_col,
+                       rup_rows, rup_cols)
 
     def get_fault_surface_area(self):
         """
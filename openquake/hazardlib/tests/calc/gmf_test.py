@@ -0,0 +1,50 @@
+# The Hazard Library
+# Copyright (C) 2012-2020 GEM Foundation
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as
+# published by the Free Software Foundation, either version 3 of the
+# License, or (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+import unittest
+import numpy
+from openquake.hazardlib.const import TRT
+from openquake.hazardlib.geo import Point
+from openquake.hazardlib.site import Site, SiteCollection
+from openquake.hazardlib.source.point import make_rupture
+from openquake.hazardlib.source.rupture import EBRupture
+from openquake.hazardlib.contexts import ContextMaker
+from openquake.hazardlib.calc.gmf import GmfComputer
+from openquake.hazardlib.gsim.boore_atkinson_2008 import BooreAtkinson2008
+from openquake.hazardlib.gsim.akkar_bommer_2010 import AkkarBommer2010
+
+
+class GenGmfsTestCase(unittest.TestCase):
+    def test_chunks(self):
+        rup = make_rupture(TRT.ACTIVE_SHALLOW_CRUST, 6.5)
+        rup.rup_id = 42
+        ebr = EBRupture(rup, 'src', 0, n_occ=50)
+        sites = SiteCollection([
+            Site(Point(lon, lat), 760., 100., 5., vs30measured=False)
+            for lon in (-.2, 0., .2) for lat in (-.2, 0., .2)])
+        gsims = [AkkarBommer2010(), BooreAtkinson2008()]
+        cmaker = ContextMaker(TRT.ACTIVE_SHALLOW_CRUST, gsims, dict(
+            imtls={'PGA': [.01], 'SA(1.0)': [.01]}))
+        computer = GmfComputer(ebr, sites, cmaker, truncation_level=3)
+        rlzs_by_gsim = {gsim: [i] for i, gsim in enumerate(sorted(gsims))}
+        min_iml = [.05, .05]  # discard some records
+        expected, _dt = computer.compute_all(min_iml, rlzs_by_gsim)
+        self.assertGreater(len(expected), 0)
+        self.assertLess(len(expected), 50 * 9)
+        chunks = list(computer.gen_gmfs(min_iml, rlzs_by_gsim, chunksize=7))
+        self.assertGreater(len(chunks), 1)
+        for chunk in chunks:
+            self.assertLessEqual(len(chunk), 7)
+        numpy.testing.assert_equal(numpy.concatenate(chunks), expected)
@@ -23,9 +23,11 @@ from openquake.hazardlib.const import TRT
 from openquake.baselib.general import DictArray
 from openquake.hazardlib.tom import PoissonTOM
 from openquake.hazardlib.contexts import (
-    Effect, RuptureContext, _collapse, _make_pmap, ContextMaker, get_distances)
+    Effect, RuptureContext, _collapse, _make_pmap, ContextMaker,
+    get_distances, DistanceEngine)
 from openquake.hazardlib import valid
 from openquake.hazardlib.geo.surface import SimpleFaultSurface as SFS
+from openquake.hazardlib.geo.surface import PlanarSurface, MultiSurface
 from openquake.hazardlib.source.rupture import \
     NonParametricProbabilisticRupture as NPPR
 from openquake.hazardlib.geo import Line, Point
@@ -34,6 +36,7 @@ from openquake.hazardlib.source import PointSource
 from openquake.hazardlib.mfd import ArbitraryMFD
 from openquake.hazardlib.scalerel import WC1994
 from openquake.hazardlib.geo.nodalplane import NodalPlane
+from openquake.hazardlib.calc.filters import MagDepDistance
 
 
 aac = numpy.testing.assert_allclose
@@ -152,6 +155,68 @@ class ClosestPointOnTheRuptureTestCase(unittest.TestCase):
         self.assertTrue(abs(dsts[1, 1]-0.0) < 1e-2, msg)
 
 
+class DistanceEngineTestCase(unittest.TestCase):
+    params = ['rrup', 'rx', 'ry0', 'rjb', 'rhypo', 'repi', 'azimuth',
+              'azimuth_cp', 'closest_point']
+
+    def setUp(self):
+        trc = Line([Point(0.0, 0.0), Point(0.5, 0.0)])
+        sfs = SFS.from_fault_data(trc, 0., 20., 45., 2.5)
+        planar1 = PlanarSurface.from_corner_points(
+            Point(0.0, 0.0, 0.), Point(0.0, 0.4, 0.),
+            Point(0.1, 0.4, 10.), Point(0.1, 0.0, 10.))
+        planar2 = PlanarSurface.from_corner_points(
+            Point(0.0, 0.5, 0.), Point(0.1, 0.9, 0.),
+            Point(0.2, 0.9, 10.), Point(0.1, 0.5, 10.))
+        self.surfaces = [sfs, planar1, MultiSurface([planar1, planar2])]
+        lons, lats = numpy.meshgrid(numpy.linspace(-.5, 1., 7),
+                                    numpy.linspace(-.5, 1.5, 9))
+        self.sites = SiteCollection([
+            Site(Point(lon, lat), 760., 100., 5., vs30measured=False)
+            for lon, lat in zip(lons.flat, lats.flat)])
+
+    def test_same_distances(self):
+        pmf = PMF([(0.8, 0), (0.2, 1)])
+        for surface in self.surfaces:
+            rup = NPPR(6., 90., TRT.ACTIVE_SHALLOW_CRUST,
+                       Point(0.05, 0.2, 5.), surface, pmf)
+            dist_eng = DistanceEngine(rup, self.sites, self.params)
+            for param in self.params:
+                aac(dist_eng.get(param), get_distances(rup, self.sites, param),
+                    atol=1E-6)
+
+            # the distances already computed are filtered with the sites
+            mask = dist_eng.get('rrup') < 50.
+            sites = self.sites.filter(mask)
+            filtered = dist_eng.filter(mask)
+            for param in self.params:
+                aac(filtered.get(param), get_distances(rup, sites, param),
+                    atol=1E-6)
+
+    def test_planar_batch(self):
+        # the contexts of the planar ruptures of a point source, computed
+        # in batch, are the same as the ones computed rupture by rupture
+        mfd = ArbitraryMFD([5.5, 6.5], [1., 1.])
+        npd = PMF([(.5, NodalPlane(0., 90., 0.)),
+                   (.5, NodalPlane(45., 50., 90.))])
+        hdd = PMF([(.5, 5.), (.5, 10.)])
+        src = PointSource('0', 'test', TRT.ACTIVE_SHALLOW_CRUST, mfd, 2.,
+                          WC1994(), 1., PoissonTOM(1.), 0., 20.,
+                          Point(0.2, 0.2), npd, hdd)
+        rups = list(src.iter_ruptures())
+        gsims = [valid.gsim('ChiouYoungs2014')]
+        cmaker = ContextMaker(src.tectonic_region_type, gsims, dict(
+            imtls={'PGA': [.01]},
+            maximum_distance=MagDepDistance.new('60')))
+        ctxs = cmaker.make_ctxs(rups, self.sites, 0)
+        self.assertEqual(len(ctxs), len(rups))
+        for rup, ctx in zip(rups, ctxs):
+            _, sites, dctx = cmaker.make_contexts(self.sites, rup)
+            aac(ctx.sids, sites.sids)
+            for par in cmaker.REQUIRES_DISTANCES:
+                aac(getattr(ctx, par), getattr(dctx, par), atol=1E-6)
+
+
 class EffectTestCase(unittest.TestCase):
     def test_dist_by_mag(self):
         effect = Effect(intensities, dists)
@@ -227,3 +292,47 @@ class CollapseTestCase(unittest.TestCase):
                                investigation_time=50))
         pmap = _make_pmap(ctxs, cmaker)
         numpy.testing.assert_almost_equal(pmap[0].array, 0.066381)
+
+    def test_recarray(self):
+        gsims = [valid.gsim('AkkarBommer2010')]
+        ctxs = []
+        for mag, nsites in [(5.5, 2), (6.0, 1)]:
+            ctx = RuptureContext()
+            ctx.mag = mag
+            ctx.rake = 90
+            ctx.occurrence_rate = .001
+            ctx.sids = numpy.arange(nsites)
+            ctx.vs30 = numpy.repeat(760., nsites)
+            ctx.rjb = numpy.array([10., 20.])[:nsites]
+            ctxs.append(ctx)
+        cmaker = ContextMaker('TRT', gsims, dict(imtls={'PGA': [0.01]}))
+        arr = cmaker.recarray(ctxs)
+        self.assertEqual(list(arr.rup_id), [0, 0, 1])
+        self.assertEqual(list(arr.sids), [0, 1, 0])
+        aac(arr.mag, [5.5, 5.5, 6.0])
+        aac(arr.rjb, [10., 20., 10.])
+
+        # the flat context is made of contiguous arrays
+        ctx = cmaker.multi(ctxs, arr)
+        aac(ctx.vs30, [760., 760., 760.])
+        self.assertTrue(ctx.rjb.flags.c_contiguous)
+        self.assertIs(ctx.ctxs, ctxs)
+
+        # the PNEs computed on the table are the ones of the contexts,
+        # both with the exact and the interpolated survival function
+        for ctx in ctxs:
+            ctx.temporal_occurrence_model = PoissonTOM(50)
+        for tol in (0, 1E-6):
+            cmaker.sf_tolerance = tol
+            poes = cmaker.get_poes(ctxs, arr)
+            pnes = cmaker.get_pnes(ctxs, arr)
+            aac(pnes[:2], ctxs[0].get_probability_no_exceedance(poes[:2]))
+            aac(pnes[2:], ctxs[1].get_probability_no_exceedance(poes[2:]))
+
+        # contexts with the same parameters and distances are collapsed
+        ctxs[1].mag = 5.5
+        ctxs[1].rjb = numpy.array([10., 20.])
+        ctxs[1].sids = numpy.array([0, 1])
+        ctxs[1].vs30 = numpy.array([760., 760.])
+        [ctx] = cmaker.collapse_the_ctxs(ctxs)
+        self.assertEqual(ctx.occurrence_rate, .002)
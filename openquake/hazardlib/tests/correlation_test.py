@@ -18,8 +18,9 @@ import unittest
 import numpy
 
 from openquake.hazardlib.imt import SA, PGA
-from openquake.hazardlib.correlation import JB2009CorrelationModel, \
-                                            HM2018CorrelationModel
+from openquake.hazardlib.correlation import (
+    JB2009CorrelationModel, HM2018CorrelationModel, FactorCache, factor_cache,
+    NearestNeighborFactor)
 from openquake.hazardlib.site import Site, SiteCollection
 from openquake.hazardlib.geo import Point
 
@@ -298,3 +299,100 @@ class HM2018ApplyCorrelationTestCase(unittest.TestCase):
              [[1.        , 0.3807, 0.5066],
               [0.3807, 1.        , 0.3075],
               [0.5066, 0.3075, 1.        ]], 2)
+
+
+class FactorCacheTestCase(unittest.TestCase):
+    SITECOL = SiteCollection([Site(Point(2, -40), 1, 1, 1),
+                              Site(Point(2, -40.1), 1, 1, 1),
+                              Site(Point(2, -39.95), 1, 1, 1)])
+
+    def setUp(self):
+        factor_cache.clear()
+
+    def test_shared(self):
+        residuals = numpy.ones((2, 5))
+        filtered = self.SITECOL.filtered([0, 2])
+        res1 = JB2009CorrelationModel(False).apply_correlation(
+            filtered, PGA(), residuals)
+        res2 = JB2009CorrelationModel(False).apply_correlation(
+            filtered, PGA(), residuals)
+        aaae(res1, res2)
+        self.assertEqual((factor_cache.hits, factor_cache.misses), (1, 1))
+
+        # different parameters give a different factor
+        JB2009CorrelationModel(True).apply_correlation(
+            filtered, PGA(), residuals)
+        self.assertEqual(len(factor_cache), 2)
+
+    def test_hm_filtered(self):
+        # the factors for different filtered sites must not be mixed
+        cormo = HM2018CorrelationModel()
+        stddev_intra = numpy.array([0.5, 0.6, 0.7])
+        for sids in ([0, 1], [0, 1, 2], [1, 2]):
+            sites = self.SITECOL.filtered(sids)
+            res = cormo.apply_correlation(
+                sites, PGA(), numpy.ones((len(sids), 1)), stddev_intra)
+            std = stddev_intra[sids]
+            cov = (numpy.diag(std) @
+                   cormo._get_correlation_matrix(sites, PGA()) @
+                   numpy.diag(std))
+            aaae(res[:, 0], numpy.linalg.cholesky(cov) @ (1 / std))
+        self.assertEqual(len(factor_cache), 3)
+
+    def test_lru(self):
+        cache = FactorCache(maxbytes=200)
+        cache['a'] = numpy.zeros(10)  # 80 bytes
+        cache['b'] = numpy.zeros(10)
+        cache['a']  # now 'b' is the least recently used
+        cache['c'] = numpy.zeros(10)
+        self.assertEqual(list(cache.dic), ['a', 'c'])
+        self.assertEqual(cache.nbytes, 160)
+        cache['d'] = numpy.zeros(30)  # too big
+        self.assertEqual(list(cache.dic), ['a', 'c'])
+
+
+class NearestNeighborFactorTestCase(unittest.TestCase):
+    # a regular grid of 10x10 sites spaced ~11 km
+    lons, lats = numpy.meshgrid(numpy.linspace(0, 1, 10),
+                                numpy.linspace(0, 1, 10))
+    SITECOL = SiteCollection.from_points(lons.flatten(), lats.flatten())
+
+    def setUp(self):
+        factor_cache.clear()
+
+    def check(self, cormo, imt, num_neighbors, decimal):
+        exact = cormo._get_correlation_matrix(self.SITECOL, imt)
+        factor = NearestNeighborFactor(
+            self.SITECOL['lon'], self.SITECOL['lat'],
+            lambda dist: cormo._get_correlation_matrix(dist, imt),
+            num_neighbors)
+        lower = factor @ numpy.eye(len(self.SITECOL))
+        aaae(lower @ lower.T, exact, decimal)
+
+    def test_exact(self):
+        # conditioning on all the preceding sites gives the Cholesky factor
+        cormo = JB2009CorrelationModel(vs30_clustering=False)
+        self.check(cormo, PGA(), 99, decimal=12)
+
+    def test_approx(self):
+        self.check(JB2009CorrelationModel(False), SA(1.0), 20, decimal=3)
+        # the HM2018 correlation has a longer range, hence a larger error
+        self.check(HM2018CorrelationModel(), SA(1.0), 20, decimal=1)
+
+    def test_apply_correlation(self):
+        numpy.random.seed(13)
+        cormo = JB2009CorrelationModel(vs30_clustering=False,
+                                       num_neighbors=20)
+        sites = self.SITECOL.filtered(range(0, 100, 3))
+        residuals = numpy.random.normal(size=(len(sites), 50000))
+        correlated = cormo.apply_correlation(sites, PGA(), residuals)
+        aaae(numpy.corrcoef(correlated),
+             cormo._get_correlation_matrix(sites, PGA()), 1)
+
+        stddev_intra = numpy.linspace(.3, .7, 100)
+        cormo = HM2018CorrelationModel(num_neighbors=20)
+        residuals = numpy.random.normal(size=(len(sites), 50000))
+        correlated = cormo.apply_correlation(
+            sites, PGA(), residuals * stddev_intra[sites.sids, None],
+            stddev_intra)
+        aaae(correlated.std(axis=1), stddev_intra[sites.sids], 2)
@@ -20,6 +20,7 @@ import numpy
 
 from openquake.hazardlib.geo.point import Point
 from openquake.hazardlib.geo.polygon import Polygon
+from openquake.hazardlib.geo import mesh as mesh_module
 from openquake.hazardlib.geo.mesh import Mesh, RectangularMesh
 from openquake.hazardlib.geo import utils as geo_utils
 
@@ -256,6 +257,53 @@ class MeshGetMinDistanceTestCase(unittest.TestCase):
         self._test(mesh, target_mesh,
                    expected_distance_indices=[3, 3, 3, 0, 0, 3, 3, 3, 3])
 
+    def test_kdtree(self):
+        # the KD-tree used for large meshes gives the same results as
+        # the distance matrix used for small meshes
+        rng = numpy.random.RandomState(42)
+        mesh = Mesh(rng.uniform(0, 1, 300), rng.uniform(0, 1, 300),
+                    rng.uniform(0, 20, 300))
+        target_mesh = Mesh(rng.uniform(-1, 2, 200), rng.uniform(-1, 2, 200))
+        self.assertGreater(len(mesh) * len(target_mesh),
+                           mesh_module.MAX_DISTANCE_MATRIX)
+        dists, closest = mesh.get_closest(target_mesh)
+        aac(mesh.get_min_distance(target_mesh), dists)
+        expected = [point.distance(target_point)
+                    for point, target_point in zip(closest, target_mesh)]
+        aac(dists, expected, atol=1)
+        orig = mesh_module.MAX_DISTANCE_MATRIX
+        mesh_module.MAX_DISTANCE_MATRIX = len(mesh) * len(target_mesh)
+        try:
+            self.assertEqual(mesh.get_closest_points(target_mesh), closest)
+            aac(mesh.get_min_distance(target_mesh), dists)
+        finally:
+            mesh_module.MAX_DISTANCE_MATRIX = orig
+
+    def test_few_sites(self):
+        # a large mesh against a few sites uses the distance matrix,
+        # without building a KD-tree
+        rng = numpy.random.RandomState(42)
+        mesh = Mesh(rng.uniform(0, 1, 10000), rng.uniform(0, 1, 10000),
+                    rng.uniform(0, 20, 10000))
+        target_mesh = Mesh(rng.uniform(-1, 2, 3), rng.uniform(-1, 2, 3))
+        self.assertGreater(len(mesh) * len(target_mesh),
+                           mesh_module.MAX_DISTANCE_MATRIX)
+        dists = mesh.get_min_distance(target_mesh)
+        self.assertNotIn('kdtree', vars(mesh))
+        aac(dists, mesh.kdtree.query(target_mesh.xyz)[0])
+
+
+class SlidingMinTestCase(unittest.TestCase):
+    def test(self):
+        array = numpy.random.RandomState(42).random_sample((7, 9))
+        out = mesh_module.sliding_min(array, 3, 4)
+        self.assertEqual(out.shape, (5, 6))
+        for r in range(5):
+            for c in range(6):
+                self.assertEqual(out[r, c], array[r:r + 3, c:c + 4].min())
+        numpy.testing.assert_equal(mesh_module.sliding_min(array, 1, 1), array)
+        self.assertEqual(mesh_module.sliding_min(array, 7, 9), array.min())
+
 
 class MeshGetDistanceMatrixTestCase(unittest.TestCase):
     def test_zeroes(self):
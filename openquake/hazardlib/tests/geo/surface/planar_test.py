@@ -19,7 +19,8 @@ import numpy
 from openquake.hazardlib.geo import Point
 from openquake.hazardlib.geo.mesh import Mesh
 from openquake.hazardlib.geo import utils as geo_utils
-from openquake.hazardlib.geo.surface.planar import PlanarSurface
+from openquake.hazardlib.geo.surface.planar import (
+    PlanarSurface, build_planar_array, get_distances_planar)
 from openquake.hazardlib.tests.geo.surface import _planar_test_data as tdata
 
 aac = numpy.testing.assert_allclose
@@ -523,3 +524,29 @@ class PlanarSurfaceGetMiddlePointTestCase(unittest.TestCase):
         aac(midpoint.longitude, 0.0, atol=1E-4)
         aac(midpoint.latitude, 0.044966, atol=1E-4)
         aac(midpoint.depth, -4.0, atol=1E-4)
+
+
+class PlanarArrayTestCase(unittest.TestCase):
+    def test_distances(self):
+        # the distances computed on a planar array are the same as the
+        # distances computed surface by surface
+        surfaces = [
+            PlanarSurface(strike, dip, *corners) for strike, dip, corners in [
+                (0, 90, [Point(0, 0, 0), Point(0, 1, 0),
+                         Point(0, 1, 10), Point(0, 0, 10)]),
+                (90, 45, [Point(0, 0, 1), Point(1, 0, 1),
+                          Point(1, -0.0635, 8.07), Point(0, -0.0635, 8.07)]),
+                (45, 60, [Point(0.2, 0.2, 0), Point(0.4, 0.4, 0),
+                          Point(0.45, 0.35, 8.66), Point(0.25, 0.15, 8.66)])]]
+        planar = build_planar_array(surfaces)
+        lons, lats = numpy.meshgrid(numpy.linspace(-1, 2, 31),
+                                    numpy.linspace(-1, 2, 31))
+        mesh = Mesh(lons.flatten(), lats.flatten(), numpy.zeros(31 * 31))
+        for param, meth in [('rrup', 'get_min_distance'),
+                            ('rjb', 'get_joyner_boore_distance'),
+                            ('rx', 'get_rx_distance'),
+                            ('ry0', 'get_ry0_distance')]:
+            dists = get_distances_planar(planar, mesh, param)
+            self.assertEqual(dists.shape, (3, 31 * 31))
+            for surface, dist in zip(surfaces, dists):
+                aac(dist, getattr(surface, meth)(mesh), atol=1E-6)
@@ -26,7 +26,8 @@ from copy import deepcopy
 from openquake.hazardlib import const
 from openquake.hazardlib.gsim.base import (
     GMPE, CoeffsTable, SitesContext, RuptureContext,
-    NotVerifiedWarning, DeprecationWarning)
+    NotVerifiedWarning, DeprecationWarning, _get_poes)
+from openquake.baselib.general import DictArray
 from openquake.hazardlib.geo.point import Point
 from openquake.hazardlib.imt import PGA, PGV, SA
 from openquake.hazardlib.site import Site, SiteCollection
@@ -311,6 +312,21 @@ class GsimInstantiationTestCase(unittest.TestCase):
             warning_msg, 'MyGMPE is not independently verified - '
             'the user is liable for their application')
 
+    def test_vectorized(self):
+        # the vectorized flag is inherited, unless a subclass opts out
+        class VecGMPE(TGMPE):
+            vectorized = True
+
+        class SubGMPE(VecGMPE):
+            'A subclass overriding only vectorized helpers'
+
+        class ScalarGMPE(VecGMPE):
+            'A subclass overriding some scalar helper'
+            vectorized = False
+
+        self.assertTrue(SubGMPE.vectorized)
+        self.assertFalse(ScalarGMPE.vectorized)
+
 
 class CoeffsTableTestCase(unittest.TestCase):
     def setUp(self):
@@ -356,3 +372,39 @@ class CoeffsTableTestCase(unittest.TestCase):
         self.assertEqual(str(te.exception),
                          "CoeffsTable cannot be constructed with "
                          "inputs of the form 'int'")
+
+
+class GetPoesTestCase(unittest.TestCase):
+    def test_sf_table(self):
+        # the interpolated survival function is within the tolerance
+        # from the exact one, for truncated and non-truncated normals
+        rng = numpy.random.default_rng(42)
+        mean_std = numpy.array([rng.normal(-2, 1, (1000, 2)),
+                                rng.uniform(.3, .8, (1000, 2))])
+        imls = numpy.logspace(-3, 1, 50)
+        loglevels = DictArray({'PGA': imls, 'SA(0.1)': imls})
+        for imt in loglevels:
+            loglevels[imt] = numpy.log(loglevels[imt])
+        for trunclevel in (None, 3, 99):
+            exact = _get_poes(mean_std, loglevels, trunclevel)
+            for tol in (1E-4, 1E-6):
+                poes = _get_poes(mean_std, loglevels, trunclevel, tol)
+                self.assertLess(numpy.abs(poes - exact).max(), tol)
+
+    def test_fused_pnes(self):
+        # the PNEs computed together with the PoEs are the same as the
+        # ones computed from the PoEs, for any number of levels
+        rng = numpy.random.default_rng(42)
+        mean_std = numpy.array([rng.normal(-2, 1, (1000, 1)),
+                                rng.uniform(.3, .8, (1000, 1))])
+        rtime = rng.uniform(0, 2, 1000)
+        for nlevels in (1, 50, 100):
+            imls = numpy.log(numpy.logspace(-3, 1, nlevels))
+            loglevels = DictArray({'PGA': imls})
+            for trunclevel in (None, 0, 3):
+                for tol in (0, 1E-6):
+                    poes = _get_poes(mean_std, loglevels, trunclevel, tol)
+                    pnes = _get_poes(mean_std, loglevels, trunclevel, tol,
+                                     rtime)
+                    numpy.testing.assert_allclose(
+                        pnes, numpy.exp(-rtime[:, None] * poes))
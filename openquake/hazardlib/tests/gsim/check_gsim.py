@@ -32,7 +32,7 @@ import numpy
 from openquake.hazardlib import const
 from openquake.hazardlib.gsim.base import GroundShakingIntensityModel
 from openquake.hazardlib.contexts import (SitesContext, RuptureContext,
-                                          DistancesContext)
+                                          DistancesContext, ContextMaker)
 from openquake.hazardlib.imt import registry
 from openquake.hazardlib.imt import from_string
 
@@ -74,16 +74,30 @@ def check_gsim(gsim_cls, datafile, max_discrep_percentage, debug=False):
     errors = 0
     linenum = 1
     discrepancies = []
+    ctxs = []  # used to check the vectorized GMPEs
     started = time.time()
     for testcase in _parse_csv(
             datafile, debug, gsim.REQUIRES_SITES_PARAMETERS):
         linenum += 1
         (sctx, rctx, dctx, stddev_types, expected_results, result_type) \
             = testcase
+        vectorized = gsim.vectorized and (
+            result_type == 'MEAN' or stddev_types == [const.StdDev.TOTAL]
+        ) and not any(isinstance(getattr(rctx, par), str)
+                      for par in gsim.REQUIRES_RUPTURE_PARAMETERS)
+        if vectorized:
+            ctx = RuptureContext()
+            for c in (rctx, sctx, dctx):
+                vars(ctx).update(vars(c))
+            ctx.sids = numpy.arange(len(next(iter(expected_results.values()))))
+            ctx.results = {}  # imt -> (mean, stddev)
+            ctxs.append(ctx)
         for imt, expected_result in expected_results.items():
             set_read_only(sctx, dctx, rctx)
             mean, stddevs = gsim.get_mean_and_stddevs(sctx, rctx, dctx,
                                                       imt, stddev_types)
+            if vectorized:
+                ctx.results[imt] = (mean, stddevs[0] if stddevs else None)
             if result_type == 'MEAN':
                 if str(imt) == 'MMI':
                     # For IPEs it is the values, not the logarithms returned
@@ -114,11 +128,31 @@ def check_gsim(gsim_cls, datafile, max_discrep_percentage, debug=False):
 
         if debug and errors:
             break
+    if ctxs:
+        _check_vectorized(gsim, ctxs)
     return (errors,
             _format_stats(time.time() - started, discrepancies, errors),
             sctx, rctx, dctx)
 
 
+def _check_vectorized(gsim, ctxs):
+    # make sure get_mean_std1 on a flat context gives the same results
+    # as get_mean_and_stddevs called on the single contexts
+    imts = list(ctxs[0].results)
+    cmaker = ContextMaker('*', [gsim])
+    mean_std = gsim.get_mean_std1(cmaker.multi(ctxs), imts)
+    start = 0
+    for ctx in ctxs:
+        stop = start + len(ctx.sids)
+        for m, imt in enumerate(imts):
+            mean, std = ctx.results[imt]
+            numpy.testing.assert_allclose(mean_std[0, start:stop, m], mean)
+            if std is not None:  # total stddev
+                numpy.testing.assert_allclose(
+                    mean_std[1, start:stop, m], std)
+        start = stop
+
+
 def _format_stats(time_spent, discrepancies, errors):
     """
     Format a GMPE test statistics.
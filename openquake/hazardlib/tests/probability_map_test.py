@@ -16,6 +16,7 @@
 #  You should have received a copy of the GNU Affero General Public License
 #  along with OpenQuake.  If not, see <http://www.gnu.org/licenses/>.
 
+import pickle
 import unittest
 import numpy
 from openquake.hazardlib.probability_map import ProbabilityMap
@@ -40,3 +41,53 @@ class ProbabilityMapTestCase(unittest.TestCase):
         # test pmap power
         pmap = pmap1 ** 2
         numpy.testing.assert_almost_equal(pmap[0].array, [[.16], [0], [0]])
+
+    def test_array_backed(self):
+        pmap = ProbabilityMap.build(3, 2, sids=[5, 1, 7], initvalue=.1)
+        pmap[7].array[:] = 1.
+        pmap.grp_id = 3
+
+        # the curves are views over a single contiguous array
+        self.assertIs(pmap[5].array.base, pmap[1].array.base)
+
+        # pickling preserves the sites, the curves and the attributes
+        new = pickle.loads(pickle.dumps(pmap, pickle.HIGHEST_PROTOCOL))
+        self.assertEqual(list(new), [5, 1, 7])
+        self.assertEqual(new.grp_id, 3)
+        numpy.testing.assert_equal(new.array(8), pmap.array(8))
+
+        # the complement discards the curves with zero probabilities
+        inv = ~pmap
+        self.assertEqual(sorted(inv), [1, 5])
+        numpy.testing.assert_almost_equal(inv[1].array, .9)
+
+        # extract the second inner component
+        ext = pmap.extract(1)
+        self.assertEqual(ext[5].array.shape, (3, 1))
+        numpy.testing.assert_almost_equal(
+            ext.to_array([0, 1])[:, 0, 0], [0, .1])
+
+    def test_storage(self):
+        pmap = ProbabilityMap(2, 1)
+        for sid in [3, 0, 9]:  # the storage grows
+            pmap.setdefault(sid, .1).array[:] = sid / 10
+        numpy.testing.assert_equal(pmap.to_array([9, 1, 0])[:, 0, 0],
+                                   [.9, 0, 0])
+        del pmap[3]  # the last site is moved in the row of the deleted one
+        self.assertEqual(sorted(pmap), [0, 9])
+        numpy.testing.assert_equal(pmap[9].array, .9)
+
+        # the array is pickled out-of-band with the protocol 5
+        buffers = []
+        data = pickle.dumps(pmap, protocol=5, buffer_callback=buffers.append)
+        self.assertEqual(len(buffers), 2)  # sids and array
+        new = pickle.loads(data, buffers=buffers)
+        numpy.testing.assert_equal(new.array(10), pmap.array(10))
+        self.assertEqual(len(buffers[1].raw()), 2 * 2 * 8)  # only 2 sites
+
+        # in-place operators
+        new |= ProbabilityMap.build(2, 1, [0, 5], initvalue=.5)
+        numpy.testing.assert_almost_equal(
+            new.to_array([0, 5, 9])[:, 0, 0], [.5, .5, .9])
+        new *= .5
+        numpy.testing.assert_almost_equal(new[5].array, .25)
@@ -203,6 +203,17 @@ class SiteCollectionFilterTestCase(unittest.TestCase):
             self.assertEqual(saved, filtered)
         os.remove(fpath)
 
+    def test_filter_xyz(self):
+        # the cartesian coordinates of the sites are sliced, not recomputed
+        col = SiteCollection(self.SITES)
+        mask = numpy.array([False, True, True, True])
+        self.assertNotIn('xyz', vars(col.filter(mask)))
+        xyz = col.xyz
+        filtered = col.filter(mask)
+        self.assertIn('xyz', vars(filtered))
+        numpy.testing.assert_array_equal(filtered.xyz, xyz[1:])
+        numpy.testing.assert_allclose(filtered.xyz, filtered.mesh.xyz)
+
     def test_filter_all_out(self):
         col = SiteCollection(self.SITES)
         filtered = col.filter(numpy.zeros(len(self.SITES), bool))
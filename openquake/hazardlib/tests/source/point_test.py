@@ -14,7 +14,11 @@
 # You should have received a copy of the GNU Affero General Public License
 # along with this program.  If not, see <http://www.gnu.org/licenses/>.
 import unittest
+import collections
+import unittest.mock as mock
+import numpy
 from openquake.hazardlib.const import TRT
+from openquake.hazardlib.source import point
 from openquake.hazardlib.source.point import PointSource, CollapsedPointSource
 from openquake.hazardlib.source.rupture import ParametricProbabilisticRupture
 from openquake.hazardlib.mfd import TruncatedGRMFD, EvenlyDiscretizedMFD
@@ -408,6 +412,48 @@ class PointSourceIterRupturesTestCase(unittest.TestCase):
         ruptures = list(src.iter_ruptures())
         self.assertEqual(len(ruptures), 1)
 
+    def test_rupture_templates(self):
+        # two sources differing only by the location share the same
+        # templates and produce the same ruptures up to a translation,
+        # even at very different latitudes; the surfaces are checked
+        # at each location
+        point._templates.clear()
+        npd = PMF([(.5, NodalPlane(0, 30, 90)), (.5, NodalPlane(45, 90, 0))])
+        hdd = PMF([(.5, 3.), (.5, 8.)])
+        srcs = [PointSource(
+            'src%d' % i, 'pnt', TRT.ACTIVE_SHALLOW_CRUST,
+            TruncatedGRMFD(a_val=2, b_val=1, min_mag=5, max_mag=7,
+                           bin_width=1), 1, WC1994(), 1.5, PoissonTOM(50.),
+            2, 16, Point(i * 10, i * 85), npd, hdd) for i in range(2)]
+        rups0 = list(srcs[0].iter_ruptures())
+        self.assertEqual(len(point._templates), 8)
+        rups1 = list(srcs[1].iter_ruptures())
+        self.assertEqual(len(point._templates), 8)
+        for rup0, rup1 in zip(rups0, rups1):
+            surf0, surf1 = rup0.surface, rup1.surface
+            self.assertAlmostEqual(surf0.width, surf1.width, places=5)
+            self.assertAlmostEqual(surf0.length, surf1.length, places=5)
+            numpy.testing.assert_allclose(
+                surf0.corner_depths, surf1.corner_depths)
+            # the templates give the same surfaces as the direct
+            # computation, including the validity checks
+            surf, _ = point.RuptureTemplate(
+                srcs[1], rup1.mag, NodalPlane(
+                    surf1.strike, surf1.dip, rup1.rake), rup1.hypocenter.depth
+            ).get_surface(rup1.hypocenter)
+            numpy.testing.assert_equal(surf.corner_lons, surf1.corner_lons)
+            numpy.testing.assert_equal(surf.corner_lats, surf1.corner_lats)
+
+    def test_lru_eviction(self):
+        # when the cache is full only the least recently used key is evicted
+        cache = collections.OrderedDict()
+        with mock.patch.object(point, 'MAX_TEMPLATES', 2):
+            point._lru_get(cache, 'a', str, 1)
+            point._lru_get(cache, 'b', str, 2)
+            point._lru_get(cache, 'a', str, 3)  # hit, 'b' is now the oldest
+            point._lru_get(cache, 'c', str, 4)
+        self.assertEqual(list(cache.items()), [('a', '1'), ('c', '4')])
+
 
 class PointSourceMaxRupProjRadiusTestCase(unittest.TestCase):
     def test(self):
@@ -427,6 +473,15 @@ class PointSourceMaxRupProjRadiusTestCase(unittest.TestCase):
         radius = source._get_max_rupture_projection_radius()
         self.assertAlmostEqual(radius, 3.8712214)
 
+        # the radius is cached and shared by the sources differing
+        # only by the location, like the points of an area source
+        nradii = len(point._radii)
+        source = make_point_source(nodal_plane_distribution=np_dist, mfd=mfd,
+                                   lon=10, lat=20)
+        radius = source._get_max_rupture_projection_radius()
+        self.assertAlmostEqual(radius, 3.8712214)
+        self.assertEqual(len(point._radii), nradii)
+
 
 class CollapsedPointSourceTestCase(unittest.TestCase):
     def test(self):
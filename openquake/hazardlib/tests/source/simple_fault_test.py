@@ -27,6 +27,7 @@ import openquake.hazardlib.tom as tom
 from openquake.hazardlib.scalerel import PeerMSR, WC1994
 from openquake.hazardlib.geo import Point, Line
 from openquake.hazardlib.tom import PoissonTOM
+from openquake.hazardlib.site import Site, SiteCollection
 
 
 from openquake.hazardlib.tests import assert_angles_equal, assert_pickleable
@@ -150,6 +151,29 @@ class SimpleFaultIterRupturesTestCase(_BaseFaultSourceTestCase):
 
         self.assertEqual(len(list(fault.iter_ruptures())), 1)
 
+    def test_close_ruptures(self):
+        # the ruptures far away from the sites are discarded without
+        # changing the close ones
+        mfd = TruncatedGRMFD(a_val=0.5, b_val=1.0, min_mag=3.0, max_mag=6.0,
+                             bin_width=1.0)
+        fault_trace = Line([Point(0., 0.), Point(.5, 0.)])
+        source = self._make_source(mfd=mfd, aspect_ratio=1.0,
+                                   fault_trace=fault_trace)
+        sites = SiteCollection([
+            Site(Point(-.05, 0.), 760., 100., 5.),
+            Site(Point(.1, .02), 760., 100., 5.)])
+        ruptures = [rup for rup in source.iter_ruptures()
+                    if rup.surface.get_min_distance(sites.mesh).min() <= 5]
+        close = list(source.iter_ruptures(
+            sites=sites, maxdist=lambda mag: 5))
+        self.assertGreater(len(close), 0)
+        self.assertLess(len(close), source.count_ruptures())
+        self.assertEqual(len(close), len(ruptures))
+        for rup, expected in zip(close, ruptures):
+            self.assertEqual(rup.mag, expected.mag)
+            self.assertEqual(rup.occurrence_rate, expected.occurrence_rate)
+            self.assertEqual(rup.surface.mesh, expected.surface.mesh)
+
     def test_calculate_fault_surface_area(self):
         mfd = TruncatedGRMFD(a_val=0.5, b_val=1.0, min_mag=6.0, max_mag=7.0,
                              bin_width=1.0)
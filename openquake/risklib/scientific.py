@@ -36,6 +36,7 @@ from openquake.hazardlib.stats import compute_stats2
 F64 = numpy.float64
 F32 = numpy.float32
 U32 = numpy.uint32
+U64 = numpy.uint64
 
 
 def pairwise(iterable):
@@ -1070,8 +1071,11 @@ def conditional_loss_ratio(loss_ratios, poes, probability):
 def insured_losses(losses, deductible, insured_limit):
     """
     :param losses: an array of ground-up loss ratios
-    :param float deductible: the deductible limit in fraction form
-    :param float insured_limit: the insured limit in fraction form
+    :param deductible: the deductible limit in fraction form
+    :param insured_limit: the insured limit in fraction form
+
+    The deductible and the insured limit can be floats or arrays
+    broadcastable to the shape of the losses.
 
     Compute insured losses for the given asset and losses, from the point
     of view of the insurance company. For instance:
@@ -1083,10 +1087,11 @@ def insured_losses(losses, deductible, insured_limit):
     - if the loss is 20 the company pays 20 - 5 = 15
     - if the loss is 101 the company pays 100 - 5 = 95
     """
-    return numpy.piecewise(
-        losses,
-        [losses < deductible, losses > insured_limit],
-        [0, insured_limit - deductible, lambda x: x - deductible])
+    # same semantics as numpy.piecewise, where the last condition wins,
+    # also when the deductible is larger than the insured limit
+    out = numpy.where(losses < deductible, 0, losses - deductible)
+    return numpy.where(losses > insured_limit, insured_limit - deductible,
+                       out).astype(losses.dtype, copy=False)
 
 
 def insured_loss_curve(curve, deductible, insured_limit):
@@ -1483,46 +1488,120 @@ class LossesByAsset(object):
         """
         for lt in out.loss_types:
             lratios = out[lt]  # shape (A, E)
-            losses = numpy.zeros_like(lratios)
             avalues = (out.assets['occupants_None'] if lt == 'occupants'
                        else out.assets['value-' + lt])
-            for a, avalue in enumerate(avalues):
-                losses[a] = avalue * lratios[a]
+            losses = (avalues[:, None] * lratios).astype(lratios.dtype)
             yield self.lni[lt], losses  # shape (A, E)
             if lt in self.policy_dict:
-                ins_losses = numpy.zeros_like(lratios)
-                for a, asset in enumerate(out.assets):
-                    ded, lim = self.policy_dict[lt][asset[self.policy_name]]
-                    ins_losses[a] = insured_losses(
-                        losses[a], ded * avalues[a], lim * avalues[a])
+                pol = self.policy_dict[lt][out.assets[self.policy_name]]
+                ded = (pol[:, 0] * avalues).astype(lratios.dtype)
+                lim = (pol[:, 1] * avalues).astype(lratios.dtype)
+                ins_losses = insured_losses(
+                    losses, ded[:, None], lim[:, None])
                 yield self.lni[lt + '_ins'], ins_losses
 
-    def aggregate(self, out, eids, minimum_loss, tagidxs, ws):
+    def aggregate(self, out, eids, minimum_loss, aggkeys, ws):
         """
-        Populate .losses_by_A, .losses_by_E and .alt
+        Populate .losses_by_A, .losses_by_E and .alt; the last two are
+        lists of partial results, to be summed with .reduce and then
+        converted with .get_elt and .get_alt
+
+        :param out: an output with losses of shape (A, E) by loss type
+        :param eids: the E event IDs
+        :param minimum_loss: the minimum loss to store in .alt, by loss index
+        :param aggkeys: None or an array of A integer aggregation keys
+        :param ws: None or an array of E weights
+        :returns: the number of kept losses and the number of losses
         """
         numlosses = numpy.zeros(2, int)
+        if aggkeys is not None:
+            ukeys, kidx = numpy.unique(aggkeys, return_inverse=True)
         for lni, losses in self.gen_losses(out):
             if ws is not None:  # compute avg_losses, really fast
                 aids = out.assets['ordinal']
                 self.losses_by_A[aids, lni] += losses @ ws
-            for eid, loss in zip(eids, losses.sum(axis=0)):
-                self.losses_by_E[eid][lni] += loss
-            if tagidxs is not None:
-                # this is the slow part, depending on minimum_loss
-                for a, asset in enumerate(out.assets):
-                    ls = losses[a]
-                    ok = ls > minimum_loss[lni]
-                    if not ok.sum():
-                        continue
-                    idx = ','.join(map(str, tagidxs[a])) + ','
-                    kept = 0
-                    for loss, eid in zip(ls[ok], out.eids[ok]):
-                        self.alt[idx][eid][lni] += loss
-                        kept += 1
-                    numlosses += numpy.array([kept, len(losses[a])])
+            self.losses_by_E.append((eids, lni, losses.sum(axis=0)))
+            if aggkeys is not None:
+                ok = losses > minimum_loss[lni]  # shape (A, E)
+                E = ok.shape[1]
+                kept = ok.sum(axis=1)
+                numlosses += [kept.sum(), (kept > 0).sum() * E]
+                # sum the kept losses by (aggkey, event)
+                aids, eis = ok.nonzero()
+                sums = numpy.bincount(
+                    kidx[aids] * E + eis, losses[ok], len(ukeys) * E)
+                idx, = sums.nonzero()
+                keys = (ukeys[idx // E].astype(U64) << 32) + out.eids[idx % E]
+                self.alt.append((keys, lni, sums[idx]))
         return numlosses
 
+    def reduce(self):
+        """
+        Sum by key the partial results in .losses_by_E and .alt, so that
+        their size is proportional to the number of distinct keys and not
+        to the number of aggregated outputs
+        """
+        L = len(self.loss_names)
+        self.losses_by_E = _reduce_by_key(self.losses_by_E, L)
+        if self.alt:
+            self.alt = _reduce_by_key(self.alt, L)
+
+    def get_elt(self):
+        """
+        :returns: an array (event_id, loss) with the nonzero losses by event
+        """
+        eids, losses = _sum_by_key(self.losses_by_E, len(self.loss_names))
+        ok = losses.sum(axis=1) != 0
+        return _elt(eids[ok], losses[ok])
+
+    def get_alt(self, aggnames):
+        """
+        :param aggnames: the names corresponding to the aggregation keys
+        :returns: a dictionary aggname -> array (event_id, loss)
+        """
+        keys, losses = _sum_by_key(self.alt, len(self.loss_names))
+        aggkeys = keys >> 32
+        eids = (keys & 0xFFFFFFFF).astype(U32)
+        alt = {}
+        # the keys are sorted, so the aggkeys are contiguous
+        uniq, start = numpy.unique(aggkeys, return_index=True)
+        for aggkey, eis, lss in zip(uniq, numpy.split(eids, start[1:]),
+                                    numpy.split(losses, start[1:])):
+            alt[aggnames[aggkey]] = _elt(eis, lss)
+        return alt
+
+
+def _sum_by_key(triples, L):
+    # reduce a list of triples (keys, loss index, losses) into an array
+    # of unique keys and an array of summed losses of shape (K, L)
+    if not triples:
+        return numpy.zeros(0, U64), numpy.zeros((0, L), F32)
+    keys = numpy.concatenate([k for k, _, _ in triples])
+    lnis = numpy.concatenate(
+        [numpy.full(len(k), lni) for k, lni, _ in triples])
+    vals = numpy.concatenate([v for _, _, v in triples])
+    ukeys, inv = numpy.unique(keys, return_inverse=True)
+    sums = numpy.bincount(inv * L + lnis, vals, len(ukeys) * L)
+    return ukeys, sums.reshape(len(ukeys), L).astype(F32)
+
+
+def _reduce_by_key(triples, L):
+    # replace a list of triples (keys, loss index, losses) with an equivalent
+    # list containing at most a triple per loss index, sharing the same keys
+    if len(triples) <= 1:
+        return triples
+    keys, losses = _sum_by_key(triples, L)
+    return [(keys, lni, losses[:, lni]) for lni in range(L)]
+
+
+def _elt(eids, losses):
+    # build an event loss table from the event IDs and the losses
+    elt = numpy.zeros(len(eids), [('event_id', U32),
+                                  ('loss', (F32, (losses.shape[1],)))])
+    elt['event_id'] = eids
+    elt['loss'] = losses
+    return elt
+
 
 # ####################### Consequences ##################################### #
 
@@ -20,8 +20,10 @@ import unittest
 import pickle
 
 import numpy
+from openquake.baselib import hdf5
 from openquake.risklib import scientific
 
+aae = numpy.testing.assert_equal
 aaae = numpy.testing.assert_array_almost_equal
 
 
@@ -583,6 +585,23 @@ class InsuredLossesTestCase(unittest.TestCase):
             [0, 0.1, 0.4],
             scientific.insured_losses(numpy.array([0.05, 0.2, 0.6]), 0.1, 0.5))
 
+    def test_deductible_above_limit(self):
+        # the losses above the limit take precedence, as in numpy.piecewise
+        numpy.testing.assert_allclose(
+            [0, -0.2, -0.2, -0.2],
+            scientific.insured_losses(
+                numpy.array([0.2, 0.35, 0.5, 0.6]), 0.5, 0.3))
+
+    def test_arrays(self):
+        # the deductible and the limit can be different for each asset
+        losses = numpy.array([[0.05, 0.2, 0.6], [0.05, 0.2, 0.6]],
+                             numpy.float32)
+        ins = scientific.insured_losses(
+            losses, numpy.array([[0.1], [0.5]]), numpy.array([[0.5], [0.3]]))
+        self.assertEqual(ins.dtype, numpy.float32)
+        numpy.testing.assert_allclose(
+            ins, [[0, 0.1, 0.4], [0, 0, -0.2]], rtol=1E-6)
+
     def test_mean(self):
         losses1 = numpy.array([0.05, 0.2, 0.6])
         losses2 = numpy.array([0.01, 0.1, 0.3, 0.55])
@@ -594,6 +613,55 @@ class InsuredLossesTestCase(unittest.TestCase):
                                       0.1, 0.5).mean()
         numpy.testing.assert_allclose((m1 * l1 + m2 * l2) / (l1 + l2), m)
 
+    def test_by_asset(self):
+        # deductible and limit broadcast over the events
+        losses = numpy.array([[0.05, 0.2, 0.6], [0.05, 0.2, 0.6]])
+        numpy.testing.assert_allclose(
+            [[0, 0.1, 0.4], [0, 0, 0.1]],
+            scientific.insured_losses(losses, numpy.array([[.1], [.2]]),
+                                      numpy.array([[.5], [.3]])))
+
+
+class LossesByAssetTestCase(unittest.TestCase):
+    def test_aggregate(self):
+        assets = numpy.zeros(3, [('ordinal', numpy.uint32),
+                                 ('value-structural', float),
+                                 ('policy', numpy.uint32)])
+        assets['ordinal'] = [0, 1, 2]
+        assets['value-structural'] = [100, 200, 300]
+        assets['policy'] = [0, 1, 1]
+        out = hdf5.ArrayWrapper((), dict(
+            eids=numpy.array([3, 5], numpy.uint32), assets=assets,
+            loss_types=['structural']))
+        out.structural = numpy.array([[.1, .2], [.1, .0], [.3, .4]],
+                                     numpy.float32)
+        policy = {'structural': numpy.array([[.1, .5], [0, .2]])}
+        lba = scientific.LossesByAsset(
+            assets, ['structural', 'structural_ins'], 'policy', policy)
+        lba.alt = []
+        lba.losses_by_E = []
+        numlosses = lba.aggregate(out, out.eids, [15, 15],
+                                  numpy.array([0, 1, 0]), None)
+        aae(numlosses, [7, 10])
+        elt = lba.get_elt()
+        aae(elt['event_id'], [3, 5])
+        aaae(elt['loss'], [[120, 80], [140, 70]])
+        alt = lba.get_alt(['1,', '2,'])
+        aae(alt['1,']['event_id'], [3, 5])
+        aaae(alt['1,']['loss'], [[90, 60], [140, 60]])
+        aae(alt['2,']['event_id'], [3])
+        aaae(alt['2,']['loss'], [[20, 20]])
+
+        # aggregating the same output twice and reducing after each
+        # aggregation doubles the losses without growing the partial lists
+        lba.reduce()
+        lba.aggregate(out, out.eids, [15, 15], numpy.array([0, 1, 0]), None)
+        lba.reduce()
+        self.assertEqual(len(lba.losses_by_E), 2)  # one per loss index
+        self.assertEqual(len(lba.alt), 2)
+        aaae(lba.get_elt()['loss'], [[240, 160], [280, 140]])
+        aaae(lba.get_alt(['1,', '2,'])['2,']['loss'], [[40, 40]])
+
 
 class InsuredLossCurveTestCase(unittest.TestCase):
     def test_curve(self):
@@ -401,6 +401,25 @@ def log(db, job_id, timestamp, level, process, message):
        'VALUES (?X)', (job_id, timestamp, level, process, message))
 
 
+def log_records(db, records):
+    """
+    Write several log records in the database with a single transaction.
+
+    :param db:
+        a :class:`openquake.server.dbapi.Db` instance
+    :param records:
+        a list of tuples (job_id, timestamp, level, process, message)
+    """
+    db('BEGIN')
+    try:
+        db.insert('log', 'job_id timestamp level process message'.split(),
+                  records)
+    except Exception:
+        db.conn.rollback()
+        raise
+    db.conn.commit()
+
+
 def get_log(db, job_id):
     """
     Extract the logs as a big string
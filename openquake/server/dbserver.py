@@ -23,6 +23,9 @@ import sqlite3
 import logging
 import threading
 import subprocess
+import collections
+import numpy
+from urllib.request import pathname2url
 
 from openquake.baselib import config, zeromq as z, workerpool as w
 from openquake.baselib.general import socket_ready, detach_process
@@ -41,22 +44,52 @@ db.cmd = lambda action, *args: getattr(actions, action)(db, *args)
 # NB: I am increasing the timeout from 5 to 20 seconds to see if the random
 # OperationalError: "database is locked" disappear in the WebUI tests
 
+# read-only connections to the same database, used for the queries; in WAL
+# mode they can run concurrently with the writer without blocking it
+rodb = dbapi.Db(sqlite3.connect, 'file:%s?mode=ro' % pathname2url(db.path),
+                uri=True, isolation_level=None,
+                detect_types=sqlite3.PARSE_DECLTYPES, timeout=20)
+
+# actions not starting with get_ or list_ which do not change the database
+QUERIES = {'calc_info', 'db_version', 'fetch', 'find'}
+
+# upper limits in seconds of the bins of the latency histograms
+LATENCY_BINS = [.001, .01, .1, 1, 10]
+
 ZMQ = os.environ.get(
     'OQ_DISTRIBUTE', config.distribution.oq_distribute) == 'zmq'
 
 DBSERVER_PORT = int(os.environ.get('OQ_DBSERVER_PORT') or config.dbserver.port)
 
 
+def is_query(cmd):
+    """
+    :param cmd: the name of an action or a SQL string
+    :returns: True if the command does not change the database
+    """
+    if cmd.startswith(('get_', 'list_')) or cmd in QUERIES:
+        return True
+    return cmd.lstrip().upper().startswith('SELECT')
+
+
 class DbServer(object):
     """
-    A server collecting the received commands into a queue
+    A server collecting the received commands into a queue.
+    The queries are performed on the read-only connections of `rodb`,
+    while the commands changing the database are performed on `db`,
+    one at the time.
     """
-    def __init__(self, db, address, num_workers=5):
+    def __init__(self, db, address, num_workers=5, rodb=None):
         self.db = db
+        self.rodb = rodb or db
         self.frontend = 'tcp://%s:%s' % address
         self.backend = 'inproc://dbworkers'
         self.num_workers = num_workers
         self.pid = os.getpid()
+        self.lock = threading.Lock()  # single writer
+        self.latency_lock = threading.Lock()  # the workers update latency
+        self.latency = collections.defaultdict(
+            lambda: numpy.zeros(len(LATENCY_BINS) + 1, int))
         if ZMQ:
             self.zmaster = w.WorkerMaster(**config.zworkers)
         else:
@@ -70,17 +103,51 @@ class DbServer(object):
                 if cmd == 'getpid':
                     sock.send(self.pid)
                     continue
+                elif cmd == 'stats':
+                    sock.send(self.stats())
+                    continue
                 elif cmd.startswith('zmq_') and self.zmaster:
                     msg = getattr(self.zmaster, cmd[4:])()
                     logging.info(msg)
                     sock.send(msg)
                     continue
-                try:
-                    func = getattr(actions, cmd)
-                except AttributeError:  # SQL string
-                    sock.send(safely_call(self.db, (cmd,) + args))
-                else:  # action
-                    sock.send(safely_call(func, (self.db,) + args))
+                t0 = time.time()
+                res = self.call(cmd, args)
+                self.record(cmd, time.time() - t0)
+                sock.send(res)
+
+    def call(self, cmd, args):
+        """
+        Call the action or SQL string `cmd` with the given arguments
+        """
+        if is_query(cmd):
+            return self._call(self.rodb, cmd, args)
+        with self.lock:  # single writer
+            return self._call(self.db, cmd, args)
+
+    def _call(self, db, cmd, args):
+        try:
+            func = getattr(actions, cmd)
+        except AttributeError:  # SQL string
+            return safely_call(db, (cmd,) + args)
+        else:  # action
+            return safely_call(func, (db,) + args)
+
+    def record(self, cmd, dt):
+        """
+        Record the time spent in the given command in the latency histogram
+        """
+        name = cmd if hasattr(actions, cmd) else 'sql'
+        with self.latency_lock:
+            self.latency[name][numpy.searchsorted(LATENCY_BINS, dt)] += 1
+
+    def stats(self):
+        """
+        :returns: a list of rows (name, calls, counts per latency bin)
+        """
+        with self.latency_lock:
+            return [(name, int(hist.sum())) + tuple(map(int, hist))
+                    for name, hist in sorted(self.latency.items())]
 
     def start(self):
         """
@@ -122,6 +189,7 @@ class DbServer(object):
             self.zmaster.stop()
             z.context.term()
         self.db.close()
+        self.rodb.close()
 
 
 def different_paths(path1, path2):
@@ -201,6 +269,8 @@ def run_server(dbhostport=None, loglevel='WARN', foreground=False):
 
     # create and upgrade the db if needed
     db('PRAGMA foreign_keys = ON')  # honor ON DELETE CASCADE
+    # write-ahead logging, so that the readers do not block the writer
+    db('PRAGMA journal_mode = %s' % config.dbserver.get('journal_mode', 'WAL'))
     actions.upgrade_db(db)
     # the line below is needed to work around a very subtle bug of sqlite;
     # we need new connections, see https://github.com/gem/oq-engine/pull/3002
@@ -208,6 +278,9 @@ def run_server(dbhostport=None, loglevel='WARN', foreground=False):
 
     # reset any computation left in the 'executing' state
     actions.reset_is_running(db)
+    # in WAL mode the connection must not survive the fork below,
+    # since the child would not inherit the locks on the shared memory file
+    db.close()
 
     # start the dbserver
     if hasattr(os, 'fork') and not (config.dbserver.multi_user or foreground):
@@ -215,4 +288,5 @@ def run_server(dbhostport=None, loglevel='WARN', foreground=False):
         # but only if multi_user = False, otherwise init/supervisor
         # will loose control of the process
         detach_process()
-    DbServer(db, addr).start()  # expects to be killed with CTRL-C
+    num_workers = config.dbserver.get('num_workers', 5)
+    DbServer(db, addr, num_workers, rodb).start()  # to be killed with CTRL-C
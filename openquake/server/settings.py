@@ -166,6 +166,12 @@ LOGGING = {
 
 FILE_UPLOAD_MAX_MEMORY_SIZE = 1
 
+# Directory and maximum size in bytes of the cache of the results
+# returned by the extract API; the least recently used ones are removed;
+# the directory must be accessible only by the user running the server
+EXTRACT_CACHE_DIR = os.path.join(datastore.get_datadir(), 'extract')
+EXTRACT_CACHE_SIZE = 1024 ** 3
+
 # A server name can be specified to customize the WebUI in case of
 # multiple installations of the Engine are available. This helps avoiding
 # confusion between different installations when the WebUI is used
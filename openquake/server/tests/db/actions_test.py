@@ -0,0 +1,59 @@
+# -*- coding: utf-8 -*-
+# vim: tabstop=4 shiftwidth=4 softtabstop=4
+#
+# Copyright (C) 2020 GEM Foundation
+#
+# OpenQuake is free software: you can redistribute it and/or modify it
+# under the terms of the GNU Affero General Public License as published
+# by the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# OpenQuake is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with OpenQuake.  If not, see <http://www.gnu.org/licenses/>.
+
+import sqlite3
+import unittest
+from datetime import datetime
+from openquake.baselib.general import gettemp
+from openquake.server.dbapi import Db
+from openquake.server.db import actions
+
+
+class LogRecordsTestCase(unittest.TestCase):
+    def setUp(self):
+        self.db = Db(sqlite3.connect, gettemp(suffix='.sqlite3'),
+                     isolation_level=None,
+                     detect_types=sqlite3.PARSE_DECLTYPES)
+        actions.upgrade_db(self.db)
+        self.job_id = actions.create_job(self.db, '/tmp')
+
+    def tearDown(self):
+        self.db.close()
+
+    def records(self, job_id, n):
+        return [(job_id, datetime(2020, 1, 1), 'INFO', 'MainProcess/1',
+                 'message %d' % i) for i in range(n)]
+
+    def test_log_records(self):
+        actions.log_records(self.db, self.records(self.job_id, 3))
+        rows = self.db('SELECT message FROM log WHERE job_id=?x ORDER BY id',
+                       self.job_id)
+        self.assertEqual([row.message for row in rows],
+                         ['message 0', 'message 1', 'message 2'])
+
+    def test_rollback(self):
+        # a record of a missing job violates a foreign key constraint,
+        # so no record of the batch is stored
+        records = self.records(self.job_id, 2) + self.records(0, 1)
+        with self.assertRaises(sqlite3.IntegrityError):
+            actions.log_records(self.db, records)
+        [(n,)] = self.db('SELECT count(*) FROM log')
+        self.assertEqual(n, 0)
+        actions.log_records(self.db, self.records(self.job_id, 1))  # works
+        [(n,)] = self.db('SELECT count(*) FROM log')
+        self.assertEqual(n, 1)
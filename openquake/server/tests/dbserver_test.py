@@ -0,0 +1,67 @@
+# -*- coding: utf-8 -*-
+# vim: tabstop=4 shiftwidth=4 softtabstop=4
+#
+# Copyright (C) 2020 GEM Foundation
+#
+# OpenQuake is free software: you can redistribute it and/or modify it
+# under the terms of the GNU Affero General Public License as published
+# by the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# OpenQuake is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with OpenQuake.  If not, see <http://www.gnu.org/licenses/>.
+
+import unittest
+from unittest import mock
+from concurrent.futures import ThreadPoolExecutor
+from openquake.server import dbserver
+
+
+class DbServerTestCase(unittest.TestCase):
+    def setUp(self):
+        self.db, self.rodb = mock.Mock(), mock.Mock()
+        with mock.patch.object(dbserver, 'ZMQ', False):
+            self.server = dbserver.DbServer(
+                self.db, ('127.0.0.1', 1908), rodb=self.rodb)
+
+    def test_is_query(self):
+        for cmd in ['get_job', 'list_calc_id', 'calc_info', 'db_version',
+                    'select * from job', '  SELECT id FROM log']:
+            self.assertTrue(dbserver.is_query(cmd), cmd)
+        for cmd in ['log_records', 'create_job', 'set_status',
+                    'UPDATE job SET is_running=0', 'DELETE FROM log']:
+            self.assertFalse(dbserver.is_query(cmd), cmd)
+
+    def test_call(self):
+        # the queries use the read-only connections, the other commands
+        # use the writer connection while holding the lock
+        calls = []
+
+        def call(db, cmd, args):
+            calls.append((db, cmd, self.server.lock.locked()))
+
+        with mock.patch.object(self.server, '_call', call):
+            self.server.call('get_job', (1,))
+            self.server.call('SELECT * FROM job', ())
+            self.server.call('log_records', ([],))
+            self.server.call('UPDATE job SET is_running=0', ())
+        self.assertEqual(calls, [
+            (self.rodb, 'get_job', False),
+            (self.rodb, 'SELECT * FROM job', False),
+            (self.db, 'log_records', True),
+            (self.db, 'UPDATE job SET is_running=0', True)])
+
+    def test_stats(self):
+        # the latency histograms are updated by several threads
+        with ThreadPoolExecutor(4) as executor:
+            for dt in [.0001, .005] * 1000:
+                executor.submit(self.server.record, 'get_job', dt)
+        self.server.record('SELECT * FROM job', 20)
+        self.assertEqual(self.server.stats(), [
+            ('get_job', 2000, 1000, 1000, 0, 0, 0, 0),
+            ('sql', 1, 0, 0, 0, 0, 0, 1)])
@@ -26,18 +26,21 @@ import re
 import sys
 import json
 import time
+import shutil
 import unittest
+from unittest import mock
 import numpy
 import zlib
 import gzip
 import tempfile
 import string
 import random
-from django.test import Client
+from django.test import Client, RequestFactory
 from openquake.baselib import config
 from openquake.baselib.general import gettemp
 from openquake.commonlib.logs import dbcmd
 from openquake.engine.export import core
+from openquake.server import views
 from openquake.server.db import actions
 from openquake.server.dbserver import db, get_status
 from openquake.commands import engine
@@ -244,6 +247,20 @@ class EngineServerTestCase(unittest.TestCase):
         self.assertEqual(list(got), ['wkt_gz', 'src_gz', 'array'])
         self.assertGreater(len(got['array']), 0)
 
+        # check the ETag of the cached results
+        extract_url = '/v1/calc/%s/extract/num_events' % job_id
+        resp = self.c.get(extract_url)
+        data = b''.join(resp.streaming_content)
+        resp = self.c.get(extract_url, HTTP_IF_NONE_MATCH=resp['ETag'])
+        self.assertEqual(resp.status_code, 304)
+
+        # check a partial download
+        resp = self.c.get(extract_url, HTTP_RANGE='bytes=10-')
+        self.assertEqual(resp.status_code, 206)
+        self.assertEqual(resp['Content-Range'],
+                         'bytes 10-%d/%d' % (len(data) - 1, len(data)))
+        self.assertEqual(b''.join(resp.streaming_content), data[10:])
+
     def test_classical(self):
         job_id = self.postzip('classical.zip')
         self.wait()
@@ -396,3 +413,78 @@ class EngineServerTestCase(unittest.TestCase):
             self.assertEqual(resp.status_code, 200)
             resp_text_dict = json.loads(resp.content.decode('utf8'))
             self.assertFalse(resp_text_dict['success'])
+
+
+class ExtractCacheTestCase(unittest.TestCase):
+    # tests of the helpers of the extract view, not requiring a server
+
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpdir)
+
+    def get(self, data, range_):
+        request = RequestFactory().get('/', HTTP_RANGE=range_)
+        return views._range_response(request, data, 'text/plain')
+
+    def test_range(self):
+        data = b'0123456789'
+        path = os.path.join(self.tmpdir, 'data')
+        with open(path, 'wb') as f:
+            f.write(data)
+        for range_, status, content, content_range in [
+                ('bytes=2-4', 206, b'234', 'bytes 2-4/10'),
+                ('bytes=7-', 206, b'789', 'bytes 7-9/10'),
+                ('bytes=8-20', 206, b'89', 'bytes 8-9/10'),
+                ('bytes=-3', 206, b'789', 'bytes 7-9/10'),  # suffix
+                ('bytes=-20', 200, data, None),  # suffix longer than data
+                ('bytes=5-3', 200, data, None),  # invalid, ignored
+                ('bytes=a-b', 200, data, None),  # invalid, ignored
+                ('', 200, data, None)]:
+            for dat in (data, open(path, 'rb')):
+                resp = self.get(dat, range_)
+                self.assertEqual(resp.status_code, status, range_)
+                self.assertEqual(b''.join(resp.streaming_content), content)
+                self.assertEqual(resp.get('Content-Range'), content_range)
+                self.assertEqual(resp['Content-Length'], str(len(content)))
+
+        # unsatisfiable ranges
+        for range_ in ('bytes=10-', 'bytes=12-15', 'bytes=-0'):
+            resp = self.get(data, range_)
+            self.assertEqual(resp.status_code, 416, range_)
+            self.assertEqual(resp['Content-Range'], 'bytes */10')
+
+    def test_eviction(self):
+        # the least recently used files are removed, except the files
+        # being written, starting with a dot
+        for i, fname in enumerate(['b.npz', 'a.npz', 'c.npz', '.d.npz']):
+            path = os.path.join(self.tmpdir, fname)
+            with open(path, 'wb') as f:
+                f.write(b'x' * 10)
+            os.utime(path, (i, i))
+        views._evict_extract_cache(self.tmpdir, 25)
+        self.assertEqual(sorted(os.listdir(self.tmpdir)),
+                         ['.d.npz', 'a.npz', 'c.npz'])
+        views._evict_extract_cache(self.tmpdir, 0)
+        self.assertEqual(os.listdir(self.tmpdir), ['.d.npz'])
+
+    @unittest.skipUnless(hasattr(os, 'getuid'), 'POSIX only')
+    def test_cachedir(self):
+        cachedir = os.path.join(self.tmpdir, 'extract')
+        views._check_cachedir(cachedir)
+        self.assertEqual(os.stat(cachedir).st_mode & 0o777, 0o700)
+        os.chmod(cachedir, 0o777)  # the permissions are restricted again
+        views._check_cachedir(cachedir)
+        self.assertEqual(os.stat(cachedir).st_mode & 0o777, 0o700)
+
+        # a directory owned by somebody else is refused
+        with mock.patch('os.getuid', lambda: os.stat(cachedir).st_uid + 1):
+            with self.assertRaises(PermissionError):
+                views._check_cachedir(cachedir)
+
+        # a symbolic link is refused
+        link = os.path.join(self.tmpdir, 'link')
+        os.symlink(cachedir, link)
+        with self.assertRaises(PermissionError):
+            views._check_cachedir(link)
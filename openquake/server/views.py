@@ -16,16 +16,19 @@
 # You should have received a copy of the GNU Affero General Public License
 # along with OpenQuake. If not, see <http://www.gnu.org/licenses/>.
 
+import io
 import shutil
 import json
 import time
 import logging
 import os
+import stat
 import tempfile
 import multiprocessing
 import traceback
 import signal
 import zlib
+import hashlib
 import urllib.parse as urlparse
 import re
 import psutil
@@ -33,7 +36,7 @@ from urllib.parse import unquote_plus
 from xml.parsers.expat import ExpatError
 from django.http import (
     HttpResponse, HttpResponseNotFound, HttpResponseBadRequest,
-    HttpResponseForbidden)
+    HttpResponseForbidden, HttpResponseNotModified)
 from django.views.decorators.csrf import csrf_exempt
 from django.views.decorators.http import require_http_methods
 from django.shortcuts import render
@@ -77,6 +80,9 @@ DEFAULT_EXPORT_TYPE = 'xml'
 EXPORT_CONTENT_TYPE_MAP = dict(xml=XML, geojson=JSON)
 DEFAULT_CONTENT_TYPE = 'text/plain'
 
+#: extracted data smaller than this are streamed directly from memory
+EXTRACT_IN_MEMORY = 1024 ** 2
+
 LOGGER = logging.getLogger('openquake.server')
 
 ACCESS_HEADERS = {'Access-Control-Allow-Origin': '*',
@@ -708,12 +714,132 @@ def calc_result(request, result_id):
     return response
 
 
+def _evict_extract_cache(cachedir, maxsize):
+    # remove the least recently used files until the cache fits in maxsize
+    entries = []
+    for fname in os.listdir(cachedir):
+        if fname.endswith('.npz') and not fname.startswith('.'):
+            path = os.path.join(cachedir, fname)
+            try:
+                st = os.stat(path)
+            except FileNotFoundError:  # removed by another process
+                continue
+            entries.append((st.st_mtime, st.st_size, path))
+    totsize = sum(size for _, size, _ in entries)
+    for _, size, path in sorted(entries):
+        if totsize <= maxsize:
+            break
+        try:
+            os.remove(path)
+        except OSError:  # already removed or open (on Windows)
+            pass
+        totsize -= size
+
+
+def _check_cachedir(cachedir):
+    # create the cache directory accessible only by the current user and
+    # refuse a directory owned by somebody else, since the cached files
+    # could have been replaced
+    os.makedirs(cachedir, mode=0o700, exist_ok=True)
+    st = os.lstat(cachedir)
+    if not stat.S_ISDIR(st.st_mode) or (
+            hasattr(os, 'getuid') and st.st_uid != os.getuid()):
+        raise PermissionError(
+            'The extract cache %s is not a directory owned by the '
+            'current user' % cachedir)
+    if stat.S_IMODE(st.st_mode) & 0o077:
+        os.chmod(cachedir, 0o700)
+
+
+def _extract_cached(dspath, what, key):
+    """
+    Extract `what` from the datastore and save it in the extract cache
+    as an .npz file named after `key`, unless it is already there.
+
+    :returns: the content of the file if small, otherwise an open file
+    """
+    cachedir = settings.EXTRACT_CACHE_DIR
+    _check_cachedir(cachedir)
+    path = os.path.join(cachedir, key + '.npz')
+    try:
+        os.utime(path)  # mark the file as recently used
+        f = open(path, 'rb')
+    except FileNotFoundError:  # not cached
+        fd, tmp = tempfile.mkstemp(dir=cachedir, prefix='.', suffix='.npz')
+        os.close(fd)
+        try:
+            with datastore.read(dspath) as ds:
+                hdf5.save_npz(_extract(ds, what), tmp)
+            os.replace(tmp, path)  # atomic, safe with concurrent requests
+        except Exception:
+            os.remove(tmp)
+            raise
+        f = open(path, 'rb')
+        _evict_extract_cache(cachedir, settings.EXTRACT_CACHE_SIZE)
+    if os.fstat(f.fileno()).st_size <= EXTRACT_IN_MEMORY:
+        with f:
+            return f.read()
+    return f
+
+
+def _read_range(f, start, stop, chunksize=1024 ** 2):
+    # yield the bytes of the file-like object f in the range [start, stop)
+    with f:
+        f.seek(start)
+        while start < stop:
+            data = f.read(min(chunksize, stop - start))
+            if not data:
+                break
+            start += len(data)
+            yield data
+
+
+def _range_response(request, data, content_type):
+    """
+    :param request: a `django.http.HttpRequest` object
+    :param data: a bytes object or an open file
+    :returns: a FileResponse honoring the Range header, if any
+    """
+    if isinstance(data, bytes):
+        f, size = io.BytesIO(data), len(data)
+    else:
+        f, size = data, os.fstat(data.fileno()).st_size
+    start, stop = 0, size
+    mo = re.match(r'bytes=(\d*)-(\d*)$', request.META.get('HTTP_RANGE', ''))
+    if mo and any(mo.groups()):
+        first, last = mo.groups()
+        if first and last and int(last) < int(first):
+            pass  # invalid range, ignored as required by RFC 7233
+        elif first:
+            start = int(first)
+            if last:
+                stop = min(int(last) + 1, size)
+        else:  # suffix range, i.e. the last bytes
+            start = max(size - int(last), 0)
+        if start >= stop:  # the range starts after the end
+            f.close()
+            response = HttpResponse(status=416)
+            response['Content-Range'] = 'bytes */%d' % size
+            return response
+    response = FileResponse(_read_range(f, start, stop),
+                            content_type=content_type)
+    if stop - start < size:
+        response.status_code = 206
+        response['Content-Range'] = 'bytes %d-%d/%d' % (start, stop - 1, size)
+    response['Accept-Ranges'] = 'bytes'
+    response['Content-Length'] = str(stop - start)
+    return response
+
+
 @cross_domain_ajax
 @require_http_methods(['GET', 'HEAD'])
 def extract(request, calc_id, what):
     """
     Wrapper over the `oq extract` command. If `setting.LOCKDOWN` is true
     only calculations owned by the current user can be retrieved.
+    The results are cached on the server, keyed by calculation ID,
+    datastore modification time and query, and they are returned with
+    an ETag; partial downloads via the Range header are supported.
     """
     job = logs.dbcmd('get_job', int(calc_id))
     if job is None:
@@ -723,14 +849,15 @@ def extract(request, calc_id, what):
     path = request.get_full_path()
     n = len(request.path_info)
     query_string = unquote_plus(path[n:])
+    dspath = job.ds_calc_dir + '.hdf5'
     try:
-        # read the data and save them on a temporary .npz file
-        with datastore.read(job.ds_calc_dir + '.hdf5') as ds:
-            fd, fname = tempfile.mkstemp(
-                prefix=what.replace('/', '-'), suffix='.npz')
-            os.close(fd)
-            obj = _extract(ds, what + query_string)
-            hdf5.save_npz(obj, fname)
+        key = hashlib.sha1(('%s %s %s%s' % (
+            job.id, os.path.getmtime(dspath), what, query_string)
+        ).encode('utf8')).hexdigest()
+        etag = '"%s"' % key
+        if request.META.get('HTTP_IF_NONE_MATCH') == etag:
+            return HttpResponseNotModified()
+        data = _extract_cached(dspath, what + query_string, key)
     except Exception as exc:
         tb = ''.join(traceback.format_tb(exc.__traceback__))
         return HttpResponse(
@@ -739,12 +866,10 @@ def extract(request, calc_id, what):
             content_type='text/plain', status=500)
 
     # stream the data back
-    stream = FileWrapper(open(fname, 'rb'))
-    stream.close = lambda: (FileWrapper.close(stream), os.remove(fname))
-    response = FileResponse(stream, content_type='application/octet-stream')
+    response = _range_response(request, data, 'application/octet-stream')
+    response['ETag'] = etag
     response['Content-Disposition'] = (
-        'attachment; filename=%s' % os.path.basename(fname))
-    response['Content-Length'] = str(os.path.getsize(fname))
+        'attachment; filename=%s.npz' % what.replace('/', '-'))
     return response
 
 
@@ -0,0 +1,112 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+# vim: tabstop=4 shiftwidth=4 softtabstop=4
+#
+# Copyright (C) 2020 GEM Foundation
+#
+# OpenQuake is free software: you can redistribute it and/or modify it
+# under the terms of the GNU Affero General Public License as published
+# by the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# OpenQuake is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with OpenQuake.  If not, see <http://www.gnu.org/licenses/>.
+"""
+Compare the time spent in LossesByAsset.aggregate (followed by .reduce,
+as in the ebrisk calculator) with the time spent in the old loop on assets
+and events with string keys, for B blocks of A assets and E events with
+K aggregation keys, one loss type plus insurance. The timings are then
+extrapolated to 1M assets x 10k events. Example:
+
+$ python utils/bench_aggregate.py 1000 10000 50 3
+"""
+import sys
+import time
+import numpy
+from openquake.baselib import hdf5
+from openquake.baselib.general import AccumDict
+from openquake.risklib import scientific
+
+F32 = numpy.float32
+
+
+def old_aggregate(lba, out, eids, minimum_loss, tagidxs, alt, by_E):
+    # the loop used before the vectorization, with tagidxs of shape (A, 1)
+    for lni, losses in lba.gen_losses(out):
+        for eid, loss in zip(eids, losses.sum(axis=0)):
+            by_E[eid][lni] += loss
+        for a, asset in enumerate(out.assets):
+            ls = losses[a]
+            ok = ls > minimum_loss[lni]
+            if not ok.sum():
+                continue
+            idx = ','.join(map(str, tagidxs[a])) + ','
+            for loss, eid in zip(ls[ok], out.eids[ok]):
+                alt[idx][eid][lni] += loss
+
+
+def gen_outputs(A, E, K, B):
+    assets = numpy.zeros(A, [('ordinal', numpy.uint32),
+                             ('value-structural', float),
+                             ('policy', numpy.uint32)])
+    assets['ordinal'] = numpy.arange(A)
+    assets['value-structural'] = numpy.random.uniform(1E5, 1E6, A)
+    assets['policy'] = numpy.random.randint(0, 2, A)
+    aggkeys = numpy.random.randint(0, K, A)
+    for b in range(B):
+        eids = numpy.arange(b * E, (b + 1) * E, dtype=numpy.uint32)
+        out = hdf5.ArrayWrapper((), dict(
+            eids=eids, assets=assets, loss_types=['structural']))
+        lrs = numpy.random.uniform(0, 1, (A, E)).astype(F32)
+        lrs[lrs < .9] = 0  # most of the loss ratios are zero
+        out.structural = lrs
+        yield out, aggkeys
+
+
+def main(A=1000, E=10000, K=50, B=3):
+    A, E, K, B = int(A), int(E), int(K), int(B)
+    numpy.random.seed(42)
+    policy = {'structural': numpy.array([[.1, .5], [0, .2]])}
+    names = ['structural', 'structural_ins']
+    minimum_loss = [1E4, 1E4]
+    outputs = list(gen_outputs(A, E, K, B))
+
+    lba = scientific.LossesByAsset(range(A), names, 'policy', policy)
+    lba.alt = []
+    lba.losses_by_E = []
+    t0 = time.time()
+    for out, aggkeys in outputs:
+        lba.aggregate(out, out.eids, minimum_loss, aggkeys, None)
+        lba.reduce()
+    elt = lba.get_elt()
+    alt = lba.get_alt(['%d,' % k for k in range(K)])
+    t1 = time.time()
+
+    old_alt = AccumDict(accum=AccumDict(accum=numpy.zeros(2, F32)))
+    old_E = AccumDict(accum=numpy.zeros(2, F32))
+    for out, aggkeys in outputs:
+        old_aggregate(lba, out, out.eids, minimum_loss, aggkeys[:, None],
+                      old_alt, old_E)
+    t2 = time.time()
+
+    # the two algorithms give the same event loss tables
+    numpy.testing.assert_allclose(
+        elt['loss'], [old_E[eid] for eid in elt['event_id']], rtol=1E-4)
+    for key, arr in alt.items():
+        numpy.testing.assert_allclose(
+            arr['loss'], [old_alt[key][eid] for eid in arr['event_id']],
+            rtol=1E-4)
+    scale = 1E6 / A * 1E4 / (E * B)
+    print('%d blocks of %d assets x %d events: old %.2fs, new %.2fs '
+          '(%.1fx)' % (B, A, E, t2 - t1, t1 - t0, (t2 - t1) / (t1 - t0)))
+    print('extrapolated to 1M assets x 10k events: old %d min, new %d min'
+          % ((t2 - t1) * scale / 60, (t1 - t0) * scale / 60))
+
+
+if __name__ == '__main__':
+    main(*sys.argv[1:])
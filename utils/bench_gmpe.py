@@ -0,0 +1,76 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+# vim: tabstop=4 shiftwidth=4 softtabstop=4
+#
+# Copyright (C) 2020 GEM Foundation
+#
+# OpenQuake is free software: you can redistribute it and/or modify it
+# under the terms of the GNU Affero General Public License as published
+# by the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# OpenQuake is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with OpenQuake.  If not, see <http://www.gnu.org/licenses/>.
+"""
+Compare the time spent in GMPE.get_mean_std (a loop on the contexts) with
+the time spent in GMPE.get_mean_std1 (a single call on a flat context) for
+the vectorized GMPEs, on C random contexts with N sites each. Example:
+
+$ python utils/bench_gmpe.py BooreEtAl2014 10000 5
+"""
+import sys
+import time
+import numpy
+from openquake.hazardlib import valid
+from openquake.hazardlib.imt import PGA, SA
+from openquake.hazardlib.contexts import ContextMaker, RuptureContext
+
+PARAMS = dict(mag=(5., 8.), rake=(-90., 90.), dip=(30., 90.),
+              ztor=(0., 10.), width=(5., 20.), hypo_depth=(5., 15.),
+              vs30=(200., 800.), z1pt0=(50., 500.), z2pt5=(1., 5.),
+              rrup=(1., 200.), rjb=(0., 200.), rx=(-50., 50.),
+              ry0=(0., 50.), rhypo=(5., 200.), repi=(0., 200.))
+
+
+def gen_ctxs(gsim, C, N):
+    reqs = gsim.REQUIRES_RUPTURE_PARAMETERS | gsim.REQUIRES_DISTANCES
+    reqs |= gsim.REQUIRES_SITES_PARAMETERS - {'vs30measured'}
+    for _ in range(C):
+        ctx = RuptureContext()
+        ctx.sids = numpy.arange(N)
+        for par in reqs:
+            low, high = PARAMS[par]
+            if par in gsim.REQUIRES_RUPTURE_PARAMETERS:
+                setattr(ctx, par, numpy.random.uniform(low, high))
+            else:
+                setattr(ctx, par, numpy.random.uniform(low, high, N))
+        if 'vs30measured' in gsim.REQUIRES_SITES_PARAMETERS:
+            ctx.vs30measured = numpy.zeros(N, bool)
+        yield ctx
+
+
+def main(gsim='BooreEtAl2014', C=1000, N=5):
+    gsim = valid.gsim(gsim)
+    if not gsim.vectorized:
+        sys.exit('%s is not vectorized' % gsim)
+    numpy.random.seed(42)
+    ctxs = list(gen_ctxs(gsim, int(C), int(N)))
+    imts = [PGA(), SA(0.1), SA(1.0)]
+    cmaker = ContextMaker('*', [gsim])
+    t0 = time.time()
+    ms = gsim.get_mean_std(ctxs, imts)
+    t1 = time.time()
+    ms1 = gsim.get_mean_std1(cmaker.multi(ctxs), imts)
+    t2 = time.time()
+    numpy.testing.assert_allclose(ms1, ms)
+    print('%d contexts x %d sites: loop %.3fs, vectorized %.3fs (%.1fx)' %
+          (len(ctxs), int(N), t1 - t0, t2 - t1, (t1 - t0) / (t2 - t1)))
+
+
+if __name__ == '__main__':
+    main(*sys.argv[1:])
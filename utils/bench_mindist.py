@@ -0,0 +1,81 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+# vim: tabstop=4 shiftwidth=4 softtabstop=4
+#
+# Copyright (C) 2020 GEM Foundation
+#
+# OpenQuake is free software: you can redistribute it and/or modify it
+# under the terms of the GNU Affero General Public License as published
+# by the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# OpenQuake is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with OpenQuake.  If not, see <http://www.gnu.org/licenses/>.
+"""
+Time Mesh.get_min_distance for R random rupture meshes of M points each
+on a SiteCollection of N sites filtered per rupture, as in the classical
+calculator. It compares the cdist distance matrix with the KD-tree on the
+rupture mesh, with the cartesian coordinates of the sites computed per
+rupture or once, and reports the time spent building the trees. Example:
+
+$ python utils/bench_mindist.py 100 1000 10000
+"""
+import sys
+import time
+import numpy
+from scipy.spatial.distance import cdist
+from openquake.hazardlib.geo.mesh import Mesh
+from openquake.hazardlib.site import SiteCollection
+
+
+def gen_meshes(R, M):
+    for _ in range(R):
+        lon, lat = numpy.random.uniform(-1, 1, 2)
+        yield Mesh(numpy.random.uniform(lon - .2, lon + .2, M),
+                   numpy.random.uniform(lat - .2, lat + .2, M),
+                   numpy.random.uniform(0, 20, M))
+
+
+def main(R=100, M=1000, N=10000):
+    R, M, N = int(R), int(M), int(N)
+    numpy.random.seed(42)
+    sitecol = SiteCollection.from_points(
+        numpy.random.uniform(-2, 2, N), numpy.random.uniform(-2, 2, N))
+    meshes = list(gen_meshes(R, M))
+    masks = [numpy.random.random(N) < .8 for _ in range(R)]
+
+    t0 = time.time()
+    for mesh, mask in zip(meshes, masks):
+        sites = sitecol.filter(mask)
+        mdist = cdist(mesh.xyz, sites.xyz).min(axis=0)
+    t1 = time.time()
+    for mesh, mask in zip(meshes, masks):
+        sites = sitecol.filter(mask)  # xyz computed per rupture
+        mesh.__dict__.pop('kdtree', None)
+        mesh.get_min_distance(sites)
+    t2 = time.time()
+    sitecol.xyz  # computed once, as done by the SourceFilter
+    build = 0
+    for mesh, mask in zip(meshes, masks):
+        sites = sitecol.filter(mask)  # xyz sliced from the sitecol
+        mesh.__dict__.pop('kdtree', None)
+        t = time.time()
+        mesh.kdtree
+        build += time.time() - t
+        dist = mesh.get_min_distance(sites)
+    t3 = time.time()
+    numpy.testing.assert_allclose(dist, mdist)
+    print('%d ruptures x %d points, %d sites' % (R, M, N))
+    print('cdist: %.3fs' % (t1 - t0))
+    print('kdtree, site coordinates per rupture: %.3fs' % (t2 - t1))
+    print('kdtree, site coordinates once: %.3fs (%.3fs building the trees)'
+          % (t3 - t2, build))
+
+
+if __name__ == '__main__':
+    main(*sys.argv[1:])